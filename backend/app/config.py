@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,11 +7,172 @@ load_dotenv()
 # MongoDB settings
 MONGODB_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("DB_NAME", "cuisinecompass")
+# Read preference per read operation ("primary", "primaryPreferred",
+# "secondary", "secondaryPreferred" or "nearest"), as a JSON object merged
+# over these defaults. Other reads, including capacity checks, always go to
+# the primary.
+MONGO_READ_PREFERENCES = {
+    "meal_plans.get_by_user": "secondaryPreferred",
+    "meal_plans.get_ingredients": "secondaryPreferred",
+    "usage.get_daily": "secondaryPreferred",
+    **json.loads(os.getenv("MONGO_READ_PREFERENCES", "{}")),
+}
+# Skip secondaries lagging more than this (at least 90), -1 for no limit
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "-1"))
 
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Lifetime of the tokens that open event streams, which travel in the URL
+STREAM_TOKEN_EXPIRE_SECONDS = int(os.getenv("STREAM_TOKEN_EXPIRE_SECONDS", "60"))
 
 # Gemini API settings
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# "full" (original prompt) or "compact" (single-day minified example, short keys)
+GEMINI_PROMPT_MODE = os.getenv("GEMINI_PROMPT_MODE", "full")
+
+# Model tiers, cheapest/fastest first
+GEMINI_MODEL_TIERS = [
+    model.strip()
+    for model in os.getenv(
+        "GEMINI_MODEL_TIERS", "gemini-2.0-flash-lite,gemini-2.0-flash,gemini-2.5-flash"
+    ).split(",")
+    if model.strip()
+]
+# Requests with more meal slots than this start one tier up
+GEMINI_LARGE_REQUEST_SLOTS = int(os.getenv("GEMINI_LARGE_REQUEST_SLOTS", "3"))
+# User tiers that start one model tier up
+GEMINI_PREMIUM_USER_TIERS = os.getenv("GEMINI_PREMIUM_USER_TIERS", "premium").split(",")
+# Models whose recent latency exceeds this are tried after the others
+GEMINI_LATENCY_BUDGET_MS = int(os.getenv("GEMINI_LATENCY_BUDGET_MS", "30000"))
+# USD per million prompt/output tokens, used for cost metrics
+GEMINI_MODEL_PRICES = json.loads(
+    os.getenv(
+        "GEMINI_MODEL_PRICES",
+        json.dumps(
+            {
+                "gemini-2.0-flash-lite": [0.075, 0.30],
+                "gemini-2.0-flash": [0.10, 0.40],
+                "gemini-2.5-flash": [0.30, 2.50],
+            }
+        ),
+    )
+)
+
+# Usage ledger and per-tier daily budgets in USD (e.g. {"free": 0.05});
+# tiers without a budget are unlimited. Over budget, requests are either
+# rejected or downgraded to the cheapest model.
+USAGE_LEDGER_TTL_DAYS = int(os.getenv("USAGE_LEDGER_TTL_DAYS", "90"))
+USAGE_DAILY_BUDGETS_USD = json.loads(os.getenv("USAGE_DAILY_BUDGETS_USD", "{}"))
+USAGE_BUDGET_ACTION = os.getenv("USAGE_BUDGET_ACTION", "downgrade")  # or "reject"
+
+# LLM provider: "gemini", "replay" (serve recorded responses) or "local"
+# (CPU-only GGUF model through llama-cpp-python)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+# When set, every response is also saved here for later replay
+LLM_RECORD_DIR = os.getenv("LLM_RECORD_DIR")
+LLM_REPLAY_DIR = os.getenv("LLM_REPLAY_DIR", "recordings")
+LLM_REPLAY_LATENCY_MS = int(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+LLM_LOCAL_MODEL_PATH = os.getenv("LLM_LOCAL_MODEL_PATH")
+LLM_LOCAL_THREADS = int(os.getenv("LLM_LOCAL_THREADS", "0"))  # 0 = llama.cpp default
+LLM_LOCAL_CONTEXT_TOKENS = int(os.getenv("LLM_LOCAL_CONTEXT_TOKENS", "8192"))
+LLM_LOCAL_MAX_TOKENS = int(os.getenv("LLM_LOCAL_MAX_TOKENS", "4096"))
+
+# Meal plan capacity and how long a date reservation survives a crashed request
+MAX_PLANNED_DAYS = int(os.getenv("MAX_PLANNED_DAYS", "7"))
+PLANNING_RESERVATION_TTL_SECONDS = int(os.getenv("PLANNING_RESERVATION_TTL_SECONDS", "600"))
+# How often a request sharing another worker's generation checks whether it finished
+PLANNING_WAIT_POLL_SECONDS = float(os.getenv("PLANNING_WAIT_POLL_SECONDS", "0.25"))
+
+# Days of per-day rollups kept in each user's dashboard summary; weekly
+# rollups are kept for the weeks these days fall in
+DASHBOARD_HISTORY_DAYS = int(os.getenv("DASHBOARD_HISTORY_DAYS", "28"))
+
+# Day changes kept per user for delta sync; clients further behind get a
+# full snapshot instead
+SYNC_CHANGES_KEPT = int(os.getenv("SYNC_CHANGES_KEPT", "500"))
+
+# Idempotency-Key handling: how long results are kept, and how long a retry
+# waits for the original request to finish
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+# A running request renews its claim on a key this often; a retry takes
+# over a claim not renewed for IDEMPOTENCY_LEASE_SECONDS (its worker died)
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+
+# Speculative top-up: build days ahead during off-peak hours so generate
+# requests can be served without waiting for the model
+SPECULATIVE_TOPUP_ENABLED = os.getenv("SPECULATIVE_TOPUP_ENABLED", "false").lower() == "true"
+TOPUP_WORKERS = int(os.getenv("TOPUP_WORKERS", "1"))
+# Off-peak window in server local time, [start, end) hours
+TOPUP_OFF_PEAK_START_HOUR = int(os.getenv("TOPUP_OFF_PEAK_START_HOUR", "1"))
+TOPUP_OFF_PEAK_END_HOUR = int(os.getenv("TOPUP_OFF_PEAK_END_HOUR", "6"))
+TOPUP_MAX_USERS_PER_RUN = int(os.getenv("TOPUP_MAX_USERS_PER_RUN", "200"))
+# Users with a plan generated within this many days count as active
+TOPUP_ACTIVE_DAYS = int(os.getenv("TOPUP_ACTIVE_DAYS", "14"))
+
+# Per-request profiling: requests sending this token in the X-Profile
+# header, plus a random sample of all requests, are profiled
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_TTL_HOURS = int(os.getenv("PROFILING_TTL_HOURS", "24"))
+
+# Event-loop monitoring: heartbeat interval, lag counted as a stall, and
+# debug mode (capture and log the stack blocking the loop)
+LOOP_MONITOR_INTERVAL_MS = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_STALL_THRESHOLD_MS = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "false").lower() == "true"
+# Test mode: respond 500 when a request blocks the loop longer than this
+LOOP_BLOCKING_BUDGET_MS = (
+    int(os.getenv("LOOP_BLOCKING_BUDGET_MS")) if os.getenv("LOOP_BLOCKING_BUDGET_MS") else None
+)
+
+# Startup: warm up MongoDB, the LLM provider and auth libraries in the
+# background, and the import time allowed by app.scripts.import_time
+STARTUP_WARMUP_ENABLED = os.getenv("STARTUP_WARMUP_ENABLED", "true").lower() == "true"
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+# Logging: level, "json" (one object per line) or "text", and per-path
+# sampling rates for access logs of high-volume routes, as a JSON object,
+# e.g. {"/health": 0.01}; errors are always logged
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATES = json.loads(os.getenv("LOG_SAMPLE_RATES", "{}"))
+
+# Cross-worker cache invalidation: "auto" tails MongoDB change streams and
+# falls back to polling when the server has none (standalone mongod);
+# "stream" or "poll" force one. Per-user caches (users, plan versions) are
+# bypassed while neither runs.
+CACHE_INVALIDATION_MODE = os.getenv("CACHE_INVALIDATION_MODE", "auto")
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", "1"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+# Server-sent events: "mongo" relays events between workers through a
+# capped collection, "local" delivers them in-process (single worker only)
+PUSH_FANOUT = os.getenv("PUSH_FANOUT", "mongo")
+PUSH_EVENTS_MAX_BYTES = int(os.getenv("PUSH_EVENTS_MAX_BYTES", str(8 * 1024 * 1024)))
+# Events a client may fall behind by before it is told to resync instead
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "64"))
+PUSH_HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+# Streams end after this long and clients reconnect, so workers can be
+# recycled within the graceful timeout
+PUSH_STREAM_MAX_SECONDS = float(os.getenv("PUSH_STREAM_MAX_SECONDS", "90"))
+
+# Recipe search settings
+RECIPE_INDEX_REFRESH_SECONDS = int(os.getenv("RECIPE_INDEX_REFRESH_SECONDS", "30"))
+
+# Local planner settings (compose plans from stored recipes before calling Gemini)
+LOCAL_PLANNER_ENABLED = os.getenv("LOCAL_PLANNER_ENABLED", "true").lower() == "true"
+LOCAL_PLANNER_MIN_CANDIDATES = int(os.getenv("LOCAL_PLANNER_MIN_CANDIDATES", "10"))
+LOCAL_PLANNER_CALORIE_TOLERANCE = float(os.getenv("LOCAL_PLANNER_CALORIE_TOLERANCE", "0.1"))
+
+# Allergy and dislike screening: rounds of targeted regeneration before giving up
+SCREENING_MAX_ATTEMPTS = int(os.getenv("SCREENING_MAX_ATTEMPTS", "2"))
+
+# Profile sync settings (regenerating planned meals after profile changes)
+PROFILE_SYNC_WORKERS = int(os.getenv("PROFILE_SYNC_WORKERS", "2"))
+PROFILE_SYNC_CALORIE_TOLERANCE = float(os.getenv("PROFILE_SYNC_CALORIE_TOLERANCE", "0.15"))
+# Percentage points a day's protein/carbs/fat share of energy may be off target
+PROFILE_SYNC_MACRO_TOLERANCE = float(os.getenv("PROFILE_SYNC_MACRO_TOLERANCE", "10"))
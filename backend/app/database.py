@@ -1,17 +1,172 @@
+import logging
+from contextlib import contextmanager
+from bson import ObjectId
+from pymongo.collection import Collection
+from pymongo.errors import CollectionInvalid, OperationFailure
 from pymongo.mongo_client import MongoClient
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import (
+    Nearest,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
 from pymongo.server_api import ServerApi
-from app.config import MONGODB_URI, DB_NAME
+from app.config import (
+    DB_NAME,
+    MONGO_MAX_STALENESS_SECONDS,
+    MONGO_READ_PREFERENCES,
+    MONGODB_URI,
+    PROFILING_TTL_HOURS,
+    PUSH_EVENTS_MAX_BYTES,
+    PUSH_FANOUT,
+    USAGE_LEDGER_TTL_DAYS,
+)
+from app.profiling import MongoSpanListener
 
-client = MongoClient(MONGODB_URI, server_api=ServerApi("1"))
+# connect=False: no connection or monitor thread is opened until the first
+# operation, so a master preloading the app (gunicorn.conf.py) hands its
+# workers an unopened client and each worker connects on its own
+client = MongoClient(
+    MONGODB_URI,
+    server_api=ServerApi("1"),
+    event_listeners=[MongoSpanListener()],
+    connect=False,
+)
 db = client[DB_NAME]
 
+logger = logging.getLogger(__name__)
+
 # Define collections
 users_collection = db["users"]
 meal_plans_collection = db["meal_plans"]
+recipes_collection = db["recipes"]
+profile_sync_jobs_collection = db["profile_sync_jobs"]
+planning_collection = db["planning"]
+idempotency_keys_collection = db["idempotency_keys"]
+prebuilt_days_collection = db["prebuilt_days"]
+scheduled_runs_collection = db["scheduled_runs"]
+usage_ledger_collection = db["usage_ledger"]
+usage_daily_collection = db["usage_daily"]
+request_profiles_collection = db["request_profiles"]
+cache_invalidations_collection = db["cache_invalidations"]
+meal_history_collection = db["meal_history"]
+dashboard_summaries_collection = db["dashboard_summaries"]
+meal_plan_changes_collection = db["meal_plan_changes"]
+push_events_collection = db["push_events"]
+
+
+def ensure_indexes():
+    """
+    Create indexes for better query performance
+
+    Run in the background at startup (see app/warmup.py) rather than on
+    import, which would otherwise wait for a round trip per index.
+    """
+    users_collection.create_index("email", unique=True)
+    meal_plans_collection.create_index([("user_id", 1), ("date", 1)])
+    recipes_collection.create_index("created_at")
+    profile_sync_jobs_collection.create_index([("user_id", 1), ("created_at", -1)])
+    idempotency_keys_collection.create_index("expires_at", expireAfterSeconds=0)
+    prebuilt_days_collection.create_index([("user_id", 1), ("profile_key", 1), ("created_at", 1)])
+    usage_ledger_collection.create_index([("u", 1), ("t", -1)])
+    usage_ledger_collection.create_index("t", expireAfterSeconds=USAGE_LEDGER_TTL_DAYS * 86400)
+    usage_daily_collection.create_index([("user_id", 1), ("date", -1)])
+    request_profiles_collection.create_index("created_at", expireAfterSeconds=PROFILING_TTL_HOURS * 3600)
+    cache_invalidations_collection.create_index("t", expireAfterSeconds=3600)
+
+    # Completed days: a time-series collection (MongoDB 5.0+) stores this
+    # append-only history compactly; older servers get a regular collection
+    try:
+        db.create_collection(
+            "meal_history",
+            timeseries={"timeField": "completed_at", "metaField": "user_id", "granularity": "hours"},
+        )
+    except (CollectionInvalid, OperationFailure):
+        pass  # already exists, or time-series collections are not supported
+    meal_history_collection.create_index([("user_id", 1), ("date", 1)])
+
+    # Events relayed between workers (see app/push.py) are tailed, which
+    # only works on a capped collection; one created by an earlier insert
+    # is converted, its short-lived events being of no further use
+    if PUSH_FANOUT != "local":
+        try:
+            db.create_collection("push_events", capped=True, size=PUSH_EVENTS_MAX_BYTES)
+        except CollectionInvalid:
+            if not push_events_collection.options().get("capped"):
+                db.command("convertToCapped", "push_events", size=PUSH_EVENTS_MAX_BYTES)
+
+
+READ_PREFERENCE_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def _secondary_reads(operation: str) -> bool:
+    return MONGO_READ_PREFERENCES.get(operation, "primary") != "primary"
+
+
+def reader(collection: Collection, operation: str) -> Collection:
+    """
+    Get a collection handle for a read operation, with the read preference
+    configured in MONGO_READ_PREFERENCES
+
+    Reads that may go to a secondary use majority read concern, which
+    causally consistent sessions need to guarantee reading one's own writes.
+    """
+    if not _secondary_reads(operation):
+        return collection
+    mode = READ_PREFERENCE_MODES[MONGO_READ_PREFERENCES[operation]]
+    return collection.with_options(
+        read_preference=mode(max_staleness=MONGO_MAX_STALENESS_SECONDS),
+        read_concern=ReadConcern("majority"),
+    )
+
+
+@contextmanager
+def read_session(user_id: str, operation: str):
+    """
+    Session for a user's read: when it may go to a secondary, a causally
+    consistent session that first reads the user's document from the
+    primary, so the secondary waits until it has every write the primary
+    had by then, whichever worker made it. None for primary reads.
+    """
+    if not _secondary_reads(operation):
+        yield None
+        return
+    with client.start_session(causal_consistency=True) as session:
+        users_collection.find_one({"_id": ObjectId(user_id)}, {"_id": 1}, session=session)
+        yield session
+
+
+# Whether the deployment runs multi-document transactions (replica sets and
+# sharded clusters), found out on first use
+_transactions_supported = None
+
+
+def _supports_transactions() -> bool:
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = client.admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+
+def run_in_transaction(callback):
+    """
+    Run callback(session) in a transaction, retried on transient errors,
+    and return its result
 
-# Create indexes for better query performance
-users_collection.create_index("email", unique=True)
-meal_plans_collection.create_index([("user_id", 1), ("date", 1)])
+    On a standalone server, which has no transactions, the callback runs
+    once with no session and its writes apply one by one.
+    """
+    if not _supports_transactions():
+        return callback(None)
+    with client.start_session() as session:
+        return session.with_transaction(callback)
 
 
 def get_db():
@@ -19,6 +174,6 @@ def get_db():
         # Verify connection to MongoDB
         client.admin.command("ping")
         return db
-    except Exception as e:
-        print(f"Database connection error: {e}")
+    except Exception:
+        logger.exception("Database connection error")
         raise
@@ -0,0 +1,33 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+# Event name -> handlers, called in subscription order
+_handlers: Dict[str, List[Callable]] = defaultdict(list)
+
+logger = logging.getLogger(__name__)
+
+
+def subscribe(event: str, handler: Callable):
+    """
+    Register a handler to be called with the payload of every emitted event
+    """
+    if handler not in _handlers[event]:
+        _handlers[event].append(handler)
+
+
+def emit(event: str, **payload):
+    """
+    Call every handler subscribed to an event
+
+    Handlers run synchronously in the emitting thread and should hand slow work
+    off to a background worker. A failing handler never breaks the emitter.
+    """
+    for handler in list(_handlers[event]):
+        try:
+            handler(**payload)
+        except Exception:
+            logger.exception(
+                "Error handling event %s in %s", event, handler.__qualname__,
+                extra={"event": event},
+            )
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, Optional
+from cachetools import TTLCache
+from pymongo.errors import OperationFailure
+from app import metrics
+from app.config import CACHE_INVALIDATION_MODE, CACHE_INVALIDATION_POLL_SECONDS
+from app.database import cache_invalidations_collection, db
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning change streams are not available (standalone
+# mongod, or a storage engine without them)
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+# The resume token fell off the oplog: events were missed
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Poll a little further back than the last change seen, since writers'
+# clocks and insert order are not exact; evicting twice is harmless
+POLL_OVERLAP = timedelta(seconds=2)
+# Recorded changes expire after an hour (TTL index in database.py)
+POLL_RETENTION = timedelta(hours=1)
+
+
+class InvalidationBus:
+    """
+    Tells every worker which users' documents changed, so in-process caches
+    can evict them
+
+    A background thread tails a MongoDB change stream on the subscribed
+    collections, keeping its resume token so a reconnecting stream picks up
+    where it stopped; a stream opened without one (first start, or after
+    history was lost) clears the caches first. Change events of deleted
+    documents do not say whose they were, so writers publish their deletes
+    and the stream also reads those records. Without change streams
+    (standalone mongod) writers record every change in the
+    cache_invalidations collection, which is polled instead. Caches must be
+    bypassed unless live is set, i.e. while changes made elsewhere could go
+    unnoticed.
+    """
+
+    def __init__(
+        self,
+        mode: str = CACHE_INVALIDATION_MODE,
+        poll_seconds: float = CACHE_INVALIDATION_POLL_SECONDS,
+    ):
+        self.mode = mode
+        self.poll_seconds = poll_seconds
+        self.live = False
+        # None until known whether this deployment has change streams
+        self.polling: Optional[bool] = True if mode == "poll" else None
+        self._handlers: Dict[str, List[Callable]] = defaultdict(list)
+        self._resume_token = None
+        self._polled_until: Optional[datetime] = None
+        self._last_poll: Optional[datetime] = None
+        self._thread = None
+
+    def subscribe(self, collection: str, handler: Callable):
+        """
+        Call handler(user_id) for every change to a user's documents in a
+        collection; user_id is None when the change cannot be attributed,
+        meaning everything cached from that collection is stale
+        """
+        if handler not in self._handlers[collection]:
+            self._handlers[collection].append(handler)
+
+    def publish(self, collection: str, user_id: str, deleted: bool = False):
+        """
+        Report a write made by this worker: evict locally right away, and
+        record it for other workers when they poll, or when it deleted
+        documents
+        """
+        self._dispatch(collection, user_id)
+        if self.polling is not False or deleted:
+            cache_invalidations_collection.insert_one(
+                {"c": collection, "u": user_id, "t": datetime.now()}
+            )
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="cache-invalidation", daemon=True
+            )
+            self._thread.start()
+
+    def _dispatch(self, collection: str, user_id: Optional[str]):
+        metrics.increment("cache_invalidations_total", collection=collection)
+        for handler in list(self._handlers[collection]):
+            try:
+                handler(user_id)
+            except Exception:
+                logger.exception("Error invalidating %s cache", collection)
+
+    def _evict_all(self):
+        for collection in list(self._handlers):
+            self._dispatch(collection, None)
+
+    def _set_live(self, live: bool):
+        self.live = live
+        metrics.set_gauge("cache_invalidation_live", int(live))
+
+    def _run(self):
+        while True:
+            try:
+                if self.polling:
+                    self._poll()
+                else:
+                    self._watch()
+            except OperationFailure as e:
+                self._set_live(False)
+                if e.code in CHANGE_STREAMS_UNSUPPORTED and self.mode == "auto":
+                    logger.info("Change streams unavailable, polling for cache invalidations")
+                    self.polling = True
+                    self._polled_until = datetime.now()
+                    continue
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Missed cache invalidations, clearing caches")
+                    self._resume_token = None
+                    self._evict_all()
+                else:
+                    logger.exception("Cache invalidation stream failed")
+            except Exception:
+                self._set_live(False)
+                logger.exception("Cache invalidation stream failed")
+            time.sleep(self.poll_seconds)
+
+    def _watch(self):
+        if self._resume_token is None:
+            # Changes made before the stream starts would go unnoticed
+            self._evict_all()
+        pipeline = [
+            {
+                "$match": {
+                    "$or": [
+                        {"ns.coll": {"$in": list(self._handlers)}},
+                        {
+                            "ns.coll": cache_invalidations_collection.name,
+                            "operationType": "insert",
+                        },
+                    ]
+                }
+            },
+            {
+                "$project": {
+                    "ns": 1,
+                    "operationType": 1,
+                    "documentKey": 1,
+                    "fullDocument.user_id": 1,
+                    "fullDocument.c": 1,
+                    "fullDocument.u": 1,
+                }
+            },
+        ]
+        with db.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=1000,
+        ) as stream:
+            self.polling = False
+            while stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    # Caught up with everything missed while disconnected
+                    self._set_live(True)
+                elif "ns" in change:
+                    self._handle(change)
+                self._resume_token = stream.resume_token
+
+        # The stream was invalidated (e.g. a collection was dropped)
+        self._set_live(False)
+        self._resume_token = None
+        self._evict_all()
+
+    def _handle(self, change: Dict):
+        collection = change["ns"]["coll"]
+        if collection == cache_invalidations_collection.name:
+            # A delete published by its writer
+            record = change.get("fullDocument") or {}
+            if record.get("c") in self._handlers:
+                self._dispatch(record["c"], record.get("u"))
+            return
+
+        user_id = self._user_of(change)
+        if user_id is None and change.get("operationType") in ("update", "replace", "delete"):
+            # The document is gone (an update's lookup found nothing since it
+            # was deleted after), and its delete is published by the writer
+            return
+        self._dispatch(collection, user_id)
+
+    @staticmethod
+    def _user_of(change: Dict) -> Optional[str]:
+        if change["ns"]["coll"] == "users":
+            return str(change["documentKey"]["_id"])
+        user_id = (change.get("fullDocument") or {}).get("user_id")
+        return str(user_id) if user_id is not None else None
+
+    def _poll(self):
+        if self._polled_until is None:
+            self._polled_until = datetime.now()
+        if self._last_poll and datetime.now() - self._last_poll > POLL_RETENTION - POLL_OVERLAP:
+            # Down for so long that recorded changes may have expired
+            self._evict_all()
+            self._polled_until = datetime.now()
+
+        while True:
+            since = self._polled_until - POLL_OVERLAP
+            changes = list(
+                cache_invalidations_collection.find({"t": {"$gt": since}}).sort("t", 1)
+            )
+            for change in changes:
+                if change["c"] in self._handlers:
+                    self._dispatch(change["c"], change["u"])
+                self._polled_until = max(self._polled_until, change["t"])
+            self._last_poll = datetime.now()
+            self._set_live(True)
+            time.sleep(self.poll_seconds)
+
+
+# Shared per-process bus, started with the app
+invalidation_bus = InvalidationBus()
+
+
+class InvalidatedCache:
+    """
+    TTL cache of values owned by a user, evicted when the invalidation bus
+    reports a change to that user's documents in one of the collections
+
+    Values are only served and stored while the bus is live. A value loaded
+    while an eviction happened is not stored, since it may predate the change.
+    """
+
+    def __init__(self, collections, maxsize: int, ttl: float):
+        self._values = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._keys: Dict[str, set] = defaultdict(set)  # user id -> keys
+        self._lock = threading.Lock()
+        self._generation = 0
+        for collection in collections:
+            invalidation_bus.subscribe(collection, self.evict)
+
+    def get(self, key: Hashable, load: Callable, user_id):
+        """
+        Get a cached value or load it; user_id is the owner's id, or a
+        function giving it from the loaded value. None is never cached.
+        """
+        if not invalidation_bus.live:
+            return load()
+
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None:
+                return cached[1]
+            generation = self._generation
+
+        value = load()
+        if value is not None:
+            owner = user_id(value) if callable(user_id) else user_id
+            with self._lock:
+                if self._generation == generation:
+                    self._values[key] = (owner, value)
+                    self._keys[owner].add(key)
+                    if len(self._keys) > 2 * self._values.maxsize:
+                        self._prune()
+        return value
+
+    def evict(self, user_id: Optional[str] = None):
+        """
+        Drop a user's values, or every value when user_id is None
+        """
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._values.clear()
+                self._keys.clear()
+            else:
+                for key in self._keys.pop(user_id, ()):
+                    self._values.pop(key, None)
+
+    def _prune(self):
+        # Forget keys of values that expired or were evicted by size
+        self._keys = defaultdict(set)
+        for key, (owner, _) in self._values.items():
+            self._keys[owner].add(key)
@@ -1,3 +1,7 @@
 from slowapi import Limiter
 
-limiter = Limiter(key_func=lambda: "global")
\ No newline at end of file
+# slowapi is imported eagerly, unlike the Gemini SDK or passlib: its
+# decorators have to wrap the route functions when the routes are imported,
+# and its exception handler is registered before the app serves. It adds
+# about 40 ms to the import, mostly its storage backends.
+limiter = Limiter(key_func=lambda: "global")
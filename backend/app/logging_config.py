@@ -0,0 +1,146 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from app.config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATES
+
+# Correlation fields of the current request or background job. The dict is
+# shared by everything running on behalf of the request (middleware,
+# dependencies, threadpool calls), so fields bound later, like the user id,
+# show up on all of its records.
+_log_context: ContextVar[Optional[Dict]] = ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[QueueHandler] = None
+
+
+def new_context(**fields) -> Dict:
+    """
+    Start a correlation context for a request or background job, with a
+    fresh request id unless one is given
+    """
+    context = {"request_id": fields.pop("request_id", None) or uuid.uuid4().hex, **fields}
+    _log_context.set(context)
+    return context
+
+
+def bind(**fields):
+    """
+    Add fields (e.g. user_id) to the current correlation context
+    """
+    context = _log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def get_context() -> Dict:
+    return _log_context.get() or {}
+
+
+def submit(executor, fn, *args):
+    """
+    Submit work to a background executor, keeping the submitter's
+    correlation context
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the correlation fields onto each record in the logging thread,
+    before the record is queued
+    """
+
+    def filter(self, record):
+        for field, value in get_context().items():
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with the message, level, logger, correlation
+    fields and any extra= fields
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def should_sample(path: str) -> bool:
+    """
+    Decide whether to log a request to a high-volume route, according to
+    LOG_SAMPLE_RATES (path -> share of requests logged; unlisted paths are
+    always logged)
+    """
+    rate = LOG_SAMPLE_RATES.get(path)
+    return rate is None or random.random() < rate
+
+
+def setup_logging():
+    """
+    Route the app's log records through a queue to a background thread that
+    writes them to stdout, so logging never blocks request handling
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+    _handler = QueueHandler(queue.SimpleQueue())
+    _handler.addFilter(ContextFilter())
+    _listener = QueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(lambda: _listener.stop())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+
+def _restart_after_fork():
+    """
+    Threads do not survive fork: give a forked worker (e.g. under a
+    preloading server) its own queue and writer thread
+    """
+    global _listener
+    if _listener is None:
+        return
+    _handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+from app import metrics
+from app.config import (
+    LOOP_MONITOR_DEBUG,
+    LOOP_MONITOR_INTERVAL_MS,
+    LOOP_STALL_THRESHOLD_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag with a heartbeat task
+
+    The heartbeat sleeps for a fixed interval; any extra delay before it
+    wakes up is time the loop spent blocked. Lag is exported as the
+    event_loop_lag_ms metric and beats later than LOOP_STALL_THRESHOLD_MS
+    are kept as stalls. In debug mode a watchdog thread also captures the
+    stack of the loop thread while it is blocked, pointing at the call
+    that blocks it.
+    """
+
+    def __init__(
+        self,
+        interval_ms: int = LOOP_MONITOR_INTERVAL_MS,
+        threshold_ms: int = LOOP_STALL_THRESHOLD_MS,
+        capture_stacks: bool = LOOP_MONITOR_DEBUG,
+    ):
+        self.interval = interval_ms / 1000
+        self.threshold_ms = threshold_ms
+        self.capture_stacks = capture_stacks
+        self.stalls = deque(maxlen=100)
+        self._beat = 0
+        self._beat_started = 0.0
+        self._stack = None  # (beat, formatted stack) captured by the watchdog
+        self._loop_thread_id = None
+        self._beat_done: Optional[asyncio.Event] = None
+        self._task = None
+
+    def start(self):
+        """
+        Start monitoring the running event loop
+        """
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat_done = asyncio.Event()
+        self._beat_started = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        if self.capture_stacks:
+            threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+
+    async def _heartbeat(self):
+        while True:
+            self._beat += 1
+            self._beat_started = started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+            woke = time.perf_counter()
+            lag_ms = max((woke - started - self.interval) * 1000, 0)
+            metrics.set_gauge("event_loop_lag_ms", lag_ms)
+            metrics.observe("event_loop_lag_ms", lag_ms)
+
+            if lag_ms > self.threshold_ms:
+                stack = self._stack[1] if self._stack and self._stack[0] == self._beat else None
+                self.stalls.append({"ended": woke, "duration_ms": lag_ms, "stack": stack})
+                metrics.increment("event_loop_stalls_total")
+                if self.capture_stacks:
+                    logger.warning(
+                        "Event loop blocked for %.0f ms%s",
+                        lag_ms,
+                        f", blocking frame:\n{stack}" if stack else "",
+                        extra={"lag_ms": round(lag_ms, 1)},
+                    )
+
+            # Wake up anyone waiting for an up-to-date measurement
+            self._beat_done.set()
+            self._beat_done = asyncio.Event()
+
+    def _watchdog(self):
+        while True:
+            time.sleep(self.threshold_ms / 2000)
+            beat = self._beat
+            overdue_ms = (time.perf_counter() - self._beat_started - self.interval) * 1000
+            if overdue_ms > self.threshold_ms and (self._stack is None or self._stack[0] != beat):
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._stack = (beat, "".join(traceback.format_stack(frame)))
+
+    async def next_beat(self):
+        """
+        Wait until the heartbeat has measured the loop again
+        """
+        if self._beat_done is not None:
+            await asyncio.wait_for(self._beat_done.wait(), self.interval * 2 + 1)
+
+    def stalls_since(self, since: float, min_duration_ms: float = 0):
+        """
+        Get stalls that ended after a perf_counter() time
+        """
+        return [
+            stall
+            for stall in self.stalls
+            if stall["ended"] >= since and stall["duration_ms"] > min_duration_ms
+        ]
+
+
+# Shared per-process monitor, started with the app
+loop_monitor = LoopMonitor()
@@ -1,11 +1,28 @@
-from fastapi import FastAPI
+import logging
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import auth, user, meal_plan
+from fastapi.responses import JSONResponse
+from app import logging_config, metrics, warmup
+from app.config import LOOP_BLOCKING_BUDGET_MS, PROFILING_SAMPLE_RATE, PROFILING_TOKEN
+from app.invalidation import invalidation_bus
+from app.loop_monitor import loop_monitor
+from app.push import push_hub
+from app.models.request_profile import RequestProfileModel
+from app.profiling import RequestProfiler
+from app.routes import auth, user, meal_plan, recipe, profiling
+from app.services import profile_sync_service, topup_service
+from app.services.topup_service import TopUpService
 from app.database import get_db
 from app.limiter import limiter
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
+logging_config.setup_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Cuisine Compass API",
@@ -34,6 +51,135 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(user.router)
 app.include_router(meal_plan.router)
+app.include_router(recipe.router)
+app.include_router(profiling.router)
+
+
+async def profile_requests(request: Request, call_next):
+    """
+    Profile requests carrying the profiling token in an X-Profile header, and
+    a random PROFILING_SAMPLE_RATE share of the others
+
+    The profile id is returned in the X-Profile-Id response header.
+    """
+    authorized = bool(PROFILING_TOKEN) and request.headers.get("X-Profile") == PROFILING_TOKEN
+    sampled = not authorized and random.random() < PROFILING_SAMPLE_RATE
+    if not (authorized or sampled):
+        return await call_next(request)
+
+    # Skipped if another request is being profiled in this process
+    profiler = RequestProfiler()
+    if not profiler.start():
+        return await call_next(request)
+
+    try:
+        response = await call_next(request)
+    finally:
+        capture = profiler.stop()
+
+    response.headers["X-Profile-Id"] = RequestProfileModel.create(
+        request.method, request.url.path, response.status_code, capture, sampled
+    )
+    return response
+
+
+# Only installed when enabled, so requests pay nothing otherwise
+if PROFILING_TOKEN or PROFILING_SAMPLE_RATE:
+    app.middleware("http")(profile_requests)
+
+
+async def enforce_blocking_budget(request: Request, call_next):
+    """
+    Test mode: fail requests that blocked the event loop for longer than
+    LOOP_BLOCKING_BUDGET_MS, reporting the blocking stack when captured
+    """
+    started = time.perf_counter()
+    response = await call_next(request)
+
+    await loop_monitor.next_beat()
+    stalls = loop_monitor.stalls_since(started, LOOP_BLOCKING_BUDGET_MS)
+    if not stalls:
+        return response
+
+    worst = max(stalls, key=lambda stall: stall["duration_ms"])
+    return JSONResponse(
+        status_code=500,
+        content={
+            "detail": f"{request.method} {request.url.path} blocked the event loop for "
+            f"{worst['duration_ms']:.0f} ms (budget {LOOP_BLOCKING_BUDGET_MS} ms)",
+            "stack": worst["stack"],
+        },
+    )
+
+
+if LOOP_BLOCKING_BUDGET_MS is not None:
+    app.middleware("http")(enforce_blocking_budget)
+
+
+async def log_requests(request: Request, call_next):
+    """
+    Give each request a correlation id, taken from the X-Request-ID header
+    or generated, and write a (sampled) access log line when it completes
+
+    The id is returned in the X-Request-ID response header.
+    """
+    context = logging_config.new_context(request_id=request.headers.get("X-Request-ID"))
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        logger.exception(
+            "Unhandled error",
+            extra={"method": request.method, "path": request.url.path},
+        )
+        raise
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    if response.status_code >= 500 or logging_config.should_sample(request.url.path):
+        logger.log(
+            logging.ERROR if response.status_code >= 500 else logging.INFO,
+            "%s %s %s",
+            request.method,
+            request.url.path,
+            response.status_code,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "duration_ms": duration_ms,
+            },
+        )
+    response.headers["X-Request-ID"] = context["request_id"]
+    return response
+
+
+# Added last so it wraps the other middleware
+app.middleware("http")(log_requests)
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """
+    Start the event-loop monitor, the background warm-up, cache invalidation,
+    the relay of pushed events and the nightly speculative top-up when it is
+    enabled
+    """
+    loop_monitor.start()
+    warmup.start()
+    invalidation_bus.start()
+    push_hub.start()
+    TopUpService.start_scheduler()
+
+
+@app.on_event("shutdown")
+async def drain_background_jobs():
+    """
+    Let running background jobs finish before the worker exits; the server
+    has already drained in-flight requests. Queued top-ups are dropped, the
+    next nightly run picks those users up again.
+    """
+    await run_in_threadpool(topup_service.executor.shutdown, True, cancel_futures=True)
+    await run_in_threadpool(profile_sync_service.executor.shutdown, True)
 
 
 @app.get("/")
@@ -56,6 +202,24 @@ async def health_check():
         return {"status": "unhealthy", "database": str(e)}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness check: 503 until the startup warm-up has created the indexes
+    """
+    if not warmup.is_ready():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    In-process counters, gauges and latency summaries
+    """
+    return metrics.snapshot()
+
+
 # Main entry point
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,64 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# In-process metrics registry, exposed by GET /metrics
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, Dict[str, float]] = {}
+
+
+def _key(name: str, labels: Dict) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{label}="{value}"' for label, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def increment(name: str, value: float = 1, **labels):
+    """
+    Add to a counter
+    """
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """
+    Set a gauge to its current value
+    """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Record an observation (e.g. a latency) in a count/sum/min/max summary
+    """
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            _summaries[key] = {"count": 1, "sum": value, "min": value, "max": value}
+        else:
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+
+
+def snapshot():
+    """
+    Get a copy of every metric
+    """
+    with _lock:
+        summaries = {
+            key: {**summary, "avg": summary["sum"] / summary["count"]}
+            for key, summary in _summaries.items()
+        }
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": summaries,
+        }
@@ -0,0 +1,309 @@
+from datetime import date, timedelta
+from typing import Dict
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.config import DASHBOARD_HISTORY_DAYS
+from app.database import (
+    dashboard_summaries_collection,
+    meal_plans_collection,
+    read_session,
+    reader,
+)
+from app.models.meal_history import MealHistoryModel
+from app.models.recipe import RecipeModel
+
+NUTRIENTS = ("calories", "protein_g", "carbs_g", "fat_g")
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _day_totals(meals: Dict) -> Dict[str, float]:
+    """
+    Sum the nutrition of a day's meals (full meals, not references)
+    """
+    totals = dict.fromkeys(NUTRIENTS, 0.0)
+    for meal in meals.values():
+        nutrition = (meal.get("recipe") or {}).get("nutrition") or {}
+        for nutrient in NUTRIENTS:
+            totals[nutrient] += _number(nutrition.get(nutrient))
+    return {nutrient: round(value, 1) for nutrient, value in totals.items()}
+
+
+def _week(date_str: str) -> str:
+    """
+    Get the ISO date of the Monday starting a date's week
+    """
+    day = date.fromisoformat(date_str)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _cutoff(today: date = None) -> str:
+    """
+    Get the first date kept in summaries: the start of the week holding the
+    oldest kept day, so every kept week is whole
+    """
+    oldest = (today or date.today()) - timedelta(days=DASHBOARD_HISTORY_DAYS)
+    return _week(oldest.isoformat())
+
+
+def _next_streak(streak: Dict, date_str: str) -> Dict:
+    """
+    Extend a completion streak with a completed date
+
+    A date before the last completed one leaves the streak as it is; it
+    only becomes exact again when the summary is rebuilt.
+    """
+    last = streak.get("last")
+    if last and date_str <= last:
+        return streak
+    if last and date.fromisoformat(date_str) - date.fromisoformat(last) == timedelta(days=1):
+        current = streak.get("current", 0) + 1
+    else:
+        current = 1
+    return {"current": current, "longest": max(current, streak.get("longest", 0)), "last": date_str}
+
+
+class DashboardSummaryModel:
+    """
+    Per-user rollups for the dashboard, kept in one small document per user
+    and updated as days are planned, regenerated and completed
+
+    Holds planned nutrition and completion for each recent day, planned and
+    completed days with eaten nutrition per week, the number of days left in
+    meal plans and the completion streak. Summaries created by an update
+    rather than a rebuild are flagged, since they may lack earlier days, and
+    rebuilt from meal plans and history when first read. Every update
+    increases the summary's revision, so a rebuild can tell whether the
+    summary changed while it was computed.
+    """
+
+    @staticmethod
+    def add_days(user_id: str, days: Dict[str, Dict]):
+        """
+        Record newly planned days, given as ISO date -> full meals
+        """
+        planned_per_week: Dict[str, int] = {}
+        for date_str in days:
+            week = _week(date_str)
+            planned_per_week[week] = planned_per_week.get(week, 0) + 1
+
+        dashboard_summaries_collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {
+                "$set": {
+                    f"days.{date_str}": {
+                        "planned": True,
+                        "completed": False,
+                        **_day_totals(meals),
+                    }
+                    for date_str, meals in days.items()
+                },
+                "$inc": {
+                    "revision": 1,
+                    "remaining": len(days),
+                    **{f"weeks.{week}.planned": n for week, n in planned_per_week.items()},
+                },
+                "$setOnInsert": {"rebuild": True},
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def set_day_meals(user_id: str, date_str: str, meals: Dict):
+        """
+        Update the planned nutrition of a day whose meals were replaced
+        """
+        dashboard_summaries_collection.update_one(
+            {"_id": ObjectId(user_id), f"days.{date_str}": {"$exists": True}},
+            {
+                "$set": {
+                    f"days.{date_str}.{nutrient}": value
+                    for nutrient, value in _day_totals(meals).items()
+                },
+                "$inc": {"revision": 1},
+            },
+        )
+
+    @staticmethod
+    def complete_day(user_id: str, date_str: str, meals: Dict):
+        """
+        Record a completed day with the full meals it held, extend the streak
+        and drop rollups that fell out of the kept window
+
+        A day already recorded as completed is not counted again; the streak
+        is still extended, as a retry may follow a failure in between.
+        """
+        totals = _day_totals(meals)
+        week = _week(date_str)
+        summary_id = ObjectId(user_id)
+
+        update = {
+            "$set": {f"days.{date_str}": {"planned": True, "completed": True, **totals}},
+            "$inc": {
+                "revision": 1,
+                "remaining": -1,
+                f"weeks.{week}.completed": 1,
+                **{f"weeks.{week}.{nutrient}": value for nutrient, value in totals.items()},
+            },
+            "$setOnInsert": {"rebuild": True},
+        }
+        previous = None
+        for upsert in (True, False):
+            try:
+                previous = dashboard_summaries_collection.find_one_and_update(
+                    {"_id": summary_id, f"days.{date_str}.completed": {"$ne": True}},
+                    update,
+                    projection={"streak": 1, "days": 1, "weeks": 1},
+                    upsert=upsert,
+                    return_document=ReturnDocument.BEFORE,
+                )
+                break
+            except DuplicateKeyError:
+                # The summary exists: it was created concurrently, or already
+                # holds this day as completed
+                continue
+
+        # The streak depends on its previous value: set it only if no
+        # concurrent completion changed it in between, else re-read
+        cutoff = _cutoff()
+        for _ in range(3):
+            previous = previous or {}
+            streak = previous.get("streak") or {}
+            update = {
+                "$set": {"streak": _next_streak(streak, date_str)},
+                "$inc": {"revision": 1},
+            }
+            stale = [
+                f"{field}.{key}"
+                for field in ("days", "weeks")
+                for key in previous.get(field, {})
+                if key < cutoff
+            ]
+            if stale:
+                update["$unset"] = dict.fromkeys(stale, "")
+
+            result = dashboard_summaries_collection.update_one(
+                {"_id": summary_id, "streak.last": streak.get("last")},
+                update,
+            )
+            if result.matched_count:
+                return
+            previous = dashboard_summaries_collection.find_one(
+                {"_id": summary_id}, {"streak": 1, "days": 1, "weeks": 1}
+            )
+
+    @staticmethod
+    def rebuild(user_id: str, today: date = None) -> Dict:
+        """
+        Recompute a user's summary from their meal plans and history
+
+        The summary is only replaced if no update reached it in the meantime;
+        otherwise it stays flagged and is rebuilt on the next read.
+        """
+        summary_id = ObjectId(user_id)
+        current = dashboard_summaries_collection.find_one({"_id": summary_id}, {"revision": 1})
+        revision = (current or {}).get("revision")
+        cutoff = _cutoff(today)
+        days: Dict[str, Dict] = {}
+        weeks: Dict[str, Dict] = {}
+        remaining = 0
+
+        meal_plans = list(meal_plans_collection.find({"user_id": ObjectId(user_id)}))
+        RecipeModel.resolve_plans(meal_plans)
+        for meal_plan in meal_plans:
+            for day_key, date_str in meal_plan.get("dates", {}).items():
+                remaining += 1
+                if date_str >= cutoff and day_key in meal_plan.get("days", {}):
+                    days[date_str] = {
+                        "planned": True,
+                        "completed": False,
+                        **_day_totals(meal_plan["days"][day_key]),
+                    }
+
+        for day in MealHistoryModel.get_range(user_id, cutoff):
+            days[day["date"]] = {"planned": True, "completed": True, **_day_totals(day["meals"])}
+
+        for date_str, day in days.items():
+            week = weeks.setdefault(
+                _week(date_str), {"planned": 0, "completed": 0, **dict.fromkeys(NUTRIENTS, 0.0)}
+            )
+            week["planned"] += 1
+            if day["completed"]:
+                week["completed"] += 1
+                for nutrient in NUTRIENTS:
+                    week[nutrient] += day[nutrient]
+
+        streak: Dict = {}
+        for date_str in MealHistoryModel.get_dates(user_id):
+            streak = _next_streak(streak, date_str)
+
+        summary = {
+            "_id": summary_id,
+            "days": days,
+            "weeks": weeks,
+            "remaining": remaining,
+            "streak": streak,
+            "revision": (revision or 0) + 1,
+        }
+        try:
+            dashboard_summaries_collection.replace_one(
+                {"_id": summary_id, "revision": revision}, summary, upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # updated while rebuilding
+        return summary
+
+    @staticmethod
+    def get(user_id: str, today: date = None) -> Dict:
+        """
+        Get a user's dashboard summary: recent and planned days, weekly
+        rollups, adherence and streak
+        """
+        today = today or date.today()
+        operation = "dashboard.get"
+        with read_session(user_id, operation) as session:
+            summary = reader(dashboard_summaries_collection, operation).find_one(
+                {"_id": ObjectId(user_id)}, session=session
+            )
+        if summary is None or summary.get("rebuild"):
+            summary = DashboardSummaryModel.rebuild(user_id, today)
+
+        cutoff = _cutoff(today)
+        days = [
+            {"date": date_str, **day}
+            for date_str, day in sorted(summary.get("days", {}).items())
+            if date_str >= cutoff
+        ]
+        weeks = [
+            {"week": week, **rollup}
+            for week, rollup in sorted(summary.get("weeks", {}).items())
+            if week >= cutoff
+        ]
+        past = [day for day in days if day["date"] <= today.isoformat()]
+        completed = sum(day["completed"] for day in past)
+
+        streak = summary.get("streak") or {}
+        last = streak.get("last")
+        # A streak is broken once a whole day passes without a completion
+        current = streak.get("current", 0)
+        if not last or date.fromisoformat(last) < today - timedelta(days=1):
+            current = 0
+
+        return {
+            "today": today.isoformat(),
+            "remaining_days": max(summary.get("remaining", 0), 0),
+            "days": days,
+            "weeks": weeks,
+            "adherence": round(completed / len(past), 3) if past else None,
+            "streak": {
+                "current": current,
+                "longest": streak.get("longest", 0),
+                "last_completed": last,
+            },
+        }
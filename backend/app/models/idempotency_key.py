@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from typing import Dict
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.config import IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_TTL_HOURS
+from app.database import idempotency_keys_collection
+
+
+class IdempotencyKeyModel:
+    @staticmethod
+    def _id(user_id: str, key: str):
+        return f"{user_id}:{key}"
+
+    @staticmethod
+    def claim(user_id: str, key: str, endpoint: str, request_hash: str):
+        """
+        Record a key as in progress, leased for IDEMPOTENCY_LEASE_SECONDS
+
+        Returns None if the key was claimed, or the existing record if the
+        key has been used before. An in-progress record of the same request
+        whose lease has run out is taken over, since the worker running it
+        is gone. Records expire after IDEMPOTENCY_TTL_HOURS through a TTL
+        index.
+        """
+        record_id = IdempotencyKeyModel._id(user_id, key)
+        while True:
+            now = datetime.now()
+            record = {
+                "_id": record_id,
+                "user_id": ObjectId(user_id),
+                "endpoint": endpoint,
+                "request_hash": request_hash,
+                "status": "in_progress",
+                "created_at": now,
+                "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+            }
+            try:
+                idempotency_keys_collection.insert_one(record)
+                return None
+            except DuplicateKeyError:
+                pass
+
+            taken_over = idempotency_keys_collection.find_one_and_update(
+                {
+                    "_id": record_id,
+                    "status": "in_progress",
+                    "request_hash": request_hash,
+                    "locked_until": {"$lt": now},
+                },
+                {"$set": {"locked_until": record["locked_until"]}},
+            )
+            if taken_over is not None:
+                return None
+
+            existing = IdempotencyKeyModel.get(user_id, key)
+            if existing is not None:
+                return existing
+            # Released in between: claim it again
+
+    @staticmethod
+    def get(user_id: str, key: str):
+        return idempotency_keys_collection.find_one({"_id": IdempotencyKeyModel._id(user_id, key)})
+
+    @staticmethod
+    def renew(user_id: str, key: str):
+        """
+        Extend the lease of a key whose request is still running
+        """
+        idempotency_keys_collection.update_one(
+            {"_id": IdempotencyKeyModel._id(user_id, key), "status": "in_progress"},
+            {"$set": {"locked_until": datetime.now() + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}},
+        )
+
+    @staticmethod
+    def complete(user_id: str, key: str, response: Dict):
+        """
+        Store the response of a finished request
+        """
+        idempotency_keys_collection.update_one(
+            {"_id": IdempotencyKeyModel._id(user_id, key)},
+            {
+                "$set": {"status": "completed", "response": response, "completed_at": datetime.now()},
+                "$unset": {"locked_until": ""},
+            },
+        )
+
+    @staticmethod
+    def release(user_id: str, key: str):
+        """
+        Forget a key whose request failed, so a retry runs it again
+        """
+        idempotency_keys_collection.delete_one({"_id": IdempotencyKeyModel._id(user_id, key)})
@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Dict, List
+from bson import ObjectId
+from app.database import meal_history_collection
+from app.models.recipe import RecipeModel
+
+
+class MealHistoryModel:
+    @staticmethod
+    def add(user_id: str, date_str: str, meals: Dict, meal_plan_id=None):
+        """
+        Append a completed day to the user's history, unless that date is
+        already there
+
+        Meals are kept as stored in the plan, i.e. as recipe references.
+        Time-series collections have no unique indexes, so two concurrent
+        completions of a date may both add it; readers keep one per date.
+        """
+        if meal_history_collection.find_one(
+            {"user_id": ObjectId(user_id), "date": date_str}, {"_id": 1}
+        ):
+            return
+        meal_history_collection.insert_one(
+            {
+                "user_id": ObjectId(user_id),
+                "date": date_str,
+                "meals": meals,
+                "meal_plan_id": meal_plan_id,
+                "completed_at": datetime.now(),
+            }
+        )
+
+    @staticmethod
+    def get_range(user_id: str, start_date: str = None, end_date: str = None) -> List[Dict]:
+        """
+        Get the completed days of a user, optionally limited to an inclusive
+        range of ISO dates, oldest first with recipes resolved
+        """
+        query = {"user_id": ObjectId(user_id)}
+        date_filter = {}
+        if start_date:
+            date_filter["$gte"] = start_date
+        if end_date:
+            date_filter["$lte"] = end_date
+        if date_filter:
+            query["date"] = date_filter
+
+        cursor = meal_history_collection.find(
+            query, {"_id": 0, "date": 1, "meals": 1, "completed_at": 1}
+        ).sort("date", 1)
+        days = list({day["date"]: day for day in cursor}.values())
+        # Resolve all days' recipes in one lookup, shaped like a plan
+        RecipeModel.resolve_plans([{"days": {str(i): day["meals"] for i, day in enumerate(days)}}])
+        return days
+
+    @staticmethod
+    def get_dates(user_id: str) -> List[str]:
+        """
+        Get every completed ISO date of a user, oldest first
+        """
+        cursor = meal_history_collection.find(
+            {"user_id": ObjectId(user_id)}, {"_id": 0, "date": 1}
+        ).sort("date", 1)
+        return list(dict.fromkeys(day["date"] for day in cursor))
+
+    @staticmethod
+    def get_user_ids(since: datetime):
+        """
+        Get the ids of users who completed a day since a point in time
+        """
+        return meal_history_collection.distinct("user_id", {"completed_at": {"$gte": since}})
@@ -1,12 +1,24 @@
 from datetime import datetime, date, timedelta
 from bson import ObjectId
-from app.database import meal_plans_collection
+from pymongo import ReturnDocument
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+from app.database import meal_plans_collection, read_session, reader, run_in_transaction
+from app.invalidation import InvalidatedCache, invalidation_bus
+from app.models.dashboard_summary import DashboardSummaryModel
+from app.models.meal_history import MealHistoryModel
+from app.models.meal_plan_changes import CREATED, MODIFIED, REMOVED, MealPlanChangesModel
+from app.models.recipe import RecipeModel
 from typing import List, Dict
 
+# Plan versions by user, the fingerprint checked by derived caches
+versions_cache = InvalidatedCache(["meal_plans"], USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
 
 class MealPlanModel:
     @staticmethod
-    def create(user_id: str, meal_plan_data: Dict, days: int, start_date=None):
+    def create(
+        user_id: str, meal_plan_data: Dict, days: int, start_date=None, restrictions=()
+    ):
         """
         Create a new meal plan for a user
         
@@ -15,6 +27,7 @@ class MealPlanModel:
         - meal_plan_data: The meal plan data from the Gemini API
         - days: Number of days to generate
         - start_date: The starting date for the meal plan (defaults to today if None)
+        - restrictions: Dietary restrictions the meals were generated under
         """
         # Use provided start_date or default to today
         if start_date is None:
@@ -27,34 +40,271 @@ class MealPlanModel:
             day_date = start_date + timedelta(days=i)
             dates[day_key] = day_date.isoformat()  # Store as ISO format string
 
-        # Create the meal plan document
+        # Store recipe bodies once in the recipes collection and reference them
         meal_plan = {
+            "_id": ObjectId(),
             "user_id": ObjectId(user_id),
-            "days": meal_plan_data,
+            "days": RecipeModel.store_days(meal_plan_data, restrictions),
             "dates": dates,
+            "version": 1,
             "created_at": datetime.now(),
         }
 
-        result = meal_plans_collection.insert_one(meal_plan)
-        meal_plan["_id"] = result.inserted_id
+        changes = [(CREATED, date_str, meal_plan["_id"], key) for key, date_str in dates.items()]
+
+        # The plan and its change log entries are written together
+        def write(session):
+            meal_plans_collection.insert_one(meal_plan, session=session)
+            return MealPlanChangesModel.record(user_id, changes, session)
+
+        version = run_in_transaction(write)
+        invalidation_bus.publish("meal_plans", user_id)
+        MealPlanChangesModel.announce(user_id, version, changes)
+        DashboardSummaryModel.add_days(
+            user_id, {date_str: meal_plan_data[key] for key, date_str in dates.items()}
+        )
+        meal_plan["days"] = meal_plan_data
         return meal_plan
 
     @staticmethod
-    def get_by_user(user_id: str):
+    def get_by_user(
+        user_id: str, resolve: bool = True, operation: str = "meal_plans.get_by_user"
+    ):
+        """
+        Get all meal plans for a user, with recipe references resolved unless
+        resolve is False, read with the preference configured for operation
+        """
+        with read_session(user_id, operation) as session:
+            cursor = reader(meal_plans_collection, operation).find(
+                {"user_id": ObjectId(user_id)}, session=session
+            )
+            meal_plans = list(cursor)
+            if resolve:
+                RecipeModel.resolve_plans(meal_plans, operation, session)
+        return meal_plans
+
+    @staticmethod
+    def get_by_id(user_id: str, meal_plan_id):
+        """
+        Get one of a user's meal plans with recipe references resolved, or
+        None if it no longer exists
+        """
+        meal_plan = meal_plans_collection.find_one(
+            {"_id": meal_plan_id, "user_id": ObjectId(user_id)}
+        )
+        if meal_plan is None:
+            return None
+        return RecipeModel.resolve_plans([meal_plan])[0]
+
+    @staticmethod
+    def get_versions(user_id: str, cached: bool = True):
+        """
+        Get the (id, version) pairs of a user's meal plans, used as a cheap
+        fingerprint for caches derived from plan contents; read from the
+        primary, bypassing the per-worker cache if cached is False
+        """
+
+        def load():
+            cursor = meal_plans_collection.find(
+                {"user_id": ObjectId(user_id)}, {"version": 1}
+            ).sort("_id", 1)
+            return tuple((str(plan["_id"]), plan.get("version", 0)) for plan in cursor)
+
+        if not cached:
+            return load()
+        return versions_cache.get(user_id, load, user_id)
+
+    @staticmethod
+    def get_ingredients(user_id: str, start_date: str = None, end_date: str = None):
+        """
+        Stream the ingredients of every planned meal, optionally limited to
+        an inclusive range of ISO dates
+
+        Only the ingredient arrays leave the database; one document is
+        yielded per ingredient with its item, quantity and unit.
+        """
+        date_filter = {}
+        if start_date:
+            date_filter["$gte"] = start_date
+        if end_date:
+            date_filter["$lte"] = end_date
+
+        pipeline = [
+            {"$match": {"user_id": ObjectId(user_id)}},
+            {"$project": {"days": 1, "dates": {"$objectToArray": "$dates"}}},
+            {"$unwind": "$dates"},
+        ]
+        if date_filter:
+            pipeline.append({"$match": {"dates.v": date_filter}})
+        pipeline += [
+            # Pick the day stored under the same DayX key as the matched date
+            {
+                "$project": {
+                    "day": {
+                        "$arrayElemAt": [
+                            {
+                                "$filter": {
+                                    "input": {"$objectToArray": "$days"},
+                                    "as": "day",
+                                    "cond": {"$eq": ["$$day.k", "$dates.k"]},
+                                }
+                            },
+                            0,
+                        ]
+                    }
+                }
+            },
+            {"$project": {"meals": {"$objectToArray": "$day.v"}}},
+            {"$unwind": "$meals"},
+            # Referenced meals keep their ingredients in the recipes collection,
+            # older plans embed them directly
+            {
+                "$lookup": {
+                    "from": "recipes",
+                    "localField": "meals.v.recipe_id",
+                    "foreignField": "_id",
+                    "as": "stored",
+                }
+            },
+            {
+                "$project": {
+                    "ingredients": {
+                        "$ifNull": [
+                            {"$arrayElemAt": ["$stored.recipe.ingredients", 0]},
+                            "$meals.v.recipe.ingredients",
+                        ]
+                    }
+                }
+            },
+            {"$unwind": "$ingredients"},
+            {"$replaceRoot": {"newRoot": "$ingredients"}},
+        ]
+
+        operation = "meal_plans.get_ingredients"
+        with read_session(user_id, operation) as session:
+            yield from reader(meal_plans_collection, operation).aggregate(
+                pipeline, session=session
+            )
+
+    @staticmethod
+    def get_days(user_id: str, days: List):
+        """
+        Get specific days of a user's meal plans, given as (meal plan id,
+        day key) pairs, with recipe references resolved
+
+        Returns (meal plan id, day key) -> {"date", "meals"}; days no longer
+        in their plan are left out.
+        """
+        keys_by_plan: Dict[ObjectId, set] = {}
+        for meal_plan_id, day_key in days:
+            keys_by_plan.setdefault(meal_plan_id, set()).add(day_key)
+        if not keys_by_plan:
+            return {}
+
+        projection = {"dates": 1}
+        for day_keys in keys_by_plan.values():
+            projection.update({f"days.{day_key}": 1 for day_key in day_keys})
+        meal_plans = list(
+            meal_plans_collection.find(
+                {"_id": {"$in": list(keys_by_plan)}, "user_id": ObjectId(user_id)}, projection
+            )
+        )
+        RecipeModel.resolve_plans(meal_plans)
+
+        found = {}
+        for meal_plan in meal_plans:
+            for day_key in keys_by_plan[meal_plan["_id"]]:
+                if day_key in meal_plan.get("dates", {}) and day_key in meal_plan.get("days", {}):
+                    found[(meal_plan["_id"], day_key)] = {
+                        "date": meal_plan["dates"][day_key],
+                        "meals": meal_plan["days"][day_key],
+                    }
+        return found
+
+    @staticmethod
+    def find_day(user_id: str, date_str: str):
+        """
+        Find the meal plan holding a date
+
+        Returns (meal plan, day key) with recipe references resolved, or
+        (None, None) if the date is not planned.
+        """
+        meal_plans = meal_plans_collection.find(
+            {"user_id": ObjectId(user_id)}, {"dates": 1}
+        )
+
+        for meal_plan in meal_plans:
+            for key, value in meal_plan.get("dates", {}).items():
+                if value == date_str:
+                    full_plan = meal_plans_collection.find_one({"_id": meal_plan["_id"]})
+                    if full_plan is None or key not in full_plan.get("days", {}):
+                        return None, None
+                    return RecipeModel.resolve_plans([full_plan])[0], key
+
+        return None, None
+
+    @staticmethod
+    def replace_meals(
+        user_id: str, meal_plan_id, day_key: str, date_str: str, meals: Dict, restrictions=()
+    ):
         """
-        Get all meal plans for a user
+        Replace individual meals of one planned day in place
+
+        Only the replaced meal sub-documents are written, and only if the day
+        still holds the expected date.
         """
-        cursor = meal_plans_collection.find({"user_id": ObjectId(user_id)})
-        return list(cursor)
+        referenced = RecipeModel.store_days({day_key: meals}, restrictions)[day_key]
+        changes = [(MODIFIED, date_str, ObjectId(meal_plan_id), day_key)]
+
+        # The day and its change log entry are written together
+        def write(session):
+            updated = meal_plans_collection.find_one_and_update(
+                {
+                    "_id": ObjectId(meal_plan_id),
+                    "user_id": ObjectId(user_id),
+                    f"dates.{day_key}": date_str,
+                },
+                {
+                    "$set": {
+                        f"days.{day_key}.{meal_type}": meal
+                        for meal_type, meal in referenced.items()
+                    },
+                    "$inc": {"version": 1},
+                },
+                projection={f"days.{day_key}": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session,
+            )
+            if updated is None:
+                return None, None
+            return updated, MealPlanChangesModel.record(user_id, changes, session)
+
+        updated, version = run_in_transaction(write)
+        if updated is None:
+            return False
+
+        invalidation_bus.publish("meal_plans", user_id)
+        MealPlanChangesModel.announce(user_id, version, changes)
+        DashboardSummaryModel.set_day_meals(
+            user_id, date_str, RecipeModel.resolve_days(updated["days"])[day_key]
+        )
+        return True
 
     @staticmethod
     def mark_day_complete(user_id: str, date_str: str):
         """
-        Mark a specific day as complete by removing it
+        Mark a specific day as complete by moving it to the meal history
+
+        The day is added to the history and dashboard summary before it is
+        taken out of its plan; both are harmless to repeat for the same user
+        and date, so a retry after a failure part way completes the day. The
+        removal and its change log entry are written together, and announced
+        once committed. The plan is deleted once its last day is gone, so
+        completed days do not pile up in meal_plans.
         """
         # Find all meal plans for this user
-        meal_plans = meal_plans_collection.find({"user_id": ObjectId(user_id)})
-        
+        meal_plans = meal_plans_collection.find({"user_id": ObjectId(user_id)}, {"dates": 1})
+
         for meal_plan in meal_plans:
             # Find the day key that has this date
             day_key = None
@@ -62,16 +312,54 @@ class MealPlanModel:
                 if value == date_str:
                     day_key = key
                     break
-            
+
             if day_key:
-                # Remove this day from days and dates
-                result = meal_plans_collection.update_one(
-                    {"_id": meal_plan["_id"]},
-                    {"$unset": {f"days.{day_key}": "", f"dates.{day_key}": ""}},
+                planned = meal_plans_collection.find_one(
+                    {"_id": meal_plan["_id"], f"dates.{day_key}": date_str},
+                    {f"days.{day_key}": 1},
+                )
+                if planned is None:
+                    # Completed concurrently
+                    return False
+
+                meals = planned.get("days", {}).get(day_key, {})
+                changes = [(REMOVED, date_str, meal_plan["_id"], day_key)]
+                MealHistoryModel.add(user_id, date_str, meals, meal_plan["_id"])
+                DashboardSummaryModel.complete_day(
+                    user_id, date_str, RecipeModel.resolve_days({day_key: meals})[day_key]
                 )
-                if result.modified_count > 0:
-                    return True
-                
+
+                # Take this day out of days and dates, with its change log entry
+                def write(session):
+                    previous = meal_plans_collection.find_one_and_update(
+                        {"_id": meal_plan["_id"], f"dates.{day_key}": date_str},
+                        {
+                            "$unset": {f"days.{day_key}": "", f"dates.{day_key}": ""},
+                            "$inc": {"version": 1},
+                        },
+                        projection={"dates": 1},
+                        return_document=ReturnDocument.BEFORE,
+                        session=session,
+                    )
+                    if previous is None:
+                        return None, None
+                    if len(previous["dates"]) == 1:
+                        meal_plans_collection.delete_one(
+                            {"_id": meal_plan["_id"], "dates": {}}, session=session
+                        )
+                    return previous, MealPlanChangesModel.record(user_id, changes, session)
+
+                previous, version = run_in_transaction(write)
+                if previous is None:
+                    # Completed concurrently
+                    return False
+
+                invalidation_bus.publish(
+                    "meal_plans", user_id, deleted=len(previous["dates"]) == 1
+                )
+                MealPlanChangesModel.announce(user_id, version, changes)
+                return True
+
         return False
 
     @staticmethod
@@ -89,6 +377,30 @@ class MealPlanModel:
         result = list(meal_plans_collection.aggregate(pipeline))
         return result[0]["total_days"] if result else 0
 
+    @staticmethod
+    def get_active_user_ids(since: datetime):
+        """
+        Get the ids of users who generated a plan or completed a day since a
+        point in time (fully completed plans are gone from meal_plans)
+        """
+        user_ids = set(meal_plans_collection.distinct("user_id", {"created_at": {"$gte": since}}))
+        user_ids.update(MealHistoryModel.get_user_ids(since))
+        return [str(user_id) for user_id in user_ids]
+
+    @staticmethod
+    def get_planned_dates(user_id: str):
+        """
+        Get every planned ISO date of a user
+        """
+        pipeline = [
+            {"$match": {"user_id": ObjectId(user_id)}},
+            {"$project": {"dates": {"$objectToArray": "$dates"}}},
+            {"$unwind": "$dates"},
+            {"$project": {"_id": 0, "date": "$dates.v"}},
+        ]
+
+        return [doc["date"] for doc in meal_plans_collection.aggregate(pipeline)]
+
     @staticmethod
     def get_latest_date(user_id: str):
         """
@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app import events
+from app.config import SYNC_CHANGES_KEPT
+from app.database import meal_plan_changes_collection
+
+CREATED = "c"
+MODIFIED = "m"
+REMOVED = "r"
+KIND_NAMES = {CREATED: "created", MODIFIED: "modified", REMOVED: "removed"}
+
+
+class MealPlanChangesModel:
+    """
+    Per-user log of planned days that were created, modified or removed,
+    numbered by a version that increases with every change
+
+    Each user has one document holding the latest version and the last
+    SYNC_CHANGES_KEPT changes, oldest first, so the change at index i has
+    version version - len(changes) + 1 + i. Both are updated in a single
+    atomic write, so a reader never sees a version whose change is missing.
+    """
+
+    @staticmethod
+    def record(
+        user_id: str, changes: List[Tuple[str, str, ObjectId, str]], session=None
+    ) -> int:
+        """
+        Append changes given as (kind, ISO date, meal plan id, day key),
+        in the transaction of session if given, and return the new version
+
+        Pass the version to announce once the changes are committed.
+        """
+        # One entry per changed day, hence the short keys
+        entries = [
+            {"op": kind, "d": date_str, "p": meal_plan_id, "k": day_key}
+            for kind, date_str, meal_plan_id, day_key in changes
+        ]
+        log = meal_plan_changes_collection.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {
+                "$inc": {"version": len(entries)},
+                "$push": {"changes": {"$each": entries, "$slice": -SYNC_CHANGES_KEPT}},
+            },
+            projection={"version": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        return log["version"]
+
+    @staticmethod
+    def announce(user_id: str, version: int, changes: List[Tuple[str, str, ObjectId, str]]):
+        """
+        Announce recorded changes with a meal_plan_changed event
+        """
+        if not changes:
+            return
+        events.emit(
+            "meal_plan_changed",
+            user_id=user_id,
+            version=version,
+            changes=[
+                {"type": KIND_NAMES[kind], "date": date_str} for kind, date_str, _, _ in changes
+            ],
+        )
+
+    @staticmethod
+    def get_version(user_id: str) -> int:
+        """
+        Get a user's current change version (0 before any change)
+        """
+        log = meal_plan_changes_collection.find_one({"_id": ObjectId(user_id)}, {"version": 1})
+        return log["version"] if log else 0
+
+    @staticmethod
+    def get_since(user_id: str, since: int) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Get the current version and the changes made after version since,
+        oldest first
+
+        The changes are None when they are no longer all kept, or since is
+        ahead of the current version (e.g. a client of a restored database).
+        """
+        log = meal_plan_changes_collection.find_one({"_id": ObjectId(user_id)}) or {}
+        version = log.get("version", 0)
+        changes = log.get("changes", [])
+
+        oldest_kept = version - len(changes)
+        if since < oldest_kept or since > version:
+            return version, None
+        return version, changes[len(changes) - (version - since):]
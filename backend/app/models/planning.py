@@ -0,0 +1,139 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from app.config import (
+    MAX_PLANNED_DAYS,
+    PLANNING_RESERVATION_TTL_SECONDS,
+    PLANNING_WAIT_POLL_SECONDS,
+)
+from app.database import planning_collection
+from app.models.meal_plan import MealPlanModel
+
+# Compare-and-set retries before giving up under heavy contention
+MAX_RESERVE_ATTEMPTS = 10
+
+# Outcomes of finished reservations kept for requests that shared them
+MAX_OUTCOMES = 20
+
+
+class PlanningModel:
+    """
+    Per-user planning document holding the dates reserved by generation
+    requests that are still in flight
+
+    Every change bumps the document's seq, and reservations are only
+    written if seq is unchanged since it was read, so concurrent requests
+    (also across workers) can never reserve the same dates or overshoot
+    the capacity.
+
+    A reservation made with a key is shared: a request with the same key
+    arriving while it is in flight, in any worker, joins it and waits for
+    its outcome instead of generating again.
+    """
+
+    @staticmethod
+    def reserve(user_id: str, days: int, key: Optional[str] = None):
+        """
+        Atomically reserve up to days consecutive dates after the last
+        planned or reserved date (or from today)
+
+        Returns the reservation as {"id", "dates"}, or the in-flight
+        reservation of the same key with "joined" set. Raises ValueError if
+        the plan is already at capacity.
+        """
+        for _ in range(MAX_RESERVE_ATTEMPTS):
+            planning = PlanningModel._get_or_create(user_id)
+            now = datetime.now()
+            active = [r for r in planning["reservations"] if r["expires_at"] > now]
+            if key is not None:
+                for reservation in active:
+                    if reservation.get("key") == key:
+                        return {**reservation, "joined": True}
+
+            # Read plans after the planning document: a request that stored
+            # its plan and released its reservation since then changed seq
+            taken = set(MealPlanModel.get_planned_dates(user_id))
+            for reservation in active:
+                taken.update(reservation["dates"])
+
+            if len(taken) >= MAX_PLANNED_DAYS:
+                raise ValueError(
+                    f"Maximum meal plan capacity reached ({MAX_PLANNED_DAYS} days). Mark some days as complete before generating more."
+                )
+            days = min(days, MAX_PLANNED_DAYS - len(taken))
+
+            today = date.today()
+            latest = date.fromisoformat(max(taken)) if taken else None
+            start_date = latest + timedelta(days=1) if latest and latest >= today else today
+
+            reservation = {
+                "id": ObjectId(),
+                "dates": [(start_date + timedelta(days=i)).isoformat() for i in range(days)],
+                "expires_at": now + timedelta(seconds=PLANNING_RESERVATION_TTL_SECONDS),
+                "key": key,
+            }
+            result = planning_collection.update_one(
+                {"_id": ObjectId(user_id), "seq": planning["seq"]},
+                {
+                    "$set": {"reservations": active + [reservation], "updated_at": now},
+                    "$inc": {"seq": 1},
+                },
+            )
+            if result.modified_count:
+                return reservation
+
+        raise Exception("Could not reserve meal plan dates, please retry")
+
+    @staticmethod
+    def release(user_id: str, reservation_id, meal_plan_ids: Optional[List] = None):
+        """
+        Release a reservation once its plans are stored (or generation
+        failed, with meal_plan_ids None), recording the stored plans for
+        the requests that joined it
+        """
+        now = datetime.now()
+        update = {
+            "$pull": {"reservations": {"id": reservation_id}},
+            "$inc": {"seq": 1},
+            "$set": {"updated_at": now},
+        }
+        if meal_plan_ids is not None:
+            outcome = {"id": reservation_id, "meal_plan_ids": meal_plan_ids, "finished_at": now}
+            update["$push"] = {"outcomes": {"$each": [outcome], "$slice": -MAX_OUTCOMES}}
+        planning_collection.update_one({"_id": ObjectId(user_id)}, update)
+
+    @staticmethod
+    def wait(user_id: str, reservation) -> Optional[List]:
+        """
+        Wait for a joined reservation to be released
+
+        Returns the ids of the meal plans it stored, or None if its
+        generation failed or it expired.
+        """
+        while datetime.now() < reservation["expires_at"]:
+            planning = planning_collection.find_one(
+                {"_id": ObjectId(user_id)}, {"reservations.id": 1, "outcomes": 1}
+            )
+            for outcome in planning.get("outcomes", []):
+                if outcome["id"] == reservation["id"]:
+                    return outcome["meal_plan_ids"]
+            if all(r["id"] != reservation["id"] for r in planning["reservations"]):
+                return None
+            time.sleep(PLANNING_WAIT_POLL_SECONDS)
+        return None
+
+    @staticmethod
+    def _get_or_create(user_id: str):
+        planning = planning_collection.find_one({"_id": ObjectId(user_id)})
+        if planning is not None:
+            return planning
+
+        planning = {"_id": ObjectId(user_id), "seq": 0, "reservations": []}
+        try:
+            planning_collection.insert_one(planning)
+        except DuplicateKeyError:
+            # Created concurrently by another request
+            return planning_collection.find_one({"_id": ObjectId(user_id)})
+        return planning
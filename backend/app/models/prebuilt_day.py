@@ -0,0 +1,118 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING
+from app.database import prebuilt_days_collection
+from app.models.recipe import RecipeModel
+
+# Profile fields a generated day depends on
+PROFILE_FIELDS = (
+    "dietary_restrictions",
+    "allergies",
+    "disliked_ingredients",
+    "preferred_cuisines",
+    "target_daily_calories",
+    "target_macros_pct",
+)
+
+# A taken day whose plan was neither stored nor given back within this time
+# (its worker died) can be taken again
+CLAIM_SECONDS = 600
+
+
+class PrebuiltDayModel:
+    """
+    Days generated ahead of time, not yet part of the user's plan
+    """
+
+    @staticmethod
+    def profile_key(user_profile: Dict) -> str:
+        """
+        Fingerprint of the profile fields a day was generated for; days
+        built for an older profile are never served
+        """
+        fields = {field: user_profile.get(field) for field in PROFILE_FIELDS}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def add(user_id: str, profile_key: str, meals: Dict, restrictions=()):
+        """
+        Store one generated day, with recipe bodies kept in the recipes
+        collection like planned days
+        """
+        prebuilt_days_collection.insert_one(
+            {
+                "user_id": ObjectId(user_id),
+                "profile_key": profile_key,
+                "meals": RecipeModel.store_days({"Day1": meals}, restrictions)["Day1"],
+                "created_at": datetime.now(),
+            }
+        )
+
+    @staticmethod
+    def count(user_id: str, profile_key: str) -> int:
+        return prebuilt_days_collection.count_documents(
+            {"user_id": ObjectId(user_id), "profile_key": profile_key}
+        )
+
+    @staticmethod
+    def take(user_id: str, profile_key: str, count: int) -> Tuple[Optional[ObjectId], List[Dict]]:
+        """
+        Claim up to count days, oldest first, with recipe references resolved
+
+        Returns (claim id, days); the claim id is None when no day was
+        available. Each day is claimed with find_one_and_update, so
+        concurrent requests never receive the same day. Claimed days stay
+        stored until the claim is finished once they are planned, or put
+        back if storing the plan fails.
+        """
+        claim_id = ObjectId()
+        days = []
+        for _ in range(count):
+            now = datetime.now()
+            prebuilt = prebuilt_days_collection.find_one_and_update(
+                {
+                    "user_id": ObjectId(user_id),
+                    "profile_key": profile_key,
+                    "claimed_until": {"$not": {"$gte": now}},
+                },
+                {"$set": {"claim_id": claim_id, "claimed_until": now + timedelta(seconds=CLAIM_SECONDS)}},
+                sort=[("created_at", ASCENDING)],
+            )
+            if prebuilt is None:
+                break
+            days.append(prebuilt["meals"])
+
+        if not days:
+            return None, []
+        resolved = RecipeModel.resolve_days({f"Day{i + 1}": meals for i, meals in enumerate(days)})
+        return claim_id, [resolved[f"Day{i + 1}"] for i in range(len(days))]
+
+    @staticmethod
+    def finish(claim_id: Optional[ObjectId]):
+        """
+        Delete the days of a claim, once they are stored in a meal plan
+        """
+        if claim_id is not None:
+            prebuilt_days_collection.delete_many({"claim_id": claim_id})
+
+    @staticmethod
+    def put_back(claim_id: Optional[ObjectId]):
+        """
+        Make the days of a claim available again, after storing them failed
+        """
+        if claim_id is not None:
+            prebuilt_days_collection.update_many(
+                {"claim_id": claim_id}, {"$unset": {"claim_id": "", "claimed_until": ""}}
+            )
+
+    @staticmethod
+    def delete_stale(user_id: str, profile_key: str):
+        """
+        Drop days built for any other version of the profile
+        """
+        prebuilt_days_collection.delete_many(
+            {"user_id": ObjectId(user_id), "profile_key": {"$ne": profile_key}}
+        )
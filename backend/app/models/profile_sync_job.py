@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Dict, List
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.database import profile_sync_jobs_collection
+
+
+class ProfileSyncJobModel:
+    @staticmethod
+    def create(user_id: str, slots: List[Dict]):
+        """
+        Record a pending job to regenerate the planned meals a profile change
+        affected
+
+        Parameters:
+        - user_id: User whose profile changed
+        - slots: Affected meals as {"date", "meal_type", "reasons"}
+        """
+        job = {
+            "user_id": ObjectId(user_id),
+            "status": "pending",
+            "slots": slots,
+            "regenerated": [],
+            "errors": [],
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+        }
+
+        result = profile_sync_jobs_collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        return job
+
+    @staticmethod
+    def supersede_pending(user_id: str) -> List[Dict]:
+        """
+        Mark a user's jobs that have not started as superseded and return
+        their slots, for a newer job to take over
+        """
+        slots = []
+        while True:
+            job = profile_sync_jobs_collection.find_one_and_update(
+                {"user_id": ObjectId(user_id), "status": "pending"},
+                {"$set": {"status": "superseded", "updated_at": datetime.now()}},
+                projection={"slots": 1},
+            )
+            if job is None:
+                return slots
+            slots += job["slots"]
+
+    @staticmethod
+    def start(job_id):
+        """
+        Mark a pending job as running and return it, or None if it was
+        superseded first
+        """
+        return profile_sync_jobs_collection.find_one_and_update(
+            {"_id": job_id, "status": "pending"},
+            {"$set": {"status": "running", "updated_at": datetime.now()}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def get_latest(user_id: str):
+        """
+        Get the most recent job for a user
+        """
+        return profile_sync_jobs_collection.find_one(
+            {"user_id": ObjectId(user_id)}, sort=[("created_at", -1), ("_id", -1)]
+        )
+
+    @staticmethod
+    def update(job_id, **fields):
+        """
+        Update a job's status or results
+        """
+        fields["updated_at"] = datetime.now()
+        profile_sync_jobs_collection.update_one({"_id": job_id}, {"$set": fields})
@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List
+from cachetools import LRUCache
+from pymongo import UpdateOne
+from app.database import reader, recipes_collection
+
+# Recipes are immutable once stored (their id is their content hash), so
+# cached entries never need invalidating. Entries are never handed out
+# directly: callers get deep copies they may modify.
+recipe_cache = LRUCache(maxsize=4096)
+
+
+class RecipeModel:
+    @staticmethod
+    def content_hash(meal: Dict) -> str:
+        """
+        Get the content-addressed id of a meal (name and recipe body)
+        """
+        content = {"name": meal.get("name"), "recipe": meal.get("recipe")}
+        encoded = json.dumps(content, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def store_days(days: Dict, restrictions: Iterable[str] = ()) -> Dict:
+        """
+        Store every meal of a generated plan in the recipes collection and
+        return the same days with each meal replaced by a reference
+
+        Parameters:
+        - days: Mapping of DayX -> meal type -> {"name", "recipe"}
+        - restrictions: Dietary restrictions the plan was generated under,
+          recorded on each recipe so it can be reused for matching profiles
+        """
+        restrictions = sorted({r.strip().lower() for r in restrictions if r.strip()})
+        operations = {}
+        referenced_days = {}
+        now = datetime.now()
+
+        for day_key, meals in days.items():
+            referenced_days[day_key] = {}
+            for meal_type, meal in meals.items():
+                if "recipe_id" in meal:
+                    # Already a reference
+                    referenced_days[day_key][meal_type] = meal
+                    continue
+
+                recipe_id = RecipeModel.content_hash(meal)
+                referenced_days[day_key][meal_type] = {
+                    "name": meal.get("name"),
+                    "recipe_id": recipe_id,
+                }
+                operations[(recipe_id, meal_type)] = UpdateOne(
+                    {"_id": recipe_id},
+                    {
+                        "$setOnInsert": {
+                            "name": meal.get("name"),
+                            "recipe": meal.get("recipe"),
+                            "created_at": now,
+                        },
+                        "$addToSet": {
+                            "meal_types": meal_type,
+                            "restrictions": {"$each": restrictions},
+                        },
+                    },
+                    upsert=True,
+                )
+                recipe_cache[recipe_id] = copy.deepcopy(
+                    {"name": meal.get("name"), "recipe": meal.get("recipe")}
+                )
+
+        if operations:
+            recipes_collection.bulk_write(list(operations.values()), ordered=False)
+
+        return referenced_days
+
+    @staticmethod
+    def get_many(
+        recipe_ids: Iterable[str], operation: str = None, session=None
+    ) -> Dict[str, Dict]:
+        """
+        Get meals by recipe id, serving from the in-process LRU and loading
+        all misses with a single $in query; the meals are copies
+        """
+        found = {}
+        missing = []
+        for recipe_id in set(recipe_ids):
+            meal = recipe_cache.get(recipe_id)
+            if meal is None:
+                missing.append(recipe_id)
+            else:
+                found[recipe_id] = copy.deepcopy(meal)
+
+        if missing:
+            collection = reader(recipes_collection, operation) if operation else recipes_collection
+            cursor = collection.find(
+                {"_id": {"$in": missing}}, {"name": 1, "recipe": 1}, session=session
+            )
+            for document in cursor:
+                meal = {"name": document["name"], "recipe": document["recipe"]}
+                recipe_cache[document["_id"]] = meal
+                found[document["_id"]] = copy.deepcopy(meal)
+
+        return found
+
+    @staticmethod
+    def get_restrictions(recipe_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Get the dietary restrictions each recipe was generated under
+        """
+        cursor = recipes_collection.find(
+            {"_id": {"$in": list(set(recipe_ids))}}, {"restrictions": 1}
+        )
+        return {document["_id"]: document.get("restrictions", []) for document in cursor}
+
+    @staticmethod
+    def get_created_since(since: datetime = None):
+        """
+        Stream index-relevant fields of recipes stored at or after a point in
+        time (all recipes when since is None), oldest first
+        """
+        query = {"created_at": {"$gte": since}} if since else {}
+        projection = {
+            "name": 1,
+            "meal_types": 1,
+            "restrictions": 1,
+            "created_at": 1,
+            "recipe.cuisine": 1,
+            "recipe.prepTimeMins": 1,
+            "recipe.cookTimeMins": 1,
+            "recipe.nutrition": 1,
+            "recipe.ingredients.item": 1,
+        }
+        return recipes_collection.find(query, projection).sort("created_at", 1)
+
+    @staticmethod
+    def resolve_days(days: Dict) -> Dict:
+        """
+        Replace recipe references in one plan's days with full meals
+        """
+        return RecipeModel.resolve_plans([{"days": days}])[0]["days"]
+
+    @staticmethod
+    def resolve_plans(meal_plans: List[Dict], operation: str = None, session=None) -> List[Dict]:
+        """
+        Replace recipe references in meal plans with full meals, in place;
+        recipes are read as part of the operation and session that read the
+        plans
+
+        Plans written before recipes were deduplicated embed their meals
+        directly and are returned unchanged.
+        """
+        recipe_ids = [
+            meal["recipe_id"]
+            for meal_plan in meal_plans
+            for meals in meal_plan.get("days", {}).values()
+            for meal in meals.values()
+            if "recipe_id" in meal
+        ]
+        if not recipe_ids:
+            return meal_plans
+
+        recipes = RecipeModel.get_many(recipe_ids, operation, session)
+        for meal_plan in meal_plans:
+            for meals in meal_plan.get("days", {}).values():
+                for meal_type, meal in meals.items():
+                    if "recipe_id" in meal and meal["recipe_id"] in recipes:
+                        # A recipe can appear in several days; each gets its own copy
+                        meals[meal_type] = copy.deepcopy(recipes[meal["recipe_id"]])
+
+        return meal_plans
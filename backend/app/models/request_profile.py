@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Dict
+from bson import ObjectId
+from app.database import request_profiles_collection
+
+
+class RequestProfileModel:
+    @staticmethod
+    def create(method: str, path: str, status_code: int, capture: Dict, sampled: bool):
+        """
+        Store a request's profile and spans; they expire after
+        PROFILING_TTL_HOURS
+        """
+        profile = {
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "sampled": sampled,
+            "created_at": datetime.now(),
+            **capture,
+        }
+
+        result = request_profiles_collection.insert_one(profile)
+        return str(result.inserted_id)
+
+    @staticmethod
+    def get_recent(limit: int = 50):
+        """
+        List recent profiles without their reports
+        """
+        return list(
+            request_profiles_collection.find({}, {"report": 0, "threadpool_report": 0, "spans": 0})
+            .sort("created_at", -1)
+            .limit(limit)
+        )
+
+    @staticmethod
+    def get_by_id(profile_id: str):
+        if not ObjectId.is_valid(profile_id):
+            return None
+        return request_profiles_collection.find_one({"_id": ObjectId(profile_id)})
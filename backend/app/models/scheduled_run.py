@@ -0,0 +1,21 @@
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from app.database import scheduled_runs_collection
+
+
+class ScheduledRunModel:
+    @staticmethod
+    def claim(name: str, period: str) -> bool:
+        """
+        Claim a scheduled job for one period (e.g. a date), so that only one
+        worker process runs it
+
+        Returns True for the first caller and False for every other.
+        """
+        try:
+            scheduled_runs_collection.insert_one(
+                {"_id": f"{name}:{period}", "started_at": datetime.now()}
+            )
+            return True
+        except DuplicateKeyError:
+            return False
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import List, Dict, Optional, Union, Any
 from datetime import date, datetime
+from enum import Enum
 import re
 
 
@@ -33,6 +34,9 @@ class UserProfile(BaseModel):
     preferred_cuisines: List[str] = []
     target_daily_calories: int = 2000
     target_macros_pct: Dict[str, int] = {"protein": 30, "carbs": 40, "fat": 30}
+    # Days to keep planned or built ahead, and whether to build them ahead
+    plan_horizon_days: int = Field(default=7, ge=1, le=7)
+    speculative_topup: bool = True
 
 
 class UserProfileUpdate(BaseModel):
@@ -42,6 +46,8 @@ class UserProfileUpdate(BaseModel):
     preferred_cuisines: Optional[List[str]] = None
     target_daily_calories: Optional[int] = None
     target_macros_pct: Optional[Dict[str, int]] = None
+    plan_horizon_days: Optional[int] = Field(default=None, ge=1, le=7)
+    speculative_topup: Optional[bool] = None
 
 
 class User(UserBase):
@@ -82,12 +88,21 @@ class RecipeIngredient(BaseModel):
     notes: Optional[str] = None
 
 
+class Nutrition(BaseModel):
+    calories: float
+    protein_g: float
+    carbs_g: float
+    fat_g: float
+
+
 class Recipe(BaseModel):
     description: str
+    cuisine: Optional[str] = None
     prepTimeMins: int
     cookTimeMins: int
     ingredients: List[RecipeIngredient]
     instructions: List[str]
+    nutrition: Optional[Nutrition] = None
 
 
 class Meal(BaseModel):
@@ -95,6 +110,12 @@ class Meal(BaseModel):
     recipe: Recipe
 
 
+class MealType(str, Enum):
+    breakfast = "Breakfast"
+    lunch = "Lunch"
+    dinner = "Dinner"
+
+
 class DayMeals(BaseModel):
     Breakfast: Meal
     Lunch: Meal
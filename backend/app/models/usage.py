@@ -0,0 +1,117 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from bson import ObjectId
+from app.database import (
+    read_session,
+    reader,
+    usage_daily_collection,
+    usage_ledger_collection,
+)
+
+# Model names contain dots, which would nest field paths; they are stored
+# with a full-width dot instead
+FIELD_DOT = "\uff0e"
+
+
+class UsageModel:
+    @staticmethod
+    def record(
+        user_id: str,
+        model: str,
+        kind: str,
+        prompt_tokens: int,
+        output_tokens: int,
+        latency_ms: float,
+        cost_usd: float,
+        failed: bool = False,
+        background: bool = False,
+    ):
+        """
+        Append one model call to the ledger and add it to the user's daily
+        rollup
+
+        Ledger entries use short keys since there is one per call; the
+        rollup is what usage reports and budget checks read. Failed calls
+        (e.g. invalid JSON) are billed all the same and counted as such.
+        Background calls made for the user, like speculative top-ups, are
+        rolled up under "background", apart from the spend their budget
+        applies to.
+        """
+        now = datetime.now()
+        entry = {
+            "u": ObjectId(user_id),
+            "m": model,
+            "k": kind,
+            "p": prompt_tokens,
+            "o": output_tokens,
+            "l": round(latency_ms),
+            "c": cost_usd,
+            "t": now,
+        }
+        if failed:
+            entry["f"] = True
+        if background:
+            entry["b"] = True
+        usage_ledger_collection.insert_one(entry)
+
+        today = now.date().isoformat()
+        totals = {
+            "requests": 1,
+            "failed_requests": int(failed),
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": cost_usd,
+        }
+        prefix = "background." if background else ""
+        model_key = model.replace(".", FIELD_DOT)
+        usage_daily_collection.update_one(
+            {"_id": f"{user_id}:{today}"},
+            {
+                "$setOnInsert": {"user_id": ObjectId(user_id), "date": today},
+                "$inc": {
+                    **{f"{prefix}{field}": value for field, value in totals.items()},
+                    **{
+                        f"{prefix}models.{model_key}.{field}": value
+                        for field, value in totals.items()
+                    },
+                },
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def get_daily_cost(user_id: str, day: date = None) -> float:
+        """
+        Get a user's spend on one day (today by default)
+        """
+        day = (day or date.today()).isoformat()
+        rollup = usage_daily_collection.find_one(
+            {"_id": f"{user_id}:{day}"}, {"cost_usd": 1}
+        )
+        return rollup["cost_usd"] if rollup else 0.0
+
+    @staticmethod
+    def get_daily(user_id: str, days: int) -> List[Dict]:
+        """
+        Get a user's daily rollups for the last days days, newest first
+        """
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        operation = "usage.get_daily"
+        with read_session(user_id, operation) as session:
+            rollups = list(
+                reader(usage_daily_collection, operation)
+                .find(
+                    {"user_id": ObjectId(user_id), "date": {"$gte": since}},
+                    {"_id": 0, "user_id": 0},
+                    session=session,
+                )
+                .sort("date", -1)
+            )
+        for rollup in rollups:
+            for bucket in (rollup, rollup.get("background")):
+                if bucket:
+                    bucket["models"] = {
+                        model.replace(FIELD_DOT, "."): totals
+                        for model, totals in bucket.get("models", {}).items()
+                    }
+        return rollups
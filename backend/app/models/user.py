@@ -1,8 +1,16 @@
+import copy
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+from app import events
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
 from app.database import users_collection
+from app.invalidation import InvalidatedCache, invalidation_bus
 from app.models.schema import UserCreate, UserProfile, UserProfileUpdate
 
+# Users by email, read by every authenticated request
+user_cache = InvalidatedCache(["users"], USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
 
 class UserModel:
     @staticmethod
@@ -28,7 +36,16 @@ class UserModel:
 
     @staticmethod
     def get_by_email(email: str):
-        return users_collection.find_one({"email": email})
+        """
+        Get a user by email, from the cache when possible; the result is a
+        copy the caller may modify
+        """
+        user = user_cache.get(
+            email,
+            lambda: users_collection.find_one({"email": email}),
+            lambda user: str(user["_id"]),
+        )
+        return copy.deepcopy(user)
 
     @staticmethod
     def get_by_id(user_id: str):
@@ -36,19 +53,40 @@ class UserModel:
 
     @staticmethod
     def update_profile(user_id: str, profile_data: UserProfileUpdate):
+        """
+        Update profile fields and emit a "profile_updated" event with the old
+        and new profiles when anything changed
+        """
         update_data = {k: v for k, v in profile_data.dict().items() if v is not None}
 
-        result = users_collection.update_one(
+        previous = users_collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
             {"$set": {f"profile.{k}": v for k, v in update_data.items()}},
+            projection={"profile": 1},
+            return_document=ReturnDocument.BEFORE,
         )
+        if previous is None:
+            return False
+        invalidation_bus.publish("users", user_id)
 
-        return result.modified_count > 0
+        old_profile = previous.get("profile", {})
+        new_profile = {**old_profile, **update_data}
+        if new_profile == old_profile:
+            return False
+
+        events.emit(
+            "profile_updated",
+            user_id=user_id,
+            old_profile=old_profile,
+            new_profile=new_profile,
+        )
+        return True
 
     @staticmethod
     def update_password(user_id: str, hashed_password: str):
         result = users_collection.update_one(
             {"_id": ObjectId(user_id)}, {"$set": {"hashed_password": hashed_password}}
         )
+        invalidation_bus.publish("users", user_id)
 
         return result.modified_count > 0
@@ -0,0 +1,190 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from pymongo import monitoring
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional, cProfile is used instead
+    Profiler = None
+
+# Spans of the request being profiled; None when profiling is off, so the
+# hooks below cost a single context variable lookup
+_trace: ContextVar[Optional[Dict]] = ContextVar("profiling_trace", default=None)
+
+# Only one request per process is profiled at a time: profilers are
+# process-wide and would otherwise mix up concurrent requests
+_profiler_lock = threading.Lock()
+
+# From Python 3.12 cProfile is built on sys.monitoring: a profiler sees the
+# calls of every thread, and a second one cannot be enabled while it runs
+_CPROFILE_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+def _add_span(trace: Dict, name: str, started: float, duration_ms: float, **attrs):
+    trace["spans"].append(
+        {
+            "name": name,
+            "start_ms": round((started - trace["started"]) * 1000, 3),
+            "duration_ms": round(duration_ms, 3),
+            **attrs,
+        }
+    )
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block as a span of the request being profiled, if any
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_span(trace, name, started, (time.perf_counter() - started) * 1000, **attrs)
+
+
+def _profiled_call(func, *args, **kwargs):
+    trace = _trace.get()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another cProfile is active, e.g. a concurrent call of the same request
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        trace["thread_profiles"].append(profiler)
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """
+    Run a blocking call in the threadpool; for a profiled request the call
+    is also profiled with cProfile in its worker thread, which the request's
+    profiler (bound to the event loop thread) does not see
+    """
+    trace = _trace.get()
+    if trace is None or not trace["profile_threads"]:
+        return await _run_in_threadpool(func, *args, **kwargs)
+    return await _run_in_threadpool(_profiled_call, func, *args, **kwargs)
+
+
+class MongoSpanListener(monitoring.CommandListener):
+    """
+    Records every MongoDB command of a profiled request as a span
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        trace = _trace.get()
+        if trace is None:
+            return
+        collection = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            trace,
+            time.perf_counter(),
+            collection if isinstance(collection, str) else None,
+        )
+
+    def _finish(self, event, failed: bool):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        trace, started, collection = pending
+        _add_span(
+            trace,
+            f"mongo.{event.command_name}",
+            started,
+            event.duration_micros / 1000,
+            collection=collection,
+            failed=failed,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+def _stats_text(*profiles) -> str:
+    output = io.StringIO()
+    pstats.Stats(*profiles, stream=output).sort_stats("cumulative").print_stats(60)
+    return output.getvalue()
+
+
+class RequestProfiler:
+    """
+    Samples one request with pyinstrument when installed (HTML flame view),
+    or deterministically with cProfile (pstats text)
+
+    Both only follow the event loop thread. Work the request hands to the
+    threadpool through run_in_threadpool above is profiled separately: its
+    statistics are merged into the cProfile report, or kept as a text
+    "threadpool_report" next to the pyinstrument one. On Python 3.12+ the
+    request's cProfile already sees the threadpool, so no other is started. Other threads (sync
+    dependencies, background executors) only show up as spans.
+
+    start() returns False when another request is already being profiled.
+    """
+
+    def __init__(self):
+        self.trace = {
+            "started": time.perf_counter(),
+            "spans": [],
+            "thread_profiles": [],
+            "profile_threads": Profiler is not None or not _CPROFILE_SEES_ALL_THREADS,
+        }
+        self._profiler = None
+        self._token = None
+
+    def start(self) -> bool:
+        if not _profiler_lock.acquire(blocking=False):
+            return False
+
+        self._token = _trace.set(self.trace)
+        if Profiler is not None:
+            self._profiler = Profiler(async_mode="enabled")
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return True
+
+    def stop(self) -> Dict:
+        """
+        Stop profiling and return the capture as {"format", "report", "spans"}
+        """
+        try:
+            thread_profiles = self.trace["thread_profiles"]
+            if Profiler is not None:
+                self._profiler.stop()
+                capture = {"format": "html", "report": self._profiler.output_html()}
+                if thread_profiles:
+                    capture["threadpool_report"] = _stats_text(*thread_profiles)
+            else:
+                self._profiler.disable()
+                capture = {"format": "text", "report": _stats_text(self._profiler, *thread_profiles)}
+        finally:
+            _trace.reset(self._token)
+            _profiler_lock.release()
+
+        capture["duration_ms"] = round((time.perf_counter() - self.trace["started"]) * 1000, 3)
+        capture["spans"] = self.trace["spans"]
+        return capture
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+from pymongo import CursorType
+from app import events, metrics
+from app.config import PUSH_FANOUT, PUSH_QUEUE_SIZE
+from app.database import push_events_collection
+
+logger = logging.getLogger(__name__)
+
+# Sent instead of the events a slow client missed: it should refetch
+RESYNC = {"event": "resync", "data": {}}
+
+# Re-read events this far back when the tail restarts, since inserts from
+# different workers are not ordered exactly by their timestamps
+TAIL_OVERLAP = timedelta(seconds=2)
+SEEN_IDS_KEPT = 1000
+
+
+class Subscription:
+    """
+    One client stream of a user's events, read on the event loop it was
+    opened on
+    """
+
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, message: Dict):
+        """
+        Queue an event; run on the subscription's loop
+
+        A client that falls a full queue behind loses its queued events and
+        gets a single resync event in their place, so a slow connection never
+        holds more than the queue size in memory.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            metrics.increment("push_events_dropped_total")
+
+
+class PushHub:
+    """
+    Delivers per-user events to the clients streaming them from any worker
+
+    With the "mongo" fan-out, events are written to a capped collection that
+    a background thread in every worker tails, each worker delivering them
+    to its own subscribers. Events are not replayed to clients that were not
+    connected; clients refetch when they (re)connect instead.
+    """
+
+    def __init__(self, fanout: str = PUSH_FANOUT, queue_size: int = PUSH_QUEUE_SIZE):
+        self.fanout = fanout
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._tailed_until: Optional[datetime] = None
+        self._seen: OrderedDict = OrderedDict()
+        self._thread = None
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+            count = sum(len(subscriptions) for subscriptions in self._subscribers.values())
+        metrics.set_gauge("push_subscribers", count)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscribers.pop(subscription.user_id, None)
+            count = sum(len(subscriptions) for subscriptions in self._subscribers.values())
+        metrics.set_gauge("push_subscribers", count)
+
+    def publish(self, user_id: str, event: str, data: Dict):
+        """
+        Send an event to every stream of a user; safe to call from any thread
+        """
+        metrics.increment("push_events_total", event=event)
+        if self.fanout == "local":
+            self._deliver(user_id, {"event": event, "data": data})
+        else:
+            push_events_collection.insert_one(
+                {"u": user_id, "e": event, "d": data, "t": datetime.now()}
+            )
+
+    def start(self):
+        if self.fanout != "local" and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="push-events", daemon=True)
+            self._thread.start()
+
+    def _deliver(self, user_id: str, message: Dict):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                pass  # its loop is closed: the worker is shutting down
+
+    def _run(self):
+        while True:
+            try:
+                self._tail()
+            except Exception:
+                logger.exception("Push event relay failed")
+            time.sleep(1)
+
+    def _tail(self):
+        # Created capped by ensure_indexes at startup; wait for it, as a
+        # tailable cursor needs a capped collection (retried by _run)
+        if not push_events_collection.options().get("capped"):
+            return
+
+        if self._tailed_until is None:
+            self._tailed_until = datetime.now()
+        cursor = push_events_collection.find(
+            {"t": {"$gte": self._tailed_until - TAIL_OVERLAP}},
+            cursor_type=CursorType.TAILABLE_AWAIT,
+        )
+        # The cursor dies at once on an empty collection; retried by _run
+        while cursor.alive:
+            for event in cursor:
+                self._tailed_until = max(self._tailed_until, event["t"])
+                if event["_id"] in self._seen:
+                    continue
+                self._seen[event["_id"]] = None
+                if len(self._seen) > SEEN_IDS_KEPT:
+                    self._seen.popitem(last=False)
+                self._deliver(event["u"], {"event": event["e"], "data": event["d"]})
+
+
+# Shared per-process hub, started with the app
+push_hub = PushHub()
+
+
+def on_generation_progress(user_id: str, **progress):
+    push_hub.publish(user_id, "generation_progress", progress)
+
+
+def on_meal_plan_changed(user_id: str, version: int, changes):
+    push_hub.publish(user_id, "meal_plan_changed", {"version": version, "changes": changes})
+
+
+events.subscribe("generation_progress", on_generation_progress)
+events.subscribe("meal_plan_changed", on_meal_plan_changed)
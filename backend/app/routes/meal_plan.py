@@ -1,26 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from fastapi import Request
+from fastapi.responses import StreamingResponse
+from datetime import date
+from typing import Dict, Optional
 from app.limiter import limiter
-from app.models.schema import MealPlanRequest, MealPlanComplete
-from app.services.auth_service import get_current_user
+from app.profiling import run_in_threadpool
+from app.config import (
+    MAX_PLANNED_DAYS,
+    PUSH_HEARTBEAT_SECONDS,
+    PUSH_STREAM_MAX_SECONDS,
+    STREAM_TOKEN_EXPIRE_SECONDS,
+)
+from app.models.dashboard_summary import DashboardSummaryModel
+from app.models.meal_history import MealHistoryModel
+from app.models.meal_plan_changes import MealPlanChangesModel
+from app.models.schema import MealPlanRequest, MealPlanComplete, MealType
+from app.push import push_hub
+from app.services.auth_service import create_stream_token, get_current_user, get_stream_user
+from app.services.idempotency_service import IdempotencyService
 from app.services.meal_plan_service import MealPlanService
+from app.services.shopping_list_service import ShoppingListService
+from app.services.usage_service import BudgetExceededError
 from bson import json_util
+import asyncio
 import json
+import logging
 
 router = APIRouter(prefix="/meal-plans", tags=["meal plans"])
 
+logger = logging.getLogger(__name__)
+
 
 @router.post("/generate", status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/minute;1000/day")
 async def generate_meal_plan(
-    request:Request, meal_plan_request: MealPlanRequest, current_user: dict = Depends(get_current_user)
+    request: Request,
+    meal_plan_request: MealPlanRequest,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
     Generate a meal plan for specified number of days
+
+    A retry with the same Idempotency-Key header gets the original response.
     """
+    return await IdempotencyService.run(
+        str(current_user["_id"]),
+        idempotency_key,
+        "generate",
+        meal_plan_request.dict(),
+        lambda: _generate(current_user, meal_plan_request.days),
+    )
+
+
+async def _generate(current_user: dict, days: int):
     try:
-        meal_plan = MealPlanService.generate_meal_plan(
-            str(current_user["_id"]), current_user["profile"], meal_plan_request.days
+        meal_plan = await run_in_threadpool(
+            MealPlanService.generate_meal_plan,
+            str(current_user["_id"]),
+            current_user["profile"],
+            days,
+            current_user.get("tier", "free"),
         )
 
         # Parse the MongoDB document to JSON
@@ -34,7 +74,10 @@ async def generate_meal_plan(
         return meal_plan_json
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     except Exception as e:
+        logger.exception("Failed to generate meal plan")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate meal plan: {str(e)}",
@@ -60,14 +103,158 @@ async def get_meal_plans(current_user: dict = Depends(get_current_user)):
     return meal_plans_json
 
 
+@router.get("/shopping-list", status_code=status.HTTP_200_OK)
+async def get_shopping_list(
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get an aggregated shopping list for the planned days between two dates
+    """
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' date must not be after 'to' date",
+        )
+
+    return ShoppingListService.get_shopping_list(
+        str(current_user["_id"]), from_date, to_date
+    )
+
+
+@router.get("/changes", status_code=status.HTTP_200_OK)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get the planned days created, modified and removed since a change
+    version, with the version to pass next time
+
+    Without since, or when it is too old, every planned day is returned with
+    reset set and replaces the client's copy.
+    """
+    return await run_in_threadpool(
+        MealPlanService.get_changes, str(current_user["_id"]), since
+    )
+
+
+@router.post("/events/token", status_code=status.HTTP_200_OK)
+async def create_events_token(current_user: dict = Depends(get_current_user)):
+    """
+    Get a short-lived token to open the event stream with, as its token
+    query parameter
+    """
+    return {
+        "token": create_stream_token(current_user["email"]),
+        "expires_in": STREAM_TOKEN_EXPIRE_SECONDS,
+    }
+
+
+@router.get("/events", status_code=status.HTTP_200_OK)
+async def stream_events(current_user: dict = Depends(get_stream_user)):
+    """
+    Stream generation progress and plan changes of the current user as
+    server-sent events
+
+    The stream opens with a ready event carrying the current change version
+    and sends a comment line when idle, so proxies keep it open. A resync
+    event replaces events dropped because the client fell behind. Streams
+    end after PUSH_STREAM_MAX_SECONDS and clients reconnect.
+    """
+    return StreamingResponse(
+        _event_stream(str(current_user["_id"])),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _event_stream(user_id: str):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + PUSH_STREAM_MAX_SECONDS
+    # Subscribe before reading the version, so no change falls in between
+    subscription = push_hub.subscribe(user_id)
+    try:
+        version = await run_in_threadpool(MealPlanChangesModel.get_version, user_id)
+        yield "retry: 3000\n" + _sse("ready", {"version": version})
+
+        while True:
+            timeout = min(PUSH_HEARTBEAT_SECONDS, deadline - loop.time())
+            if timeout <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield _sse(message["event"], message["data"])
+    finally:
+        push_hub.unsubscribe(subscription)
+
+
+@router.get("/summary", status_code=status.HTTP_200_OK)
+async def get_summary(current_user: dict = Depends(get_current_user)):
+    """
+    Get the dashboard rollups: planned and completed days with their
+    nutrition, weekly totals, adherence and completion streak
+    """
+    summary = await run_in_threadpool(DashboardSummaryModel.get, str(current_user["_id"]))
+    summary["max_planned_days"] = MAX_PLANNED_DAYS
+    return summary
+
+
+@router.get("/history", status_code=status.HTTP_200_OK)
+async def get_history(
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get the completed days between two dates, oldest first
+    """
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' date must not be after 'to' date",
+        )
+
+    days = MealHistoryModel.get_range(
+        str(current_user["_id"]),
+        from_date.isoformat() if from_date else None,
+        to_date.isoformat() if to_date else None,
+    )
+    for day in days:
+        day["completed_at"] = day["completed_at"].isoformat()
+    return days
+
+
 @router.post("/complete", status_code=status.HTTP_200_OK)
 async def mark_day_complete(
-    request: MealPlanComplete, current_user: dict = Depends(get_current_user)
+    request: MealPlanComplete,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
     Mark a day's meal plan as complete
+
+    A retry with the same Idempotency-Key header gets the original response.
     """
-    success = MealPlanService.mark_day_complete(str(current_user["_id"]), request.date)
+    return await IdempotencyService.run(
+        str(current_user["_id"]),
+        idempotency_key,
+        "complete",
+        request.dict(),
+        lambda: _mark_day_complete(current_user, request.date),
+    )
+
+
+async def _mark_day_complete(current_user: dict, day_date: date):
+    success = MealPlanService.mark_day_complete(str(current_user["_id"]), day_date)
 
     if not success:
         raise HTTPException(
@@ -80,13 +267,30 @@ async def mark_day_complete(
 
 @router.post("/generate-ahead", status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/minute;1000/day")
-async def generate_ahead(request: Request, current_user: dict = Depends(get_current_user)):
+async def generate_ahead(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
+):
     """
     Generate meal plans for remaining days (up to max 7 days total)
+
+    A retry with the same Idempotency-Key header gets the original response.
     """
+    return await IdempotencyService.run(
+        str(current_user["_id"]),
+        idempotency_key,
+        "generate-ahead",
+        {},
+        lambda: _generate_ahead(current_user),
+    )
+
+
+async def _generate_ahead(current_user: dict):
     try:
-        meal_plan = MealPlanService.generate_ahead(
-            str(current_user["_id"]), current_user["profile"]
+        meal_plan = await run_in_threadpool(
+            MealPlanService.generate_ahead,
+            str(current_user["_id"]), current_user["profile"], current_user.get("tier", "free")
         )
 
         if not meal_plan:
@@ -103,8 +307,68 @@ async def generate_ahead(request: Request, current_user: dict = Depends(get_curr
         return meal_plan_json
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     except Exception as e:
+        logger.exception("Failed to generate meal plan")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate meal plan: {str(e)}",
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/{day_date}/regenerate", status_code=status.HTTP_200_OK)
+@limiter.limit("10/minute;1000/day")
+async def regenerate_day(
+    request: Request, day_date: date, current_user: dict = Depends(get_current_user)
+):
+    """
+    Regenerate every meal of one planned day
+    """
+    return await _regenerate(
+        current_user, day_date, [meal_type.value for meal_type in MealType]
+    )
+
+
+@router.post("/{day_date}/{meal_type}/regenerate", status_code=status.HTTP_200_OK)
+@limiter.limit("10/minute;1000/day")
+async def regenerate_meal(
+    request: Request,
+    day_date: date,
+    meal_type: MealType,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Regenerate a single meal of one planned day
+    """
+    return await _regenerate(current_user, day_date, [meal_type.value])
+
+
+async def _regenerate(current_user: dict, day_date: date, meal_types: list):
+    try:
+        day = await run_in_threadpool(
+            MealPlanService.regenerate_meals,
+            str(current_user["_id"]),
+            current_user["profile"],
+            day_date,
+            meal_types,
+            current_user.get("tier", "free"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except Exception as e:
+        logger.exception("Failed to regenerate meals")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to regenerate meals: {str(e)}",
+        )
+
+    if day is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan for specified date not found",
+        )
+
+    return day
@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from typing import Optional
+from app.config import PROFILING_TOKEN
+from app.models.request_profile import RequestProfileModel
+
+router = APIRouter(prefix="/profiles", tags=["profiling"])
+
+
+def require_profiling_token(x_profile: Optional[str] = Header(None)):
+    """
+    Only callers holding PROFILING_TOKEN may read profiles
+    """
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_profile != PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+
+@router.get("/", dependencies=[Depends(require_profiling_token)])
+async def list_profiles(limit: int = 50):
+    """
+    List recently captured request profiles
+    """
+    return [
+        {
+            "id": str(profile.pop("_id")),
+            **profile,
+            "created_at": profile["created_at"].isoformat(),
+        }
+        for profile in RequestProfileModel.get_recent(min(limit, 200))
+    ]
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def download_profile(profile_id: str):
+    """
+    Download a profile report: pyinstrument HTML, or cProfile statistics as text
+    """
+    profile = _get_profile(profile_id)
+    if profile["format"] == "html":
+        return HTMLResponse(profile["report"])
+    return PlainTextResponse(profile["report"])
+
+
+@router.get("/{profile_id}/threadpool", dependencies=[Depends(require_profiling_token)])
+async def download_threadpool_profile(profile_id: str):
+    """
+    Download the cProfile statistics of the threadpool work of a request
+    profiled with pyinstrument (merged into the report under cProfile)
+    """
+    profile = _get_profile(profile_id)
+    if not profile.get("threadpool_report"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No threadpool profile for this request"
+        )
+    return PlainTextResponse(profile["threadpool_report"])
+
+
+@router.get("/{profile_id}/spans", dependencies=[Depends(require_profiling_token)])
+async def get_profile_spans(profile_id: str):
+    """
+    Get the MongoDB and LLM spans of a profiled request, in start order
+    """
+    profile = _get_profile(profile_id)
+    return {
+        "method": profile["method"],
+        "path": profile["path"],
+        "duration_ms": profile["duration_ms"],
+        "spans": sorted(profile["spans"], key=lambda span: span["start_ms"]),
+    }
+
+
+def _get_profile(profile_id: str):
+    profile = RequestProfileModel.get_by_id(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
+from app.models.recipe import RecipeModel
+from app.profiling import run_in_threadpool
+from app.services.auth_service import get_current_user
+from app.services.recipe_index import recipe_index
+
+router = APIRouter(prefix="/recipes", tags=["recipes"])
+
+
+@router.get("/search", status_code=status.HTTP_200_OK)
+async def search_recipes(
+    include: List[str] = Query([]),
+    exclude: List[str] = Query([]),
+    cuisine: Optional[str] = None,
+    meal_type: Optional[str] = None,
+    max_prep_mins: Optional[int] = Query(None, ge=0),
+    max_cook_mins: Optional[int] = Query(None, ge=0),
+    max_total_mins: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Search previously generated recipes by ingredients, cuisine and time
+
+    Runs in the threadpool, since a search may first (re)load the index.
+    """
+    total, recipes = await run_in_threadpool(
+        recipe_index.search,
+        include=include,
+        exclude=exclude,
+        cuisine=cuisine,
+        meal_type=meal_type,
+        max_prep_mins=max_prep_mins,
+        max_cook_mins=max_cook_mins,
+        max_total_mins=max_total_mins,
+        limit=limit,
+    )
+
+    return {"total": total, "recipes": recipes}
+
+
+@router.get("/{recipe_id}", status_code=status.HTTP_200_OK)
+async def get_recipe(recipe_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Get a stored recipe by id
+    """
+    recipe = RecipeModel.get_many([recipe_id]).get(recipe_id)
+
+    if not recipe:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Recipe not found"
+        )
+
+    return {"id": recipe_id, **recipe}
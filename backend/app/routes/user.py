@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from datetime import datetime
 from app.models.schema import UserProfileUpdate, GoalsUpdate
 from app.models.user import UserModel
 from app.services.auth_service import get_current_user
+from app.services.profile_sync_service import ProfileSyncService
+from app.services.usage_service import UsageService
 from bson import json_util
 import json
 
@@ -30,6 +33,7 @@ async def update_profile(
     """
     Update user profile information
     """
+    started_at = _now()
     success = UserModel.update_profile(str(current_user["_id"]), profile_data)
 
     if not success:
@@ -38,7 +42,10 @@ async def update_profile(
             detail="Failed to update profile",
         )
 
-    return {"message": "Profile updated successfully"}
+    return {
+        "message": "Profile updated successfully",
+        "affected_slots": _affected_slots(str(current_user["_id"]), started_at),
+    }
 
 
 @router.put("/profile/dietary-restrictions", status_code=status.HTTP_200_OK)
@@ -49,6 +56,7 @@ async def update_dietary_restrictions(
     Update dietary restrictions
     """
     profile_data = UserProfileUpdate(dietary_restrictions=restrictions)
+    started_at = _now()
     success = UserModel.update_profile(str(current_user["_id"]), profile_data)
 
     if not success:
@@ -57,7 +65,10 @@ async def update_dietary_restrictions(
             detail="Failed to update dietary restrictions",
         )
 
-    return {"message": "Dietary restrictions updated successfully"}
+    return {
+        "message": "Dietary restrictions updated successfully",
+        "affected_slots": _affected_slots(str(current_user["_id"]), started_at),
+    }
 
 
 @router.put("/profile/allergies", status_code=status.HTTP_200_OK)
@@ -68,6 +79,7 @@ async def update_allergies(
     Update allergies
     """
     profile_data = UserProfileUpdate(allergies=allergies)
+    started_at = _now()
     success = UserModel.update_profile(str(current_user["_id"]), profile_data)
 
     if not success:
@@ -76,7 +88,10 @@ async def update_allergies(
             detail="Failed to update allergies",
         )
 
-    return {"message": "Allergies updated successfully"}
+    return {
+        "message": "Allergies updated successfully",
+        "affected_slots": _affected_slots(str(current_user["_id"]), started_at),
+    }
 
 
 @router.put("/profile/disliked-ingredients", status_code=status.HTTP_200_OK)
@@ -87,6 +102,7 @@ async def update_disliked_ingredients(
     Update disliked ingredients
     """
     profile_data = UserProfileUpdate(disliked_ingredients=ingredients)
+    started_at = _now()
     success = UserModel.update_profile(str(current_user["_id"]), profile_data)
 
     if not success:
@@ -95,7 +111,10 @@ async def update_disliked_ingredients(
             detail="Failed to update disliked ingredients",
         )
 
-    return {"message": "Disliked ingredients updated successfully"}
+    return {
+        "message": "Disliked ingredients updated successfully",
+        "affected_slots": _affected_slots(str(current_user["_id"]), started_at),
+    }
 
 
 @router.put("/profile/preferred-cuisines", status_code=status.HTTP_200_OK)
@@ -128,6 +147,7 @@ async def update_goals(
         target_daily_calories=goals_data.target_daily_calories,
         target_macros_pct=goals_data.target_macros_pct
     )
+    started_at = _now()
     success = UserModel.update_profile(str(current_user["_id"]), profile_data)
 
     if not success:
@@ -136,4 +156,47 @@ async def update_goals(
             detail="Failed to update goals",
         )
 
-    return {"message": "Goals updated successfully"}
\ No newline at end of file
+    return {
+        "message": "Goals updated successfully",
+        "affected_slots": _affected_slots(str(current_user["_id"]), started_at),
+    }
+
+
+@router.get("/profile/sync-status", status_code=status.HTTP_200_OK)
+async def get_profile_sync_status(current_user: dict = Depends(get_current_user)):
+    """
+    Get the progress of regenerating meals invalidated by the last profile change
+    """
+    sync_status = ProfileSyncService.get_status(str(current_user["_id"]))
+
+    if sync_status is None:
+        return {"status": "idle", "affected_slots": []}
+
+    return sync_status
+
+
+@router.get("/usage", status_code=status.HTTP_200_OK)
+async def get_usage(
+    days: int = Query(30, ge=1, le=90), current_user: dict = Depends(get_current_user)
+):
+    """
+    Get token usage and cost of meal generation per day, with the daily budget
+    """
+    return UsageService.get_usage(
+        str(current_user["_id"]), current_user.get("tier", "free"), days
+    )
+
+
+def _now():
+    # MongoDB stores datetimes with millisecond precision
+    now = datetime.now()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def _affected_slots(user_id: str, since: datetime):
+    """
+    Get the meals queued for regeneration by a profile update made since a
+    point in time
+    """
+    sync_status = ProfileSyncService.get_status(user_id, since)
+    return sync_status["affected_slots"] if sync_status else []
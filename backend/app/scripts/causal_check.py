@@ -0,0 +1,61 @@
+"""
+Check that users read their own writes when listings go to secondaries
+
+Usage:
+    python -m app.scripts.causal_check [--writes N]
+
+Run against a replica set with at least one secondary (MONGODB_URI, e.g. a
+local three-member set). For a throwaway user, each round stores a one-day
+plan and immediately lists the user's plans through the
+"meal_plans.get_by_user" read path, counting listings that miss the new
+plan. For comparison the same listing is also read from a secondary without
+a causal session. The first count must be zero; the second shows how often
+replication lag would otherwise have hidden a write.
+"""
+import argparse
+import sys
+from bson import ObjectId
+from pymongo.read_preferences import Secondary
+from app.config import MONGO_READ_PREFERENCES
+from app.database import client, meal_plans_collection
+from app.invalidation import invalidation_bus
+from app.models.meal_plan import MealPlanModel
+
+SAMPLE_DAY = {"Day1": {"breakfast": {"name": "Porridge", "recipe": {"ingredients": []}}}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    members = client.admin.command("hello").get("hosts", [])
+    if len(members) < 2:
+        sys.exit("MONGODB_URI must point to a replica set with a secondary")
+    print(
+        "meal_plans.get_by_user reads with "
+        + MONGO_READ_PREFERENCES.get("meal_plans.get_by_user", "primary")
+    )
+
+    user_id = str(ObjectId())
+    unsessioned = meal_plans_collection.with_options(read_preference=Secondary())
+    missed = stale = 0
+    try:
+        for written in range(1, args.writes + 1):
+            MealPlanModel.create(user_id, SAMPLE_DAY, 1)
+            if len(MealPlanModel.get_by_user(user_id, resolve=False)) < written:
+                missed += 1
+            if unsessioned.count_documents({"user_id": ObjectId(user_id)}) < written:
+                stale += 1
+    finally:
+        meal_plans_collection.delete_many({"user_id": ObjectId(user_id)})
+        invalidation_bus.publish("meal_plans", user_id, deleted=True)
+
+    print(f"Listings missing the user's latest plan: {missed} of {args.writes}")
+    print(f"Secondary reads without a session that were stale: {stale} of {args.writes}")
+    if missed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
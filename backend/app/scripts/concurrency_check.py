@@ -0,0 +1,73 @@
+"""
+Fire concurrent generation requests for one user and check the resulting plan
+
+Usage:
+    python -m app.scripts.concurrency_check [--url URL] [--requests N] [--days N]
+
+Registers a throwaway user against a running API, sends N simultaneous
+/meal-plans/generate requests (half of them /generate-ahead), then verifies
+that no date is planned twice and that the plan stays within capacity.
+Run the server with LLM_PROVIDER=replay to check this offline.
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+from collections import Counter
+import httpx
+from app.config import MAX_PLANNED_DAYS
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--requests", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--days", type=int, default=3, help="Days per generate request")
+    args = parser.parse_args()
+
+    email = f"concurrency-{uuid.uuid4().hex[:12]}@example.com"
+    password = uuid.uuid4().hex
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=300) as client:
+        response = await client.post(
+            "/register",
+            json={"email": email, "password": password, "first_name": "Load", "last_name": "Test"},
+        )
+        response.raise_for_status()
+        response = await client.post("/token", data={"username": email, "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        def send(i):
+            if i % 2:
+                return client.post("/meal-plans/generate-ahead", headers=headers)
+            return client.post(
+                "/meal-plans/generate", headers=headers, json={"days": args.days}
+            )
+
+        responses = await asyncio.gather(*(send(i) for i in range(args.requests)))
+        statuses = Counter(response.status_code for response in responses)
+
+        response = await client.get("/meal-plans/", headers=headers)
+        response.raise_for_status()
+        plans = response.json()
+
+    dates = Counter(value for plan in plans for value in plan.get("dates", {}).values())
+    duplicates = sorted(value for value, count in dates.items() if count > 1)
+
+    print(f"Responses by status: {dict(sorted(statuses.items()))}")
+    print(f"Stored plans: {len(plans)}, planned days: {sum(dates.values())}")
+    ok = True
+    if duplicates:
+        print(f"FAIL: dates planned more than once: {', '.join(duplicates)}")
+        ok = False
+    if sum(dates.values()) > MAX_PLANNED_DAYS:
+        print(f"FAIL: more than {MAX_PLANNED_DAYS} days planned")
+        ok = False
+    if ok:
+        print("OK: no overlapping dates, capacity respected")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
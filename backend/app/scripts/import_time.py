@@ -0,0 +1,72 @@
+"""
+Check the app's cold import time against a budget
+
+Usage:
+    python -m app.scripts.import_time [--budget-ms MS] [--top N] [--module NAME]
+
+Imports the module (app.main by default) in a fresh interpreter with
+python -X importtime, lists the modules that took longest including their
+own imports, and exits with status 1 when the total exceeds the budget
+(IMPORT_TIME_BUDGET_MS by default), so CI catches a heavy dependency
+creeping back into the import path.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from app.config import IMPORT_TIME_BUDGET_MS
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str):
+    """
+    Import a module in a fresh interpreter and get (name, self us,
+    cumulative us, depth) for every module it imported
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            entries.append((name, int(own), int(cumulative), len(indent) // 2))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=int, default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--module", default="app.main")
+    args = parser.parse_args()
+
+    entries = measure(args.module)
+    total_ms = next(cumulative for name, _, cumulative, _ in entries if name == args.module) / 1000
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    # Top-level packages and the app's own modules are the actionable ones
+    candidates = [
+        entry for entry in entries if "." not in entry[0] or entry[0].startswith("app.")
+    ]
+    for name, own, cumulative, _ in sorted(candidates, key=lambda e: -e[2])[: args.top]:
+        print(f"{cumulative / 1000:>14.1f} {own / 1000:>9.1f}  {name}")
+
+    print(f"\nImporting {args.module} took {total_ms:.0f} ms (budget {args.budget_ms} ms)")
+    if total_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Move recipe bodies embedded in meal_plans into the deduplicated recipes collection
+
+Usage:
+    python -m app.scripts.migrate_recipes [--dry-run] [--sample-users N]
+
+Prints collection storage and the latency of reading a sample of users'
+plans before and after the migration so the saving can be verified.
+"""
+import argparse
+import time
+from app.database import db, meal_plans_collection
+from app.models.meal_plan import MealPlanModel
+from app.models.recipe import RecipeModel, recipe_cache
+
+
+def collection_size(name: str):
+    """
+    Get (document count, data size, storage size) in bytes for a collection
+    """
+    stats = db.command("collStats", name)
+    return stats.get("count", 0), stats.get("size", 0), stats.get("storageSize", 0)
+
+
+def print_storage(label: str):
+    print(f"{label} storage:")
+    total = 0
+    for name in ("meal_plans", "recipes"):
+        count, size, storage = collection_size(name)
+        total += size
+        print(f"  {name:<12} {count:>8} docs  {size / 1024:>10.1f} KiB data  "
+              f"{storage / 1024:>10.1f} KiB on disk")
+    print(f"  {'total':<12} {'':>8}       {total / 1024:>10.1f} KiB data")
+
+
+def measure_reads(user_ids, repeat: int = 5):
+    """
+    Average milliseconds to read (and resolve) all plans of each sampled user
+    """
+    if not user_ids:
+        return 0.0
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # Measure the cold path: the resolver must hit the database
+        recipe_cache.clear()
+        for user_id in user_ids:
+            MealPlanModel.get_by_user(str(user_id))
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (repeat * len(user_ids))
+
+
+def migrate(dry_run: bool = False):
+    """
+    Replace embedded meals with recipe references, one plan at a time
+
+    Returns (plans migrated, meals moved).
+    """
+    plans_migrated = 0
+    meals_moved = 0
+    cursor = meal_plans_collection.find({}, {"days": 1})
+
+    for meal_plan in cursor:
+        days = meal_plan.get("days", {})
+        embedded = sum(
+            1 for meals in days.values() for meal in meals.values()
+            if "recipe_id" not in meal
+        )
+        if not embedded:
+            continue
+
+        plans_migrated += 1
+        meals_moved += embedded
+        if dry_run:
+            continue
+
+        meal_plans_collection.update_one(
+            {"_id": meal_plan["_id"]},
+            {"$set": {"days": RecipeModel.store_days(days)}, "$inc": {"version": 1}},
+        )
+
+    return plans_migrated, meals_moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--sample-users", type=int, default=20,
+                        help="Number of users whose plan reads are timed")
+    args = parser.parse_args()
+
+    sample = meal_plans_collection.distinct("user_id")[: args.sample_users]
+
+    print_storage("Before")
+    before_ms = measure_reads(sample)
+    print(f"Read latency before: {before_ms:.2f} ms per user ({len(sample)} users)")
+
+    plans, meals = migrate(dry_run=args.dry_run)
+    action = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{action} {plans} plans ({meals} embedded meals)")
+    if args.dry_run:
+        return
+
+    print_storage("After")
+    after_ms = measure_reads(sample)
+    print(f"Read latency after: {after_ms:.2f} ms per user ({len(sample)} users)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Remove meal plans left empty by completing every day
+
+Usage:
+    python -m app.scripts.prune_meal_plans [--dry-run]
+
+Days used to be completed by unsetting them in place, which left plan
+documents without any day behind. Completed days now move to meal_history
+and emptied plans are deleted; this removes the shells left from before.
+Their days were already gone, so there is nothing to archive.
+"""
+import argparse
+from app.database import db, meal_plans_collection
+from app.invalidation import invalidation_bus
+
+EMPTY_PLAN = {"$or": [{"dates": {}}, {"dates": {"$exists": False}}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only count the empty plans")
+    args = parser.parse_args()
+
+    total = meal_plans_collection.estimated_document_count()
+    empty = meal_plans_collection.count_documents(EMPTY_PLAN)
+    print(f"{empty} of {total} meal plans are empty")
+    if args.dry_run or not empty:
+        return
+
+    user_ids = meal_plans_collection.distinct("user_id", EMPTY_PLAN)
+    deleted = meal_plans_collection.delete_many(EMPTY_PLAN).deleted_count
+    # Let running workers drop the deleted plans from their caches
+    for user_id in user_ids:
+        invalidation_bus.publish("meal_plans", str(user_id), deleted=True)
+    stats = db.command("collStats", "meal_plans")
+    print(
+        f"Deleted {deleted} plans; meal_plans now holds {stats.get('count', 0)} documents, "
+        f"{stats.get('size', 0) / 1024:.1f} KiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Compare input and output token counts of the meal plan prompt variants
+
+Usage:
+    python -m app.scripts.token_report [--days N] [--profile FILE]
+                                       [--responses DIR] [--online]
+
+A mode with recorded responses (LLM_RECORD_DIR records) that hold the
+model's reported usage is reported with the averages of those prompt and
+output token counts. Otherwise input tokens are counted for the prompt built
+for the given profile, and output tokens for each recorded response (a meal
+plan JSON file, or a record with the raw model text under "response")
+re-encoded the way the mode asks the model to answer. Counts are offline
+estimates unless --online is given, which asks the Gemini API's count_tokens
+endpoint.
+"""
+import argparse
+import json
+import math
+import re
+from pathlib import Path
+from app.services.gemini_service import compact_decode, compact_encode, meal_plan_messages
+
+PROMPT_MODES = ("full", "compact")
+
+SAMPLE_PROFILE = {
+    "profile": {"days": 3, "restrictions": ["vegetarian"], "allergies": ["peanuts"]},
+    "preferences": {"dislikes": ["mushrooms"], "preferred_cuisines": ["Mediterranean", "Indian"]},
+    "goals": {
+        "target_daily_calories": 2000,
+        "target_macros_pct": {"protein": 30, "carbs": 40, "fat": 30},
+    },
+}
+
+_PIECES = re.compile(r"[A-Za-z]+|\d+|\s{2,}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate SentencePiece token count: words split into ~4 character
+    pieces, digit runs into 3 digit pieces, and one token per punctuation
+    mark or indentation run
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+
+def make_counter(online: bool):
+    if not online:
+        return estimate_tokens
+
+    import google.genai as genai
+    from app.config import GEMINI_API_KEY
+
+    client = genai.Client(api_key=GEMINI_API_KEY)
+
+    def count(text: str) -> int:
+        return client.models.count_tokens(model="gemini-2.0-flash", contents=text).total_tokens
+
+    return count
+
+
+def load_responses(directory: Path):
+    """
+    Load recorded responses from a directory of JSON files
+
+    Returns (meal plan with full keys, prompt mode it answered, reported
+    usage or None) per response.
+    """
+    responses = []
+    for path in sorted(directory.glob("*.json")):
+        data = json.loads(path.read_text())
+        usage = None
+        if isinstance(data, dict) and isinstance(data.get("response"), str):
+            reported = data.get("usage") or {}
+            # Providers that do not report usage record zeros
+            if reported.get("prompt_tokens") or reported.get("output_tokens"):
+                usage = reported
+            data = json.loads(data["response"])
+        # Recorded compact responses are normalized to full keys first
+        plan = compact_decode(data)
+        responses.append((plan, "full" if plan == data else "compact", usage))
+    return responses
+
+
+def encode_response(plan, mode: str) -> str:
+    """
+    Render a meal plan the way a given prompt mode asks the model to answer
+    """
+    if mode == "compact":
+        return json.dumps(compact_encode(plan), separators=(",", ":"))
+    return json.dumps(plan, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=3, help="Days requested in the prompt")
+    parser.add_argument("--profile", type=Path, help="Gemini-formatted profile JSON file")
+    parser.add_argument("--responses", type=Path, help="Directory of recorded responses")
+    parser.add_argument("--online", action="store_true", help="Use the Gemini count_tokens API")
+    args = parser.parse_args()
+
+    profile = json.loads(args.profile.read_text()) if args.profile else SAMPLE_PROFILE
+    profile.setdefault("profile", {})["days"] = args.days
+    count = make_counter(args.online)
+    responses = load_responses(args.responses) if args.responses else []
+
+    method = "counted" if args.online else "estimated"
+    rows = []
+    for mode in PROMPT_MODES:
+        recorded = [usage for _, answered, usage in responses if answered == mode and usage]
+        if recorded:
+            input_tokens = sum(usage["prompt_tokens"] for usage in recorded) / len(recorded)
+            output_tokens = sum(usage["output_tokens"] for usage in recorded) / len(recorded)
+            rows.append((mode, f"recorded ({len(recorded)})", input_tokens, output_tokens))
+            continue
+
+        input_tokens = sum(count(text) for _, text in meal_plan_messages(profile, mode))
+        output_tokens = (
+            sum(count(encode_response(plan, mode)) for plan, _, _ in responses) / len(responses)
+            if responses
+            else None
+        )
+        rows.append((mode, method, input_tokens, output_tokens))
+
+    print(
+        f"Tokens per request ({args.days} days for estimates and counts, "
+        f"{len(responses)} recorded responses)"
+    )
+    print(f"{'mode':<10}{'source':<16}{'input':>10}{'output':>12}{'total':>12}")
+    for mode, source, input_tokens, output_tokens in rows:
+        output = f"{output_tokens:>12.0f}" if output_tokens is not None else f"{'-':>12}"
+        total = input_tokens + (output_tokens or 0)
+        print(f"{mode:<10}{source:<16}{input_tokens:>10.0f}{output}{total:>12.0f}")
+
+    base_input, base_output = rows[0][2], rows[0][3]
+    for mode, source, input_tokens, output_tokens in rows[1:]:
+        saving = 100 * (base_input - input_tokens) / base_input
+        line = f"{mode}: input {saving:.1f}% smaller than {rows[0][0]}"
+        if output_tokens is not None and base_output:
+            line += f", output {100 * (base_output - output_tokens) / base_output:.1f}% smaller"
+        if source.split()[0] != rows[0][1].split()[0]:
+            line += f" ({source.split()[0]} against {rows[0][1].split()[0]} counts)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
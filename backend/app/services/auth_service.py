@@ -1,26 +1,44 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
-from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app import logging_config
+from app.config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    STREAM_TOKEN_EXPIRE_SECONDS,
+)
 from app.models.schema import TokenData
 from app.models.user import UserModel
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache(maxsize=1)
+def pwd_context():
+    """
+    Password hashing context, created on first use: passlib and bcrypt are
+    slow to import and only needed to register or log in
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# Scope of tokens that only open event streams
+STREAM_SCOPE = "stream"
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
 def authenticate_user(email: str, password: str):
@@ -33,6 +51,8 @@ def authenticate_user(email: str, password: str):
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -43,7 +63,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def create_stream_token(email: str):
+    """
+    Create a short-lived token that only opens event streams, so the token
+    passed in their URL (and kept in access logs and browser history) is
+    not an access token
+    """
+    return create_access_token(
+        data={"sub": email, "scope": STREAM_SCOPE},
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS),
+    )
+
+
+def _get_user(token: str, scope: Optional[str] = None):
+    """
+    Get the user of a token issued for scope (None for access tokens)
+    """
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -52,7 +89,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             raise credentials_exception
         token_data = TokenData(email=email)
     except JWTError:
@@ -61,4 +98,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     user = UserModel.get_by_email(token_data.email)
     if user is None:
         raise credentials_exception
+    logging_config.bind(user_id=str(user["_id"]))
     return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return _get_user(token)
+
+
+async def get_stream_user(
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    token: Optional[str] = Query(None),
+):
+    """
+    Authenticate an event stream: browsers' EventSource cannot send an
+    Authorization header, so a stream token (see create_stream_token) may
+    come as a query parameter instead; access tokens only in the header
+    """
+    if header_token:
+        return _get_user(header_token)
+    return _get_user(token or "", STREAM_SCOPE)
@@ -1,28 +1,18 @@
-import google.genai as genai
-from google.genai import types
 import json
-from app.config import GEMINI_API_KEY
+import logging
+import time
+from functools import lru_cache
+from app import profiling
+from app.config import GEMINI_PROMPT_MODE
+from app.services.llm_providers import get_provider
+from app.models.usage import UsageModel
+from app.services.model_router import estimate_cost
+from app.services.usage_service import UsageService
 
+logger = logging.getLogger(__name__)
 
-class GeminiService:
-    @staticmethod
-    def generate_meal_plan(user_profile, days):
-        """
-        Generate a meal plan using the Gemini API
-        """
-        # Initialize Gemini client
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        model = "gemini-2.0-flash"
-
-        # Prepare the input prompt
-        prompt = f"""{json.dumps(user_profile)}"""
-
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_text(
-                        text="""Act as an expert meal planner and creative recipe developer.Your primary task is to generate a personalized, structured meal plan based strictly on the user's profile, dietary needs, preferences, and specific requests provided below.Goal: Create a meal plan based on given days.
+# Instructions sent ahead of every full-mode meal plan request
+MEAL_PLAN_INSTRUCTIONS = """Act as an expert meal planner and creative recipe developer.Your primary task is to generate a personalized, structured meal plan based strictly on the user's profile, dietary needs, preferences, and specific requests provided below.Goal: Create a meal plan based on given days.
 
 User Profile & Constraints:{
   \"profile\": {
@@ -42,22 +32,18 @@ User Profile & Constraints:{
     }
   },
 }
-Output Requirements:Format: Respond ONLY with a single, valid JSON object. Do NOT include any introduction, conversation, apologies, or explanation outside the JSON structure itself.JSON Structure: The root object must have keys \"Day1\", \"Day2\", ..., \"Day{duration_days}\".Each \"DayX\" object must contain keys for each requested meal (e.g., \"Breakfast\", \"Lunch\", \"Dinner\").Each meal object (e.g., \"Breakfast\") must contain:\"name\": (String) A creative and appropriate name for the dish.\"recipe\": (Object) Containing the following keys:\"description\": (String) A brief, appealing description of the dish (1-2 sentences).\"prepTimeMins\": (Number) Estimated preparation time in minutes.\"cookTimeMins\": (Number) Estimated cooking time in minutes.\"ingredients\": (Array of Objects) Each object must have:\"item\": (String) Ingredient name.\"quantity\": (String) Amount needed (Use string type for flexibility).\"unit\": (String) Unit of measurement.\"instructions\": (Array of Strings) Each string representing a clear, step-by-step instruction.Quality & Adherence:Safety First: Absolute adherence to restrictions and allergies is non-negotiable.Constraint Compliance: Follow all provided constraints and preferences to the best of your ability.Recipe Quality: Generate realistic, appealing recipes with clear instructions suitable for the user's skill_level.Variety & Balance: Ensure a good mix of flavors, ingredients (within constraints), and meal types throughout the plan.Completeness: Populate all required fields in the specified JSON structure accurately.Generate the meal plan JSON now. Make sure the recipe instructions given are detailed, assume the user needs full guidance.
+Output Requirements:Format: Respond ONLY with a single, valid JSON object. Do NOT include any introduction, conversation, apologies, or explanation outside the JSON structure itself.JSON Structure: The root object must have keys \"Day1\", \"Day2\", ..., \"Day{duration_days}\".Each \"DayX\" object must contain keys for each requested meal (e.g., \"Breakfast\", \"Lunch\", \"Dinner\").Each meal object (e.g., \"Breakfast\") must contain:\"name\": (String) A creative and appropriate name for the dish.\"recipe\": (Object) Containing the following keys:\"description\": (String) A brief, appealing description of the dish (1-2 sentences).\"cuisine\": (String) The cuisine the dish belongs to (e.g. \"Mediterranean\", \"Indian\").\"prepTimeMins\": (Number) Estimated preparation time in minutes.\"cookTimeMins\": (Number) Estimated cooking time in minutes.\"ingredients\": (Array of Objects) Each object must have:\"item\": (String) Ingredient name.\"quantity\": (String) Amount needed (Use string type for flexibility).\"unit\": (String) Unit of measurement.\"instructions\": (Array of Strings) Each string representing a clear, step-by-step instruction.\"nutrition\": (Object) Estimated nutrition per serving with Number keys \"calories\", \"protein_g\", \"carbs_g\", \"fat_g\".Quality & Adherence:Safety First: Absolute adherence to restrictions and allergies is non-negotiable.Constraint Compliance: Follow all provided constraints and preferences to the best of your ability.Recipe Quality: Generate realistic, appealing recipes with clear instructions suitable for the user's skill_level.Variety & Balance: Ensure a good mix of flavors, ingredients (within constraints), and meal types throughout the plan.Completeness: Populate all required fields in the specified JSON structure accurately.Generate the meal plan JSON now. Make sure the recipe instructions given are detailed, assume the user needs full guidance.
 
 Do not return user profile."""
-                    ),
-                ],
-            ),
-            types.Content(
-                role="model",
-                parts=[
-                    types.Part.from_text(
-                        text="""{
+
+# Few-shot example answer for full mode
+MEAL_PLAN_EXAMPLE = """{
   \"Day1\": {
     \"Breakfast\": {
       \"name\": \"Berry Burst Oatmeal Bowl\",
       \"recipe\": {
         \"description\": \"A hearty and colorful oatmeal bowl packed with antioxidants and fiber to start your day right.\",
+        \"cuisine\": \"American\",
         \"prepTimeMins\": 5,
         \"cookTimeMins\": 10,
         \"ingredients\": [
@@ -93,13 +79,20 @@ Do not return user profile."""
           \"Pour the cooked oatmeal into a bowl.\",
           \"Top with mixed berries, chia seeds, and a drizzle of honey.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 320,
+          \"protein_g\": 10,
+          \"carbs_g\": 52,
+          \"fat_g\": 9
+        }
       }
     },
     \"Lunch\": {
       \"name\": \"Mediterranean Quinoa Salad\",
       \"recipe\": {
         \"description\": \"A refreshing and flavorful salad with quinoa, vegetables, and a zesty lemon dressing.\",
+        \"cuisine\": \"Mediterranean\",
         \"prepTimeMins\": 15,
         \"cookTimeMins\": 20,
         \"ingredients\": [
@@ -177,13 +170,20 @@ Do not return user profile."""
           \"In a small bowl, whisk together lemon juice, olive oil, oregano, salt, and pepper.\",
           \"Pour dressing over the salad and toss gently to combine.\",
           \"Serve chilled.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 430,
+          \"protein_g\": 14,
+          \"carbs_g\": 52,
+          \"fat_g\": 19
+        }
       }
     },
     \"Dinner\": {
       \"name\": \"Lemon Herb Baked Chicken Breast\",
       \"recipe\": {
         \"description\": \"Tender and juicy baked chicken breast with a bright lemon herb flavor.\",
+        \"cuisine\": \"Mediterranean\",
         \"prepTimeMins\": 10,
         \"cookTimeMins\": 25,
         \"ingredients\": [
@@ -231,7 +231,13 @@ Do not return user profile."""
           \"Place chicken breasts in a baking dish and drizzle with lemon herb mixture.\",
           \"Bake for 20-25 minutes, or until chicken is cooked through and internal temperature reaches 165°F (74°C).\",
           \"Let the chicken rest for 5 minutes before serving.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 310,
+          \"protein_g\": 45,
+          \"carbs_g\": 2,
+          \"fat_g\": 13
+        }
       }
     }
   },
@@ -240,6 +246,7 @@ Do not return user profile."""
       \"name\": \"Scrambled Tofu with Spinach and Tomatoes\",
       \"recipe\": {
         \"description\": \"A savory and protein-packed tofu scramble with fresh spinach and juicy tomatoes.\",
+        \"cuisine\": \"American\",
         \"prepTimeMins\": 5,
         \"cookTimeMins\": 10,
         \"ingredients\": [
@@ -295,13 +302,20 @@ Do not return user profile."""
           \"Add crumbled tofu, nutritional yeast, turmeric powder, salt, and pepper.\",
           \"Cook, stirring occasionally, until tofu is heated through and slightly browned, about 5 minutes.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 240,
+          \"protein_g\": 22,
+          \"carbs_g\": 12,
+          \"fat_g\": 13
+        }
       }
     },
     \"Lunch\": {
       \"name\": \"Lentil Soup\",
       \"recipe\": {
         \"description\": \"A hearty and nutritious lentil soup, perfect for a comforting lunch.\",
+        \"cuisine\": \"Mediterranean\",
         \"prepTimeMins\": 10,
         \"cookTimeMins\": 30,
         \"ingredients\": [
@@ -374,13 +388,20 @@ Do not return user profile."""
           \"Add lentils, vegetable broth, diced tomatoes, thyme, salt, and pepper.\",
           \"Bring to a boil, then reduce heat and simmer for 20-25 minutes, or until lentils are tender.\",
           \"Serve hot.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 350,
+          \"protein_g\": 20,
+          \"carbs_g\": 55,
+          \"fat_g\": 6
+        }
       }
     },
     \"Dinner\": {
       \"name\": \"Baked Salmon with Roasted Asparagus\",
       \"recipe\": {
         \"description\": \"A simple and healthy baked salmon served with tender roasted asparagus.\",
+        \"cuisine\": \"Scandinavian\",
         \"prepTimeMins\": 10,
         \"cookTimeMins\": 15,
         \"ingredients\": [
@@ -430,7 +451,13 @@ Do not return user profile."""
           \"Top each salmon fillet with lemon slices.\",
           \"Bake for 12-15 minutes, or until salmon is cooked through and asparagus is tender.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 420,
+          \"protein_g\": 36,
+          \"carbs_g\": 9,
+          \"fat_g\": 27
+        }
       }
     }
   },
@@ -439,6 +466,7 @@ Do not return user profile."""
       \"name\": \"Overnight Oats with Almonds and Banana\",
       \"recipe\": {
         \"description\": \"Easy and delicious overnight oats prepared with almond milk, sliced banana, and crunchy almonds.\",
+        \"cuisine\": \"American\",
         \"prepTimeMins\": 5,
         \"cookTimeMins\": 0,
         \"ingredients\": [
@@ -483,13 +511,20 @@ Do not return user profile."""
           \"Cover and refrigerate overnight.\",
           \"In the morning, stir well and add maple syrup if desired.\",
           \"Serve cold.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 380,
+          \"protein_g\": 11,
+          \"carbs_g\": 54,
+          \"fat_g\": 15
+        }
       }
     },
     \"Lunch\": {
       \"name\": \"Chickpea Salad Sandwich\",
       \"recipe\": {
         \"description\": \"A vegan chickpea salad sandwich, a great alternative to tuna salad, made with mashed chickpeas, vegan mayo and seasonings.\",
+        \"cuisine\": \"American\",
         \"prepTimeMins\": 10,
         \"cookTimeMins\": 0,
         \"ingredients\": [
@@ -555,13 +590,20 @@ Do not return user profile."""
           \"Spread chickpea salad onto one slice of bread.\",
           \"Top with lettuce and another slice of bread.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 410,
+          \"protein_g\": 15,
+          \"carbs_g\": 56,
+          \"fat_g\": 13
+        }
       }
     },
     \"Dinner\": {
       \"name\": \"Turkey and Vegetable Stir-Fry\",
       \"recipe\": {
         \"description\": \"Quick and easy turkey stir-fry with lots of colorful vegetables.\",
+        \"cuisine\": \"Chinese\",
         \"prepTimeMins\": 15,
         \"cookTimeMins\": 20,
         \"ingredients\": [
@@ -617,7 +659,13 @@ Do not return user profile."""
           \"Add broccoli florets, carrot, and bell pepper and stir-fry for 5-7 minutes, or until vegetables are tender-crisp.\",
           \"Add soy sauce, ginger, and garlic and stir-fry for 1-2 minutes more, or until fragrant.\",
           \"Serve hot.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 390,
+          \"protein_g\": 30,
+          \"carbs_g\": 17,
+          \"fat_g\": 23
+        }
       }
     }
   },
@@ -626,6 +674,7 @@ Do not return user profile."""
       \"name\": \"Smoothie Bowl with Granola and Fruit\",
       \"recipe\": {
         \"description\": \"A thick and creamy smoothie bowl topped with crunchy granola and fresh fruit.\",
+        \"cuisine\": \"American\",
         \"prepTimeMins\": 5,
         \"cookTimeMins\": 0,
         \"ingredients\": [
@@ -664,13 +713,20 @@ Do not return user profile."""
           \"Pour smoothie into a bowl.\",
           \"Top with granola and fresh fruit.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 360,
+          \"protein_g\": 7,
+          \"carbs_g\": 64,
+          \"fat_g\": 10
+        }
       }
     },
     \"Lunch\": {
       \"name\": \"Quinoa Bowl with Black Beans and Avocado\",
       \"recipe\": {
         \"description\": \"A delicious and filling quinoa bowl with black beans, avocado, and a lime dressing.\",
+        \"cuisine\": \"Mexican\",
         \"prepTimeMins\": 15,
         \"cookTimeMins\": 20,
         \"ingredients\": [
@@ -743,13 +799,20 @@ Do not return user profile."""
           \"In a small bowl, whisk together lime juice, olive oil, cilantro, salt, and pepper.\",
           \"Pour dressing over the bowl and toss gently to combine.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 480,
+          \"protein_g\": 16,
+          \"carbs_g\": 66,
+          \"fat_g\": 18
+        }
       }
     },
     \"Dinner\": {
       \"name\": \"Chicken and Vegetable Skewers\",
       \"recipe\": {
         \"description\": \"Grilled chicken and vegetable skewers marinated in a lemon herb dressing.\",
+        \"cuisine\": \"Mediterranean\",
         \"prepTimeMins\": 20,
         \"cookTimeMins\": 15,
         \"ingredients\": [
@@ -817,7 +880,13 @@ Do not return user profile."""
           \"Thread chicken and vegetables onto skewers.\",
           \"Grill for 10-15 minutes, or until chicken is cooked through and vegetables are tender, turning occasionally.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 330,
+          \"protein_g\": 38,
+          \"carbs_g\": 14,
+          \"fat_g\": 14
+        }
       }
     }
   },
@@ -826,6 +895,7 @@ Do not return user profile."""
       \"name\": \"Whole Wheat Toast with Peanut Butter and Apple Slices\",
       \"recipe\": {
         \"description\": \"A simple and satisfying breakfast of whole wheat toast topped with peanut butter and crisp apple slices.\",
+        \"cuisine\": \"American\",
         \"prepTimeMins\": 5,
         \"cookTimeMins\": 0,
         \"ingredients\": [
@@ -851,13 +921,20 @@ Do not return user profile."""
           \"Spread peanut butter evenly on each slice of toast.\",
           \"Top with apple slices.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 350,
+          \"protein_g\": 12,
+          \"carbs_g\": 44,
+          \"fat_g\": 16
+        }
       }
     },
     \"Lunch\": {
       \"name\": \"Spinach Salad with Berries and Balsamic Vinaigrette\",
       \"recipe\": {
         \"description\": \"A light and refreshing spinach salad with mixed berries and a tangy balsamic vinaigrette.\",
+        \"cuisine\": \"Mediterranean\",
         \"prepTimeMins\": 10,
         \"cookTimeMins\": 0,
         \"ingredients\": [
@@ -890,13 +967,20 @@ Do not return user profile."""
           \"Drizzle with balsamic vinaigrette.\",
           \"Toss gently to combine.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 280,
+          \"protein_g\": 7,
+          \"carbs_g\": 19,
+          \"fat_g\": 21
+        }
       }
     },
     \"Dinner\": {
       \"name\": \"Shrimp Scampi with Zucchini Noodles\",
       \"recipe\": {
         \"description\": \"A light and flavorful shrimp scampi served over zucchini noodles.\",
+        \"cuisine\": \"Italian\",
         \"prepTimeMins\": 10,
         \"cookTimeMins\": 15,
         \"ingredients\": [
@@ -957,36 +1041,277 @@ Do not return user profile."""
           \"Add lemon juice and zucchini noodles and cook until zucchini noodles are tender-crisp, about 2-3 minutes.\",
           \"Stir in parsley, salt, and pepper.\",
           \"Serve immediately.\"
-        ]
+        ],
+        \"nutrition\": {
+          \"calories\": 290,
+          \"protein_g\": 29,
+          \"carbs_g\": 10,
+          \"fat_g\": 16
+        }
       }
     }
   }
 }"""
-                    ),
-                ],
-            ),
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_text(text=prompt),
-                ],
-            ),
+
+# Short keys used by compact mode, mapped back to full keys on decode
+COMPACT_KEYS = {
+    "name": "n",
+    "recipe": "r",
+    "description": "d",
+    "cuisine": "c",
+    "prepTimeMins": "p",
+    "cookTimeMins": "k",
+    "ingredients": "i",
+    "item": "it",
+    "quantity": "q",
+    "unit": "u",
+    "notes": "no",
+    "instructions": "s",
+    "nutrition": "nu",
+    "calories": "cal",
+    "protein_g": "pg",
+    "carbs_g": "cg",
+    "fat_g": "fg",
+    "Breakfast": "B",
+    "Lunch": "L",
+    "Dinner": "D",
+}
+EXPANDED_KEYS = {short: full for full, short in COMPACT_KEYS.items()}
+
+COMPACT_INSTRUCTIONS = (
+    "Expert meal planner. Generate a meal plan that strictly follows the user's profile "
+    "(days, restrictions, allergies, dislikes, preferred cuisines, calorie and macro goals). "
+    "Allergies and restrictions are non-negotiable. Vary flavors and ingredients; instructions "
+    "must be detailed. Reply ONLY with minified JSON: root keys \"Day1\"..\"DayN\"; each day has "
+    "\"B\",\"L\",\"D\" (breakfast, lunch, dinner); each meal {\"n\":name,\"r\":{\"d\":description,"
+    "\"c\":cuisine,\"p\":prep minutes,\"k\":cook minutes,\"i\":[{\"it\":item,\"q\":quantity string,"
+    "\"u\":unit}],\"s\":[steps],\"nu\":{\"cal\":calories,\"pg\":protein g,\"cg\":carbs g,"
+    "\"fg\":fat g}}}. Do not return the profile."
+)
+
+
+def _rename_keys(value, mapping):
+    if isinstance(value, dict):
+        return {mapping.get(key, key): _rename_keys(item, mapping) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rename_keys(item, mapping) for item in value]
+    return value
+
+
+def compact_encode(value):
+    """
+    Shorten the keys of a meal plan (or any part of one)
+    """
+    return _rename_keys(value, COMPACT_KEYS)
+
+
+def compact_decode(value):
+    """
+    Restore the full keys of a compact-mode response
+    """
+    return _rename_keys(value, EXPANDED_KEYS)
+
+
+@lru_cache(maxsize=1)
+def compact_example() -> str:
+    """
+    Single-day, minified, short-keyed version of the full-mode example
+    """
+    example = json.loads(MEAL_PLAN_EXAMPLE)
+    return json.dumps(compact_encode({"Day1": example["Day1"]}), separators=(",", ":"))
+
+
+def meal_plan_messages(user_profile, mode: str = GEMINI_PROMPT_MODE):
+    """
+    Build the (role, text) messages of a meal plan request
+
+    Parameters:
+    - user_profile: Profile formatted for the Gemini API
+    - mode: "full" sends the original instructions and multi-day example,
+      "compact" a condensed instruction, a single-day minified example with
+      short keys and a minified profile
+    """
+    if mode == "compact":
+        return [
+            ("user", COMPACT_INSTRUCTIONS),
+            ("model", compact_example()),
+            ("user", json.dumps(user_profile, separators=(",", ":"))),
         ]
 
-        generate_content_config = types.GenerateContentConfig(
-            response_mime_type="application/json",
+    return [
+        ("user", MEAL_PLAN_INSTRUCTIONS),
+        ("model", MEAL_PLAN_EXAMPLE),
+        ("user", f"""{json.dumps(user_profile)}"""),
+    ]
+
+
+class GeminiService:
+    @staticmethod
+    def generate_meal_plan(
+        user_profile,
+        days,
+        mode: str = GEMINI_PROMPT_MODE,
+        user_tier: str = "free",
+        user_id: str = None,
+    ):
+        """
+        Generate a meal plan using the Gemini API
+        """
+        messages = meal_plan_messages(user_profile, mode)
+
+        meal_plan = GeminiService._generate_json(
+            messages, days * 3, user_tier, user_id, "meal_plan"
         )
+        return compact_decode(meal_plan) if mode == "compact" else meal_plan
 
-        response = client.models.generate_content(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
+    @staticmethod
+    def generate_meals(
+        user_profile,
+        slots,
+        plan_context=None,
+        avoid=None,
+        user_tier: str = "free",
+        user_id: str = None,
+    ):
+        """
+        Generate replacement meals for specific slots of a plan
+
+        Parameters:
+        - user_profile: Profile in the same format as generate_meal_plan
+        - slots: List of (day key, meal type) pairs to generate
+        - plan_context: The days being patched; meals that are kept are sent
+          by name and calories so the model can balance each day around them,
+          the names of the meals being replaced so they are not repeated
+        - avoid: Ingredients the replacements must not contain
+        - user_tier: The user's subscription tier, used for model routing
+        - user_id: User the usage is attributed to
+
+        Returns a mapping of day key -> meal type -> meal.
+        """
+        replace = {}
+        for day_key, meal_type in slots:
+            replace.setdefault(day_key, []).append(meal_type)
+
+        keep = {}
+        replaced = set()
+        for day_key in replace:
+            for meal_type, meal in (plan_context or {}).get(day_key, {}).items():
+                if meal_type in replace[day_key]:
+                    if meal.get("name"):
+                        replaced.add(meal["name"])
+                    continue
+                nutrition = meal.get("recipe", {}).get("nutrition") or {}
+                keep.setdefault(day_key, {})[meal_type] = {
+                    "name": meal.get("name"),
+                    "calories": nutrition.get("calories"),
+                }
+
+        prompt = (
+            "Act as an expert meal planner. Generate replacement meals for an existing meal plan.\n"
+            f"User profile: {json.dumps(user_profile)}\n"
+            f"Meals to generate: {json.dumps(replace)}\n"
+            f"Meals kept in the plan (do not repeat them, balance each day's calories against them): {json.dumps(keep)}\n"
+            f"Meals being replaced (do not generate them again): {json.dumps(sorted(replaced))}\n"
+            f"Never use these ingredients: {json.dumps(sorted(avoid or []))}\n"
+            "Respond ONLY with a JSON object mapping each day key to an object keyed by the requested meal types. "
+            "Each meal has \"name\" and \"recipe\"; the recipe has \"description\", \"cuisine\", \"prepTimeMins\", "
+            "\"cookTimeMins\", \"ingredients\" (objects with \"item\", \"quantity\", \"unit\"), \"instructions\" "
+            "(detailed steps) and \"nutrition\" (\"calories\", \"protein_g\", \"carbs_g\", \"fat_g\")."
+        )
+
+        return GeminiService._generate_json(
+            [("user", prompt)], len(slots), user_tier, user_id, "meals"
+        )
+
+    @staticmethod
+    def _generate_json(
+        messages, slots: int, user_tier: str = "free", user_id: str = None, kind: str = None
+    ):
+        """
+        Send a prompt to the configured LLM provider and parse the JSON response
+
+        Models are tried in the order the provider chooses (the model router
+        for Gemini), falling back to the next one when a call fails or
+        returns invalid JSON; outcomes are reported back to the provider.
+        Calls made for a user are checked against their budget first and
+        recorded in the usage ledger, including those returning invalid
+        JSON; inside UsageService.background() they are charged to the
+        user's background usage without a budget check.
+        """
+        provider = get_provider()
+        background = UsageService.is_background()
+        downgrade = (
+            UsageService.check_budget(user_id, user_tier) if user_id and not background else False
         )
 
-        # Parse the response as JSON
-        try:
-            meal_plan = json.loads(response.text)
-            return meal_plan
-        except json.JSONDecodeError:
-            # Handle case where response isn't valid JSON
-            raise Exception("Failed to parse meal plan response from Gemini API")
+        last_error = None
+        for attempt, model in enumerate(provider.models(slots, user_tier, downgrade)):
+            if attempt:
+                provider.record_fallback(model)
+
+            started = time.perf_counter()
+            try:
+                with profiling.span("llm.generate", model=model, slots=slots):
+                    text, usage = provider.generate(messages, model, slots)
+            except Exception as e:
+                provider.record_failure(model)
+                logger.warning(
+                    "LLM call to %s failed: %s", model, e, extra={"model": model, "llm_kind": kind}
+                )
+                last_error = e
+                continue
+
+            latency_ms = (time.perf_counter() - started) * 1000
+            try:
+                result = json.loads(text)
+            except json.JSONDecodeError:
+                # Handle case where response isn't valid JSON; its tokens
+                # are billed all the same
+                provider.record_failure(model)
+                logger.warning(
+                    "Invalid JSON from %s", model, extra={"model": model, "llm_kind": kind}
+                )
+                if user_id:
+                    GeminiService._record_usage(
+                        user_id, model, kind, usage, latency_ms, True, background
+                    )
+                last_error = Exception("Failed to parse meal plan response from Gemini API")
+                continue
+
+            provider.record_success(model, latency_ms, usage)
+            logger.info(
+                "LLM call to %s took %.0f ms",
+                model,
+                latency_ms,
+                extra={
+                    "model": model,
+                    "llm_kind": kind,
+                    "slots": slots,
+                    "latency_ms": round(latency_ms, 1),
+                    "prompt_tokens": usage["prompt_tokens"],
+                    "output_tokens": usage["output_tokens"],
+                },
+            )
+            if user_id:
+                GeminiService._record_usage(
+                    user_id, model, kind, usage, latency_ms, False, background
+                )
+            return result
+
+        raise last_error or Exception("No models configured")
+
+    @staticmethod
+    def _record_usage(
+        user_id: str, model: str, kind: str, usage, latency_ms: float, failed: bool, background: bool
+    ):
+        UsageModel.record(
+            user_id,
+            model,
+            kind,
+            usage["prompt_tokens"],
+            usage["output_tokens"],
+            latency_ms,
+            estimate_cost(model, usage["prompt_tokens"], usage["output_tokens"]),
+            failed=failed,
+            background=background,
+        )
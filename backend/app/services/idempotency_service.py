@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from app.config import IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+from app.models.idempotency_key import IdempotencyKeyModel
+
+# How often a duplicate request checks whether the original has finished
+POLL_INTERVAL_SECONDS = 0.25
+
+
+async def _renew_lease(user_id: str, key: str):
+    """
+    Keep a running request's claim on its key until cancelled
+    """
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+        IdempotencyKeyModel.renew(user_id, key)
+
+
+class IdempotencyService:
+    @staticmethod
+    async def run(
+        user_id: str,
+        key: Optional[str],
+        endpoint: str,
+        payload: Dict,
+        handler: Callable[[], Awaitable[Dict]],
+    ):
+        """
+        Run a request handler at most once per Idempotency-Key
+
+        A retry with a key that already completed gets the stored response
+        without running the handler again. A retry arriving while the
+        original is still running waits for it. Failed requests are not
+        stored, so they can be retried with the same key; neither are requests
+        whose worker died, whose claim lapses once it is no longer renewed.
+        Without a key the handler simply runs.
+
+        Parameters:
+        - user_id: Keys are scoped to the current user
+        - key: Value of the Idempotency-Key header
+        - endpoint: Name of the endpoint the key is used for
+        - payload: Request body, a key reused with a different one is rejected
+        - handler: Coroutine function producing the JSON response
+        """
+        if not key:
+            return await handler()
+
+        request_hash = hashlib.sha256(
+            json.dumps([endpoint, payload], sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = IdempotencyKeyModel.claim(user_id, key, endpoint, request_hash)
+            if record is None:
+                break
+
+            if record["request_hash"] != request_hash:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+            if record["status"] == "completed":
+                return record["response"]
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                )
+            # Still in progress, or released after failing and claimable again
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+        renewal = asyncio.create_task(_renew_lease(user_id, key))
+        try:
+            response = await handler()
+        except BaseException:
+            IdempotencyKeyModel.release(user_id, key)
+            raise
+        finally:
+            renewal.cancel()
+
+        IdempotencyKeyModel.complete(user_id, key, response)
+        return response
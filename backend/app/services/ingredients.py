@@ -0,0 +1,164 @@
+import re
+from fractions import Fraction
+from typing import Optional
+
+# Unicode vulgar fractions Gemini occasionally emits instead of "1/2"
+UNICODE_FRACTIONS = {
+    "¼": "1/4",
+    "½": "1/2",
+    "¾": "3/4",
+    "⅓": "1/3",
+    "⅔": "2/3",
+    "⅛": "1/8",
+    "⅜": "3/8",
+    "⅝": "5/8",
+    "⅞": "7/8",
+}
+
+# Unit aliases mapped to a canonical unit name
+UNIT_ALIASES = {
+    "tsp": "tsp", "tsps": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "tbsp": "tbsp", "tbsps": "tbsp", "tbs": "tbsp", "tbl": "tbsp",
+    "tablespoon": "tbsp", "tablespoons": "tbsp",
+    "cup": "cup", "cups": "cup", "c": "cup",
+    "fl oz": "fl oz", "fluid ounce": "fl oz", "fluid ounces": "fl oz",
+    "pint": "pint", "pints": "pint", "pt": "pint",
+    "quart": "quart", "quarts": "quart", "qt": "quart",
+    "gallon": "gallon", "gallons": "gallon", "gal": "gallon",
+    "ml": "ml", "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml",
+    "l": "l", "liter": "l", "liters": "l", "litre": "l", "litres": "l",
+    "g": "g", "gram": "g", "grams": "g", "gr": "g",
+    "kg": "kg", "kilogram": "kg", "kilograms": "kg",
+    "oz": "oz", "ounce": "oz", "ounces": "oz",
+    "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb",
+    "piece": "piece", "pieces": "piece", "whole": "piece", "medium": "piece",
+    "large": "piece", "small": "piece",
+    "clove": "clove", "cloves": "clove",
+    "slice": "slice", "slices": "slice",
+    "can": "can", "cans": "can",
+    "pinch": "pinch", "pinches": "pinch",
+    "dash": "dash", "dashes": "dash",
+    "handful": "handful", "handfuls": "handful",
+    "bunch": "bunch", "bunches": "bunch",
+    "sprig": "sprig", "sprigs": "sprig",
+    "stalk": "stalk", "stalks": "stalk",
+    "scoop": "scoop", "scoops": "scoop",
+}
+
+# Conversion factors to the base unit of each dimension (ml for volume, g for mass)
+VOLUME_UNITS = {
+    "tsp": 4.92892,
+    "tbsp": 14.7868,
+    "fl oz": 29.5735,
+    "cup": 236.588,
+    "pint": 473.176,
+    "quart": 946.353,
+    "gallon": 3785.41,
+    "ml": 1.0,
+    "l": 1000.0,
+}
+MASS_UNITS = {
+    "g": 1.0,
+    "oz": 28.3495,
+    "lb": 453.592,
+    "kg": 1000.0,
+}
+
+# Words that describe preparation or size rather than the ingredient itself
+DESCRIPTOR_WORDS = {
+    "fresh", "freshly", "chopped", "diced", "minced", "sliced", "grated",
+    "shredded", "crushed", "ground", "large", "medium", "small", "ripe",
+    "organic", "raw", "cooked", "boneless", "skinless", "finely", "roughly",
+    "thinly", "peeled", "halved", "optional",
+}
+
+_QUANTITY_RE = re.compile(r"(\d+(?:\.\d+)?)(?:\s+(\d+/\d+))?(?:/(\d+))?")
+_RANGE_RE = re.compile(r"\s*(?:-|–|to)\s*")
+
+
+def parse_quantity(quantity) -> Optional[float]:
+    """
+    Parse a free-text quantity such as "1/4", "1 1/2", "0.5" or "2-3" into a float
+
+    Ranges resolve to their upper bound so the shopping list never comes up short.
+    Returns None for quantities that are not numeric (e.g. "to taste").
+    """
+    if quantity is None:
+        return None
+    if isinstance(quantity, (int, float)):
+        return float(quantity)
+
+    text = str(quantity).strip().lower()
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        # "1½" -> "1 1/2"
+        text = re.sub(rf"(\d){symbol}", rf"\1 {fraction}", text)
+        text = text.replace(symbol, fraction)
+
+    parts = _RANGE_RE.split(text)
+    value = None
+    for part in parts:
+        match = _QUANTITY_RE.search(part)
+        if not match:
+            continue
+        whole, mixed, denominator = match.groups()
+        if denominator:
+            amount = Fraction(int(float(whole)), int(denominator))
+        else:
+            amount = Fraction(whole)
+            if mixed:
+                amount += Fraction(mixed)
+        if value is None or amount > value:
+            value = amount
+
+    return float(value) if value is not None else None
+
+
+def canonical_unit(unit) -> str:
+    """
+    Map a unit string to its canonical spelling
+    """
+    text = re.sub(r"[.\s]+", " ", str(unit or "")).strip().lower()
+    if not text:
+        return ""
+    return UNIT_ALIASES.get(text, UNIT_ALIASES.get(text.rstrip("s"), text))
+
+
+def _singular(word: str) -> str:
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def canonical_name(item) -> str:
+    """
+    Normalize an ingredient name so spelling variants aggregate together
+
+    "Fresh Tomatoes (diced)" and "tomato" both become "tomato".
+    """
+    text = re.sub(r"\(.*?\)", " ", str(item or "").lower())
+    text = text.split(",")[0]
+    text = re.sub(r"[^a-z0-9\s-]", " ", text)
+    words = [word for word in text.split() if word not in DESCRIPTOR_WORDS]
+    if not words:
+        return ""
+    words[-1] = _singular(words[-1])
+    return " ".join(words)
+
+
+def unit_dimension(unit: str):
+    """
+    Return (dimension, factor to base unit) for a canonical unit
+    """
+    if unit in VOLUME_UNITS:
+        return "volume", VOLUME_UNITS[unit]
+    if unit in MASS_UNITS:
+        return "mass", MASS_UNITS[unit]
+    return unit, 1.0
@@ -0,0 +1,326 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+from app.config import (
+    GEMINI_API_KEY,
+    LLM_LOCAL_CONTEXT_TOKENS,
+    LLM_LOCAL_MAX_TOKENS,
+    LLM_LOCAL_MODEL_PATH,
+    LLM_LOCAL_THREADS,
+    LLM_PROVIDER,
+    LLM_RECORD_DIR,
+    LLM_REPLAY_DIR,
+    LLM_REPLAY_LATENCY_MS,
+)
+from app import metrics
+from app.services.model_router import model_router
+
+# A prompt is a list of (role, text) messages; roles are "user" and "model"
+Messages = List[Tuple[str, str]]
+
+
+def prompt_key(messages: Messages) -> str:
+    """
+    Stable hash of a prompt, used to match recorded responses
+    """
+    return hashlib.sha256(json.dumps(messages).encode()).hexdigest()
+
+
+class LLMProvider(ABC):
+    """
+    Backend that turns a prompt into JSON text
+
+    generate() returns (text, usage) where usage holds "prompt_tokens" and
+    "output_tokens" (0 when the backend does not report them). The record_*
+    hooks report call outcomes; only providers that route between models
+    act on them.
+    """
+
+    name = "base"
+
+    def models(self, slots: int, user_tier: str = "free", downgrade: bool = False) -> List[str]:
+        """
+        Get the models to try for a request, in order; downgrade asks for
+        the cheapest model only
+        """
+        return [self.name]
+
+    @abstractmethod
+    def generate(self, messages: Messages, model: str, slots: int) -> Tuple[str, Dict]:
+        """
+        Send a prompt to a model and get (text, usage)
+        """
+
+    def warm_up(self):
+        """
+        Open connections or load the model ahead of the first request
+        """
+
+    def record_success(self, model: str, latency_ms: float, usage: Dict):
+        """
+        Report a call that returned valid JSON
+        """
+
+    def record_failure(self, model: str):
+        """
+        Report a call that failed or returned invalid JSON
+        """
+
+    def record_fallback(self, model: str):
+        """
+        Report that a request fell back to another model
+        """
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini API, with model tiers chosen by the model router
+
+    The SDK is imported when the provider is created rather than with this
+    module, since it dominates the app's import time.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: str = GEMINI_API_KEY):
+        import google.genai as genai
+        from google.genai import types
+
+        self.types = types
+        self.client = genai.Client(api_key=api_key)
+        self.config = types.GenerateContentConfig(response_mime_type="application/json")
+
+    def models(self, slots: int, user_tier: str = "free", downgrade: bool = False) -> List[str]:
+        if downgrade:
+            return [model_router.cheapest()]
+        return model_router.route(slots, user_tier)
+
+    def warm_up(self):
+        # A metadata lookup (no tokens billed) opens the HTTPS connection
+        self.client.models.get(model=model_router.cheapest())
+
+    def record_success(self, model: str, latency_ms: float, usage: Dict):
+        model_router.record_success(
+            model, latency_ms, usage["prompt_tokens"], usage["output_tokens"]
+        )
+
+    def record_failure(self, model: str):
+        model_router.record_failure(model)
+
+    def record_fallback(self, model: str):
+        metrics.increment("gemini_fallbacks_total", model=model)
+
+    def generate(self, messages: Messages, model: str, slots: int):
+        types = self.types
+        contents = [
+            types.Content(role=role, parts=[types.Part.from_text(text=text)])
+            for role, text in messages
+        ]
+        response = self.client.models.generate_content(
+            model=model, contents=contents, config=self.config
+        )
+        usage = response.usage_metadata
+        return response.text, {
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+            "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        }
+
+
+class RecordingProvider(LLMProvider):
+    """
+    Wraps another provider and saves every response for later replay
+    """
+
+    def __init__(self, provider: LLMProvider, directory: str = LLM_RECORD_DIR):
+        self.provider = provider
+        self.name = provider.name
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def models(self, slots: int, user_tier: str = "free", downgrade: bool = False):
+        return self.provider.models(slots, user_tier, downgrade)
+
+    def generate(self, messages: Messages, model: str, slots: int):
+        text, usage = self.provider.generate(messages, model, slots)
+        key = prompt_key(messages)
+        record = {
+            "key": key,
+            "model": model,
+            "slots": slots,
+            "response": text,
+            "usage": usage,
+            "recorded_at": datetime.now().isoformat(),
+        }
+        (self.directory / f"{key}.json").write_text(json.dumps(record))
+        return text, usage
+
+    def warm_up(self):
+        self.provider.warm_up()
+
+    def record_success(self, model: str, latency_ms: float, usage: Dict):
+        self.provider.record_success(model, latency_ms, usage)
+
+    def record_failure(self, model: str):
+        self.provider.record_failure(model)
+
+    def record_fallback(self, model: str):
+        self.provider.record_fallback(model)
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Serves captured responses without network access
+
+    A response recorded for the exact same prompt is preferred. Otherwise
+    recorded responses for the same number of meal slots (or, failing that,
+    any response) are served round-robin, so load tests with varying
+    profiles keep working. Each call sleeps LLM_REPLAY_LATENCY_MS to mimic
+    upstream latency.
+
+    Records are JSON files holding the raw model text under "response", or
+    plain meal plan JSON.
+    """
+
+    name = "replay"
+
+    def __init__(self, directory: str = LLM_REPLAY_DIR, latency_ms: int = LLM_REPLAY_LATENCY_MS):
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, str] = {}
+        by_slots: Dict[int, List[str]] = {}
+        responses = []
+
+        for path in sorted(Path(directory).glob("*.json")):
+            data = json.loads(path.read_text())
+            if isinstance(data, dict) and isinstance(data.get("response"), str):
+                text = data["response"]
+                if data.get("key"):
+                    self._by_key[data["key"]] = text
+                slots = data.get("slots")
+            else:
+                text = json.dumps(data)
+                slots = None
+            if slots is None:
+                # Count the meals in the response
+                try:
+                    slots = sum(len(meals) for meals in json.loads(text).values())
+                except (ValueError, AttributeError, TypeError):
+                    slots = 0
+            by_slots.setdefault(slots, []).append(text)
+            responses.append(text)
+
+        if not responses:
+            raise ValueError(f"No recorded responses found in {directory}")
+
+        self._cycles = {slots: itertools.cycle(texts) for slots, texts in by_slots.items()}
+        self._any = itertools.cycle(responses)
+
+    def generate(self, messages: Messages, model: str, slots: int):
+        text = self._by_key.get(prompt_key(messages))
+        if text is None:
+            with self._lock:
+                text = next(self._cycles.get(slots, self._any))
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return text, {"prompt_tokens": 0, "output_tokens": 0}
+
+
+class LocalProvider(LLMProvider):
+    """
+    CPU-only local model (a GGUF file) through llama-cpp-python
+
+    The model is loaded on first use and calls are serialized, since a
+    llama.cpp context is not thread-safe.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path: str = LLM_LOCAL_MODEL_PATH):
+        if not model_path:
+            raise ValueError("LLM_LOCAL_MODEL_PATH must be set for the local provider")
+        self.model_path = model_path
+        self._llm = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._llm is None:
+            try:
+                from llama_cpp import Llama
+            except ImportError:
+                raise ValueError(
+                    "The local provider needs llama-cpp-python (pip install llama-cpp-python)"
+                )
+            self._llm = Llama(
+                model_path=self.model_path,
+                n_ctx=LLM_LOCAL_CONTEXT_TOKENS,
+                n_threads=LLM_LOCAL_THREADS or None,
+                n_gpu_layers=0,
+                verbose=False,
+            )
+        return self._llm
+
+    def warm_up(self):
+        with self._lock:
+            self._load()
+
+    def generate(self, messages: Messages, model: str, slots: int):
+        chat = [
+            {"role": "assistant" if role == "model" else "user", "content": text}
+            for role, text in messages
+        ]
+        with self._lock:
+            response = self._load().create_chat_completion(
+                messages=chat,
+                response_format={"type": "json_object"},
+                max_tokens=LLM_LOCAL_MAX_TOKENS,
+            )
+        usage = response.get("usage") or {}
+        return response["choices"][0]["message"]["content"], {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "output_tokens": usage.get("completion_tokens", 0),
+        }
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "replay": ReplayProvider,
+    "local": LocalProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> LLMProvider:
+    """
+    Get the provider selected by LLM_PROVIDER, created on first use
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            if LLM_PROVIDER not in PROVIDERS:
+                raise ValueError(
+                    f"Unknown LLM_PROVIDER {LLM_PROVIDER!r}, expected one of {', '.join(PROVIDERS)}"
+                )
+            provider = PROVIDERS[LLM_PROVIDER]()
+            if LLM_RECORD_DIR:
+                provider = RecordingProvider(provider)
+            _provider = provider
+        return _provider
+
+
+def reset_provider():
+    """
+    Drop the current provider so the next call creates a new one, e.g. in a
+    forked worker process that must not share the parent's HTTP connections
+    """
+    global _provider
+    with _provider_lock:
+        _provider = None
@@ -0,0 +1,152 @@
+import random
+from itertools import product
+from typing import Dict, List, Optional
+from app.config import (
+    LOCAL_PLANNER_CALORIE_TOLERANCE,
+    LOCAL_PLANNER_MIN_CANDIDATES,
+)
+from app.models.recipe import RecipeModel
+from app.services.recipe_index import recipe_index
+
+MEAL_TYPES = ("Breakfast", "Lunch", "Dinner")
+
+# Share of the daily calorie target each meal is expected to cover
+MEAL_CALORIE_SHARE = {"Breakfast": 0.25, "Lunch": 0.35, "Dinner": 0.40}
+
+# Candidates kept per meal slot before the per-day combination search
+CANDIDATES_PER_SLOT = 12
+
+PREFERRED_CUISINE_BONUS = 0.05
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class LocalPlanner:
+    @staticmethod
+    def plan(user_profile: Dict, days: int) -> Optional[Dict]:
+        """
+        Compose a meal plan from previously generated recipes
+
+        Candidates are filtered by allergies, dislikes and dietary restrictions
+        through the recipe index, pre-ranked per meal slot by calorie fit and
+        cuisine preference, then each day picks the Breakfast/Lunch/Dinner
+        combination whose calorie and macro totals are closest to the goals.
+
+        Returns the plan in the same DayX -> meal type -> meal shape Gemini
+        produces, or None when the library cannot cover the request.
+        """
+        target_calories = _number(user_profile.get("target_daily_calories")) or 2000
+        target_macros = user_profile.get("target_macros_pct") or {}
+        preferred = {c.strip().lower() for c in user_profile.get("preferred_cuisines", [])}
+        exclude = list(user_profile.get("allergies", [])) + list(
+            user_profile.get("disliked_ingredients", [])
+        )
+
+        slots = {}
+        for meal_type in MEAL_TYPES:
+            candidates = recipe_index.candidates(
+                meal_type, exclude, user_profile.get("dietary_restrictions", [])
+            )
+            if len(candidates) < max(days, LOCAL_PLANNER_MIN_CANDIDATES):
+                return None
+
+            slot_target = target_calories * MEAL_CALORIE_SHARE[meal_type]
+            scored = []
+            for recipe in candidates:
+                calories = _number(recipe["nutrition"].get("calories"))
+                if calories <= 0:
+                    continue
+                score = abs(calories - slot_target) / slot_target
+                if (recipe["cuisine"] or "").lower() in preferred:
+                    score -= PREFERRED_CUISINE_BONUS
+                # Jitter so users with identical profiles get different plans
+                score += random.uniform(0, 0.05)
+                scored.append((score, recipe))
+            scored.sort(key=lambda item: item[0])
+            slots[meal_type] = [recipe for _, recipe in scored[: CANDIDATES_PER_SLOT + days]]
+
+        used = set()
+        plan_ids: List[Dict[str, str]] = []
+        for _ in range(days):
+            best = LocalPlanner._best_day(
+                slots, used, target_calories, target_macros, preferred
+            )
+            if best is None:
+                return None
+            used.update(recipe["id"] for recipe in best)
+            plan_ids.append({meal_type: recipe["id"] for meal_type, recipe in zip(MEAL_TYPES, best)})
+
+        recipes = RecipeModel.get_many(
+            recipe_id for day in plan_ids for recipe_id in day.values()
+        )
+        if any(recipe_id not in recipes for day in plan_ids for recipe_id in day.values()):
+            return None
+
+        return {
+            f"Day{i + 1}": {
+                meal_type: dict(recipes[recipe_id]) for meal_type, recipe_id in day.items()
+            }
+            for i, day in enumerate(plan_ids)
+        }
+
+    @staticmethod
+    def _best_day(slots, used, target_calories, target_macros, preferred):
+        """
+        Score every unused Breakfast/Lunch/Dinner combination and return the
+        best one, or None if no combination is within the calorie tolerance
+        """
+        options = [
+            [recipe for recipe in slots[meal_type] if recipe["id"] not in used][:CANDIDATES_PER_SLOT]
+            for meal_type in MEAL_TYPES
+        ]
+        if not all(options):
+            return None
+
+        # Pre-extract the numbers each combination sums
+        vectors = [
+            [
+                (
+                    _number(recipe["nutrition"].get("calories")),
+                    _number(recipe["nutrition"].get("protein_g")) * 4,
+                    _number(recipe["nutrition"].get("carbs_g")) * 4,
+                    _number(recipe["nutrition"].get("fat_g")) * 9,
+                    PREFERRED_CUISINE_BONUS if (recipe["cuisine"] or "").lower() in preferred else 0.0,
+                )
+                for recipe in slot
+            ]
+            for slot in options
+        ]
+        macro_targets = (
+            _number(target_macros.get("protein")) / 100,
+            _number(target_macros.get("carbs")) / 100,
+            _number(target_macros.get("fat")) / 100,
+        )
+
+        best_score, best_combo = None, None
+        for combo in product(*(range(len(slot)) for slot in options)):
+            picked = [vectors[slot][index] for slot, index in enumerate(combo)]
+            calories = sum(values[0] for values in picked)
+            calorie_error = abs(calories - target_calories) / target_calories
+            if calorie_error > LOCAL_PLANNER_CALORIE_TOLERANCE:
+                continue
+
+            macro_calories = [sum(values[i] for values in picked) for i in (1, 2, 3)]
+            macro_total = sum(macro_calories) or 1.0
+            macro_error = sum(
+                abs(macro / macro_total - target)
+                for macro, target in zip(macro_calories, macro_targets)
+            )
+            score = calorie_error + macro_error - sum(values[4] for values in picked)
+
+            if best_score is None or score < best_score:
+                best_score = score
+                best_combo = combo
+
+        if best_combo is None:
+            return None
+        return [options[slot][index] for slot, index in enumerate(best_combo)]
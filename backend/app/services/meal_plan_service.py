@@ -1,30 +1,36 @@
+import logging
 from datetime import date, timedelta
-from typing import Dict
+from typing import Dict, Optional
+from app import events, metrics, singleflight
+from app.config import LOCAL_PLANNER_ENABLED, MAX_PLANNED_DAYS, SCREENING_MAX_ATTEMPTS
 from app.models.meal_plan import MealPlanModel
+from app.models.meal_plan_changes import CREATED, REMOVED, MealPlanChangesModel
+from app.models.planning import PlanningModel
+from app.models.prebuilt_day import PrebuiltDayModel
 from app.services.gemini_service import GeminiService
+from app.services.local_planner import LocalPlanner
+from app.services.recipe_index import recipe_index
+from app.services.screening_service import ScreeningService
+from app.services.usage_service import BudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+
+def _same_name(meal: Dict, other: Optional[Dict]) -> bool:
+    """
+    Whether two meals have the same name, ignoring case and spacing
+    """
+    name = " ".join((meal.get("name") or "").lower().split())
+    return bool(other) and bool(name) and name == " ".join((other.get("name") or "").lower().split())
 
 
 class MealPlanService:
     @staticmethod
-    def generate_meal_plan(user_id: str, user_profile: Dict, days: int):
+    def _gemini_profile(user_profile: Dict, days: int):
         """
-        Generate a meal plan for a user and store it in the database
+        Format a user profile for the Gemini API
         """
-        # Check how many days are already planned
-        current_planned_days = MealPlanModel.count_planned_days(user_id)
-
-        # If already at max capacity, return error
-        if current_planned_days >= 7:
-            raise ValueError(
-                "Maximum meal plan capacity reached (7 days). Mark some days as complete before generating more."
-            )
-
-        # If requesting more days than available capacity, adjust days
-        if current_planned_days + days > 7:
-            days = 7 - current_planned_days
-
-        # Format profile for Gemini API
-        gemini_profile = {
+        return {
             "profile": {
                 "days": days,
                 "restrictions": user_profile["dietary_restrictions"],
@@ -40,30 +46,284 @@ class MealPlanService:
             },
         }
 
-        # Generate meal plan using Gemini API
-        meal_plan_data = GeminiService.generate_meal_plan(gemini_profile, days)
-
-        # Get the latest date currently in the plan
-        latest_date = MealPlanModel.get_latest_date(user_id)
-        
-        # Calculate start date - use the day after the latest date if there's a latest date,
-        # otherwise start from today
-        today = date.today()
-        if latest_date:
-            # If latest date is in the future, start from the day after
-            if latest_date >= today:
-                start_date = latest_date + timedelta(days=1)
-            else:
-                # If latest date is in the past, start from today
-                start_date = today
-        else:
-            start_date = today
-        
-        # Store in database with calculated start date
-        meal_plan = MealPlanModel.create(user_id, meal_plan_data, days, start_date)
+    @staticmethod
+    def _generate_days(
+        user_profile: Dict,
+        gemini_profile: Dict,
+        days: int,
+        user_tier: str = "free",
+        user_id: str = None,
+    ):
+        """
+        Compose days from the recipe library when it covers the profile,
+        falling back to the Gemini API otherwise
+        """
+        meal_plan_data = None
+        if LOCAL_PLANNER_ENABLED:
+            meal_plan_data = LocalPlanner.plan(user_profile, days)
+        if not meal_plan_data:
+            meal_plan_data = GeminiService.generate_meal_plan(
+                gemini_profile, days, user_tier=user_tier, user_id=user_id
+            )
+
+        return MealPlanService._screen(
+            user_profile, gemini_profile, meal_plan_data, user_tier=user_tier, user_id=user_id
+        )
+
+    @staticmethod
+    def _screen(
+        user_profile: Dict,
+        gemini_profile: Dict,
+        meal_plan_data: Dict,
+        slots=None,
+        user_tier: str = "free",
+        user_id: str = None,
+    ):
+        """
+        Check generated meals against the profile's allergies and dislikes,
+        regenerating only the offending meals
+
+        When slots is given, only those (day key, meal type) pairs are checked.
+        """
+        for attempt in range(SCREENING_MAX_ATTEMPTS + 1):
+            offending = ScreeningService.screen_days(user_profile, meal_plan_data)
+            if slots is not None:
+                offending = {slot: v for slot, v in offending.items() if slot in slots}
+            if not offending:
+                return meal_plan_data
+            if attempt == SCREENING_MAX_ATTEMPTS:
+                break
+
+            avoid = {
+                violation["matched"]
+                for violations in offending.values()
+                for violation in violations
+            }
+            replacements = GeminiService.generate_meals(
+                gemini_profile,
+                list(offending),
+                meal_plan_data,
+                avoid,
+                user_tier=user_tier,
+                user_id=user_id,
+            )
+            for day_key, meal_type in offending:
+                meal = replacements.get(day_key, {}).get(meal_type)
+                if meal:
+                    meal_plan_data[day_key][meal_type] = meal
+
+        raise Exception(
+            "Generated meals conflict with allergies or disliked ingredients: "
+            + ", ".join(f"{day} {meal}" for day, meal in offending)
+        )
+
+    @staticmethod
+    def _progress(user_id: str, job: str, stage: str, **details):
+        """
+        Report a stage of a generation job ("started", "progress",
+        "completed" or "failed") to the user's event streams
+        """
+        events.emit("generation_progress", user_id=user_id, job=job, stage=stage, **details)
 
+    @staticmethod
+    def generate_meal_plan(
+        user_id: str, user_profile: Dict, days: int, user_tier: str = "free"
+    ):
+        """
+        Generate a meal plan for a user and store it in the database
+
+        Concurrent identical requests of a user share one generation, also
+        across workers.
+        """
+        return singleflight.do(
+            ("generate", user_id, days),
+            lambda: MealPlanService._generate_and_store(
+                user_id, user_profile, days, user_tier
+            ),
+        )
+
+    @staticmethod
+    def _generate_and_store(user_id: str, user_profile: Dict, days: int, user_tier: str):
+        # Reserve the dates before paying for generation; this also caps
+        # days at the remaining capacity. An identical request in flight in
+        # another worker is waited for instead.
+        while True:
+            reservation = PlanningModel.reserve(user_id, days, key=f"generate:{days}")
+            if not reservation.get("joined"):
+                break
+            meal_plans = MealPlanService._wait_shared(user_id, reservation)
+            if meal_plans:
+                return meal_plans[0]
+
+        claim_id = meal_plan = None
+        try:
+            days = len(reservation["dates"])
+            MealPlanService._progress(user_id, "generate", "started", days=days, days_ready=0)
+
+            # Serve what we can from days built ahead of time
+            claim_id, meal_plan_data = MealPlanService._take_prebuilt(
+                user_id, user_profile, days, "generate"
+            )
+
+            remaining = days - len(meal_plan_data)
+            if remaining:
+                if meal_plan_data:
+                    MealPlanService._progress(
+                        user_id, "generate", "progress", days=days, days_ready=len(meal_plan_data)
+                    )
+                # Format profile for Gemini API
+                gemini_profile = MealPlanService._gemini_profile(user_profile, remaining)
+
+                # Generate meal plan from the recipe library or the Gemini API
+                generated = MealPlanService._generate_days(
+                    user_profile, gemini_profile, remaining, user_tier, user_id
+                )
+                for meals in generated.values():
+                    meal_plan_data[f"Day{len(meal_plan_data) + 1}"] = meals
+
+            # Store in database starting at the first reserved date
+            start_date = date.fromisoformat(reservation["dates"][0])
+            restrictions = user_profile["dietary_restrictions"]
+            meal_plan = MealPlanModel.create(
+                user_id, meal_plan_data, days, start_date, restrictions
+            )
+            PrebuiltDayModel.finish(claim_id)
+            recipe_index.add_days(meal_plan_data, restrictions)
+        except Exception as e:
+            PrebuiltDayModel.put_back(claim_id)
+            MealPlanService._progress(user_id, "generate", "failed", days=days, error=str(e))
+            raise
+        finally:
+            PlanningModel.release(
+                user_id, reservation["id"], [meal_plan["_id"]] if meal_plan else None
+            )
+
+        MealPlanService._progress(user_id, "generate", "completed", days=days, days_ready=days)
+        logger.info(
+            "Stored %d-day meal plan from %s",
+            days,
+            start_date.isoformat(),
+            extra={"days": days, "generated_days": remaining},
+        )
         return meal_plan
 
+    @staticmethod
+    def _wait_shared(user_id: str, reservation):
+        """
+        Wait for another worker's generation joined through its reservation
+
+        Returns the meal plans it stored (possibly none), or None if it
+        failed, in which case the caller generates itself.
+        """
+        metrics.increment("generations_shared_total")
+        meal_plan_ids = PlanningModel.wait(user_id, reservation)
+        if meal_plan_ids is None:
+            return None
+        meal_plans = [MealPlanModel.get_by_id(user_id, plan_id) for plan_id in meal_plan_ids]
+        return [meal_plan for meal_plan in meal_plans if meal_plan is not None]
+
+    @staticmethod
+    def build_days(
+        user_profile: Dict, days: int, user_tier: str = "free", user_id: str = None
+    ):
+        """
+        Generate and screen days for a profile without storing them
+        """
+        gemini_profile = MealPlanService._gemini_profile(user_profile, days)
+        return MealPlanService._generate_days(
+            user_profile, gemini_profile, days, user_tier, user_id
+        )
+
+    @staticmethod
+    def _take_prebuilt(user_id: str, user_profile: Dict, days: int, endpoint: str):
+        """
+        Claim up to days pre-built days matching the current profile and
+        record how much of the request they cover
+
+        Returns (claim id, Day1..DayN mapping); the claim must be finished
+        once the days are stored, or put back.
+        """
+        claim_id, prebuilt = PrebuiltDayModel.take(
+            user_id, PrebuiltDayModel.profile_key(user_profile), days
+        )
+
+        if len(prebuilt) == days:
+            source = "prebuilt"
+        elif prebuilt:
+            source = "partial"
+        else:
+            source = "model"
+        metrics.increment("generate_requests_total", endpoint=endpoint, source=source)
+        if prebuilt:
+            metrics.increment("prebuilt_days_served_total", len(prebuilt))
+
+        return claim_id, {f"Day{i + 1}": meals for i, meals in enumerate(prebuilt)}
+
+    @staticmethod
+    def regenerate_meals(
+        user_id: str, user_profile: Dict, day_date: date, meal_types, user_tier: str = "free"
+    ):
+        """
+        Regenerate selected meals of one planned day, keeping the rest
+
+        Only the requested slots are sent to the model, together with the
+        names and calories of the kept meals for calorie balance, and only
+        those slots are written back. Returns the updated day's meals, or
+        None if the date is not planned.
+        """
+        date_str = day_date.isoformat()
+        meal_plan, day_key = MealPlanModel.find_day(user_id, date_str)
+        if meal_plan is None:
+            return None
+
+        day = meal_plan["days"][day_key]
+        slots = [(day_key, meal_type) for meal_type in meal_types]
+        gemini_profile = MealPlanService._gemini_profile(user_profile, 1)
+
+        # A replacement that repeats the meal it replaces is asked for again
+        updated_day = dict(day)
+        pending = slots
+        for _ in range(SCREENING_MAX_ATTEMPTS + 1):
+            replacements = GeminiService.generate_meals(
+                gemini_profile, pending, {day_key: updated_day}, user_tier=user_tier, user_id=user_id
+            )
+            repeated = []
+            for slot in pending:
+                meal_type = slot[1]
+                meal = replacements.get(day_key, {}).get(meal_type)
+                if not meal:
+                    raise Exception(f"Gemini API did not return a {meal_type} replacement")
+                if _same_name(meal, day.get(meal_type)):
+                    repeated.append(slot)
+                updated_day[meal_type] = meal
+            if not repeated:
+                break
+            pending = repeated
+        else:
+            raise Exception(
+                "Gemini API repeated the replaced meals: "
+                + ", ".join(meal_type for _, meal_type in pending)
+            )
+
+        updated_day = MealPlanService._screen(
+            user_profile, gemini_profile, {day_key: updated_day}, slots, user_tier, user_id
+        )[day_key]
+
+        new_meals = {meal_type: updated_day[meal_type] for meal_type in meal_types}
+        stored = MealPlanModel.replace_meals(
+            user_id,
+            meal_plan["_id"],
+            day_key,
+            date_str,
+            new_meals,
+            user_profile["dietary_restrictions"],
+        )
+        if not stored:
+            return None
+        recipe_index.add_days({day_key: new_meals}, user_profile["dietary_restrictions"])
+
+        return {"date": date_str, "meals": updated_day}
+
     @staticmethod
     def get_user_meal_plans(user_id: str):
         """
@@ -71,95 +331,216 @@ class MealPlanService:
         """
         return MealPlanModel.get_by_user(user_id)
 
+    @staticmethod
+    def get_changes(user_id: str, since: Optional[int] = None):
+        """
+        Get the planned days created, modified and removed after a change
+        version, for clients keeping a local copy of their meal plans
+
+        Without a usable version (none given, or older than the kept
+        changes) every planned day is returned as created with reset set,
+        and the client replaces its copy. Days are returned as they are
+        now, so a change made while reading may be reported again by the
+        next sync; applying a change twice is harmless.
+        """
+        changes = None
+        if since:
+            version, changes = MealPlanChangesModel.get_since(user_id, since)
+
+        if changes is None:
+            # Read the version first: anything changed later is resent. The
+            # days are read from the primary, so none older than the version
+            # can be sent
+            version = MealPlanChangesModel.get_version(user_id)
+            meal_plans = MealPlanModel.get_by_user(user_id, operation="meal_plans.get_changes")
+            created = [
+                {
+                    "date": date_str,
+                    "plan_id": str(meal_plan["_id"]),
+                    "day_key": day_key,
+                    "meals": meal_plan["days"][day_key],
+                }
+                for meal_plan in meal_plans
+                for day_key, date_str in meal_plan.get("dates", {}).items()
+                if day_key in meal_plan.get("days", {})
+            ]
+            return {
+                "version": version,
+                "reset": True,
+                "created": sorted(created, key=lambda day: day["date"]),
+                "modified": [],
+                "removed": [],
+            }
+
+        # Collapse each date's changes into the net change
+        latest = {}
+        created_dates = set()
+        for change in changes:
+            latest[change["d"]] = change
+            if change["op"] == CREATED:
+                created_dates.add(change["d"])
+
+        days = MealPlanModel.get_days(
+            user_id,
+            [(change["p"], change["k"]) for change in latest.values() if change["op"] != REMOVED],
+        )
+        result = {"version": version, "reset": False, "created": [], "modified": [], "removed": []}
+        for date_str, change in sorted(latest.items()):
+            day = days.get((change["p"], change["k"]))
+            if change["op"] == REMOVED or day is None or day["date"] != date_str:
+                result["removed"].append(date_str)
+                continue
+            kind = "created" if date_str in created_dates else "modified"
+            result[kind].append(
+                {
+                    "date": date_str,
+                    "plan_id": str(change["p"]),
+                    "day_key": change["k"],
+                    "meals": day["meals"],
+                }
+            )
+        return result
+
     @staticmethod
     def mark_day_complete(user_id: str, day_date: date):
         """
         Mark a specific day as complete
         """
-        return MealPlanModel.mark_day_complete(user_id, day_date.isoformat())
+        completed = MealPlanModel.mark_day_complete(user_id, day_date.isoformat())
+        if completed:
+            events.emit("day_completed", user_id=user_id, date=day_date.isoformat())
+        return completed
 
     @staticmethod
-    def generate_ahead(user_id: str, user_profile: Dict):
+    def generate_ahead(user_id: str, user_profile: Dict, user_tier: str = "free"):
         """
         Generate meal plans for the remaining available days (up to 7 total)
         Handles batching of requests to avoid API limitations (max 4 days per request)
+
+        Concurrent requests of a user share one generation, also across
+        workers.
         """
-        # Check current planned days
-        current_planned_days = MealPlanModel.count_planned_days(user_id)
+        return singleflight.do(
+            ("generate-ahead", user_id),
+            lambda: MealPlanService._generate_ahead(user_id, user_profile, user_tier),
+        )
+
+    @staticmethod
+    def _generate_ahead(user_id: str, user_profile: Dict, user_tier: str):
+        # Reserve every remaining date up front, or wait for the same
+        # request in flight in another worker
+        while True:
+            reservation = PlanningModel.reserve(user_id, MAX_PLANNED_DAYS, key="generate-ahead")
+            if not reservation.get("joined"):
+                break
+            meal_plans = MealPlanService._wait_shared(user_id, reservation)
+            if meal_plans is not None:
+                return meal_plans[-1] if meal_plans else None
 
-        # If already at max capacity, return error
-        if current_planned_days >= 7:
-            raise ValueError(
-                "Maximum meal plan capacity reached (7 days). Mark some days as complete before generating more."
+        meal_plans = []
+        stored = None
+        current_start_date = date.fromisoformat(reservation["dates"][0])
+        days_left = total_days = len(reservation["dates"])
+
+        try:
+            MealPlanService._progress(
+                user_id, "generate-ahead", "started", days=total_days, days_ready=0
             )
 
-        # Calculate how many more days we can generate
-        days_to_generate = 7 - current_planned_days
+            # Store days built ahead of time as one plan first
+            claim_id, prebuilt = MealPlanService._take_prebuilt(
+                user_id, user_profile, days_left, "generate-ahead"
+            )
+            if prebuilt:
+                try:
+                    meal_plan = MealPlanModel.create(
+                        user_id,
+                        prebuilt,
+                        len(prebuilt),
+                        current_start_date,
+                        user_profile["dietary_restrictions"],
+                    )
+                except Exception:
+                    PrebuiltDayModel.put_back(claim_id)
+                    raise
+                PrebuiltDayModel.finish(claim_id)
+                meal_plans.append(meal_plan)
+                days_left -= len(prebuilt)
+                current_start_date = current_start_date + timedelta(days=len(prebuilt))
+                if days_left:
+                    MealPlanService._progress(
+                        user_id,
+                        "generate-ahead",
+                        "progress",
+                        days=total_days,
+                        days_ready=total_days - days_left,
+                    )
 
-        # If no days to generate, return
-        if days_to_generate <= 0:
-            return None
+            while days_left > 0:
+                # Generate at most 2 days at a time
+                batch_size = min(2, days_left)
 
-        # Get the latest date currently in the plan
-        latest_date = MealPlanModel.get_latest_date(user_id)
-        today = date.today()
-        
-        # Calculate start date
-        if latest_date:
-            # If latest date is in the future, start from the day after
-            if latest_date >= today:
-                start_date = latest_date + timedelta(days=1)
-            else:
-                # If latest date is in the past, start from today
-                start_date = today
-        else:
-            start_date = today
+                # Format profile for Gemini API - requesting batch_size days
+                gemini_profile = MealPlanService._gemini_profile(user_profile, batch_size)
 
-        meal_plans = []
-        current_start_date = start_date
-        days_left = days_to_generate
-        
-        while days_left > 0:
-            # Generate at most 4 days at a time
-            batch_size = min(2, days_left)
-                        
-            # Format profile for Gemini API - requesting batch_size days
-            gemini_profile = {
-                "profile": {
-                    "days": batch_size,
-                    "restrictions": user_profile["dietary_restrictions"],
-                    "allergies": user_profile["allergies"],
-                },
-                "preferences": {
-                    "dislikes": user_profile["disliked_ingredients"],
-                    "preferred_cuisines": user_profile["preferred_cuisines"],
-                },
-                "goals": {
-                    "target_daily_calories": user_profile["target_daily_calories"],
-                    "target_macros_pct": user_profile["target_macros_pct"],
-                },
-            }
+                try:
+                    # Generate meal plan for current batch
+                    meal_plan_data = MealPlanService._generate_days(
+                        user_profile, gemini_profile, batch_size, user_tier, user_id
+                    )
 
-            try:
-                # Generate meal plan for current batch
-                meal_plan_data = GeminiService.generate_meal_plan(gemini_profile, batch_size)
-                
-                # Store in database
-                meal_plan = MealPlanModel.create(
-                    user_id, meal_plan_data, batch_size, current_start_date
-                )
-                
-                meal_plans.append(meal_plan)
-                
-                # Update for next iteration
-                days_left -= batch_size
-                current_start_date = current_start_date + timedelta(days=batch_size)
-                
-            except Exception as e:
-                # Log error and stop
-                print(f"Error generating meal plan batch of {batch_size} days: {e}")
-                # If we can't generate this batch, stop here
-                break
+                    # Store in database
+                    restrictions = user_profile["dietary_restrictions"]
+                    meal_plan = MealPlanModel.create(
+                        user_id, meal_plan_data, batch_size, current_start_date, restrictions
+                    )
+                    recipe_index.add_days(meal_plan_data, restrictions)
+
+                    meal_plans.append(meal_plan)
+
+                    # Update for next iteration
+                    days_left -= batch_size
+                    current_start_date = current_start_date + timedelta(days=batch_size)
+                    if days_left:
+                        MealPlanService._progress(
+                            user_id,
+                            "generate-ahead",
+                            "progress",
+                            days=total_days,
+                            days_ready=total_days - days_left,
+                        )
+
+                except BudgetExceededError:
+                    # Nothing generated yet: report the budget instead of "no days"
+                    if not meal_plans:
+                        raise
+                    break
+                except Exception:
+                    # Log error and stop
+                    logger.exception(
+                        "Error generating meal plan batch of %d days",
+                        batch_size,
+                        extra={"start_date": current_start_date.isoformat()},
+                    )
+                    # If we can't generate this batch, stop here
+                    break
+            stored = [meal_plan["_id"] for meal_plan in meal_plans]
+        except Exception as e:
+            MealPlanService._progress(
+                user_id, "generate-ahead", "failed", days=total_days, error=str(e)
+            )
+            raise
+        finally:
+            PlanningModel.release(user_id, reservation["id"], stored)
+
+        # Days that failed to generate are left out
+        MealPlanService._progress(
+            user_id,
+            "generate-ahead",
+            "completed",
+            days=total_days,
+            days_ready=total_days - days_left,
+        )
 
         # Return the last meal plan created (for API response)
-        return meal_plans[-1] if meal_plans else None
\ No newline at end of file
+        return meal_plans[-1] if meal_plans else None
@@ -0,0 +1,127 @@
+import threading
+import time
+from typing import Dict, List
+from app import metrics
+from app.config import (
+    GEMINI_LARGE_REQUEST_SLOTS,
+    GEMINI_LATENCY_BUDGET_MS,
+    GEMINI_MODEL_PRICES,
+    GEMINI_MODEL_TIERS,
+    GEMINI_PREMIUM_USER_TIERS,
+)
+
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.3
+# A model that was too slow gets traffic again once its latest sample is
+# this old, so it can recover; the next sample starts a fresh average
+LATENCY_SAMPLE_TTL_SECONDS = 120
+
+# Consecutive failures after which a model is benched, and for how long
+FAILURE_THRESHOLD = 3
+COOLDOWN_SECONDS = 60
+
+
+def estimate_cost(model: str, prompt_tokens: int, output_tokens: int) -> float:
+    """
+    Cost of a call in USD from GEMINI_MODEL_PRICES (0 for unpriced models)
+    """
+    prompt_price, output_price = GEMINI_MODEL_PRICES.get(model, (0, 0))
+    return (prompt_tokens * prompt_price + output_tokens * output_price) / 1_000_000
+
+
+class ModelRouter:
+    """
+    Chooses which Gemini model serves a request and in which order to fall
+    back to the other tiers
+
+    The starting tier grows with the request size and the user's tier.
+    Models that are slower than the latency budget or failing repeatedly
+    are moved behind the healthy ones until their latency sample expires or
+    their cooldown ends.
+    """
+
+    def __init__(self, tiers: List[str] = GEMINI_MODEL_TIERS):
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._latency_ms: Dict[str, float] = {}
+        self._sampled_at: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._benched_until: Dict[str, float] = {}
+
+    def route(self, slots: int, user_tier: str = "free") -> List[str]:
+        """
+        Get the models to try for a request, in order
+
+        Parameters:
+        - slots: Number of meals the request generates
+        - user_tier: The user's subscription tier
+        """
+        start = 0
+        if slots > GEMINI_LARGE_REQUEST_SLOTS:
+            start += 1
+        if user_tier in GEMINI_PREMIUM_USER_TIERS:
+            start += 1
+        start = min(start, len(self.tiers) - 1)
+
+        # Preferred tier first, then cheaper tiers, then more capable ones
+        order = [self.tiers[start]] + self.tiers[:start][::-1] + self.tiers[start + 1:]
+
+        now = time.monotonic()
+        with self._lock:
+            def degraded(model):
+                return self._benched_until.get(model, 0) > now or (
+                    self._latency_ms.get(model, 0) > GEMINI_LATENCY_BUDGET_MS
+                    and now - self._sampled_at.get(model, 0) < LATENCY_SAMPLE_TTL_SECONDS
+                )
+
+            # Stable sort keeps the tier order within healthy/degraded groups
+            return sorted(order, key=degraded)
+
+    def cheapest(self) -> str:
+        """
+        Get the cheapest configured model
+        """
+        return self.tiers[0]
+
+    def record_success(self, model: str, latency_ms: float, prompt_tokens: int = 0, output_tokens: int = 0):
+        """
+        Record a successful call and its cost
+        """
+        now = time.monotonic()
+        with self._lock:
+            previous = self._latency_ms.get(model)
+            if now - self._sampled_at.get(model, now) >= LATENCY_SAMPLE_TTL_SECONDS:
+                previous = None
+            self._sampled_at[model] = now
+            self._latency_ms[model] = (
+                latency_ms
+                if previous is None
+                else LATENCY_SMOOTHING * latency_ms + (1 - LATENCY_SMOOTHING) * previous
+            )
+            self._failures[model] = 0
+            self._benched_until.pop(model, None)
+            smoothed = self._latency_ms[model]
+
+        cost = estimate_cost(model, prompt_tokens, output_tokens)
+
+        metrics.increment("gemini_requests_total", model=model, outcome="success")
+        metrics.observe("gemini_latency_ms", latency_ms, model=model)
+        metrics.set_gauge("gemini_latency_ewma_ms", smoothed, model=model)
+        metrics.increment("gemini_prompt_tokens_total", prompt_tokens, model=model)
+        metrics.increment("gemini_output_tokens_total", output_tokens, model=model)
+        metrics.increment("gemini_cost_usd_total", cost, model=model)
+
+    def record_failure(self, model: str):
+        """
+        Record a failed call, benching the model after repeated failures
+        """
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+            if self._failures[model] >= FAILURE_THRESHOLD:
+                self._benched_until[model] = time.monotonic() + COOLDOWN_SECONDS
+
+        metrics.increment("gemini_requests_total", model=model, outcome="error")
+
+
+# Shared per-process router
+model_router = ModelRouter()
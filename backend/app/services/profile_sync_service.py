@@ -0,0 +1,248 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List
+from app import events, logging_config
+from app.config import (
+    PROFILE_SYNC_CALORIE_TOLERANCE,
+    PROFILE_SYNC_MACRO_TOLERANCE,
+    PROFILE_SYNC_WORKERS,
+)
+from app.models.meal_plan import MealPlanModel
+from app.models.profile_sync_job import ProfileSyncJobModel
+from app.models.recipe import RecipeModel
+from app.models.user import UserModel
+from app.services.meal_plan_service import MealPlanService
+from app.services.screening_service import ScreeningService
+
+# Background workers that regenerate affected meals
+executor = ThreadPoolExecutor(
+    max_workers=PROFILE_SYNC_WORKERS, thread_name_prefix="profile-sync"
+)
+
+
+# Energy per gram of each macro in target_macros_pct
+MACRO_KCAL_PER_GRAM = {"protein": 4, "carbs": 4, "fat": 9}
+
+
+def _terms(profile: Dict, field: str):
+    return {term.strip().lower() for term in profile.get(field) or [] if term.strip()}
+
+
+def _macro_shares(meals: Dict):
+    """
+    Get the percentage of a day's energy from each macro, or None when a
+    meal lacks nutrition data
+    """
+    grams = dict.fromkeys(MACRO_KCAL_PER_GRAM, 0.0)
+    for meal in meals.values():
+        nutrition = meal.get("recipe", {}).get("nutrition") or {}
+        for macro in MACRO_KCAL_PER_GRAM:
+            value = nutrition.get(f"{macro}_g")
+            if not isinstance(value, (int, float)):
+                return None
+            grams[macro] += value
+    energy = sum(grams[macro] * kcal for macro, kcal in MACRO_KCAL_PER_GRAM.items())
+    if not energy:
+        return None
+    return {macro: grams[macro] * kcal * 100 / energy for macro, kcal in MACRO_KCAL_PER_GRAM.items()}
+
+
+def _merge_slots(slots: List[Dict]) -> List[Dict]:
+    """
+    Merge slots of the same date and meal type, keeping every reason
+    """
+    merged: Dict[tuple, List[str]] = {}
+    for slot in slots:
+        reasons = merged.setdefault((slot["date"], slot["meal_type"]), [])
+        reasons += [reason for reason in slot["reasons"] if reason not in reasons]
+    return [
+        {"date": date_str, "meal_type": meal_type, "reasons": reasons}
+        for (date_str, meal_type), reasons in sorted(merged.items())
+    ]
+
+
+class ProfileSyncService:
+    @staticmethod
+    def on_profile_updated(user_id: str, old_profile: Dict, new_profile: Dict):
+        """
+        Find the planned meals a profile change invalidated and queue a job to
+        regenerate only those
+
+        The new job also takes over the slots of earlier jobs that have not
+        started yet, so quick successive changes are all applied.
+        """
+        slots = ProfileSyncService.find_affected_slots(user_id, old_profile, new_profile)
+        if not slots:
+            return None
+
+        carried = ProfileSyncJobModel.supersede_pending(user_id)
+        job = ProfileSyncJobModel.create(user_id, _merge_slots(carried + slots))
+        logging_config.submit(executor, ProfileSyncService.run_job, job["_id"], user_id)
+        return job
+
+    @staticmethod
+    def find_affected_slots(user_id: str, old_profile: Dict, new_profile: Dict) -> List[Dict]:
+        """
+        Diff two profiles and list the stored meals that no longer fit
+
+        - New allergies or dislikes: meals the screening engine now flags
+        - New dietary restrictions: meals whose recipe was not generated
+          under them
+        - Changed calorie goal: every meal of days whose calorie total is
+          outside PROFILE_SYNC_CALORIE_TOLERANCE of the new target
+        - Changed macro goals: every meal of days whose protein, carbs or fat
+          share of energy is more than PROFILE_SYNC_MACRO_TOLERANCE
+          percentage points from the new target
+        """
+        new_exclusions = (
+            _terms(new_profile, "allergies") - _terms(old_profile, "allergies")
+        ) | (
+            _terms(new_profile, "disliked_ingredients")
+            - _terms(old_profile, "disliked_ingredients")
+        )
+        new_restrictions = _terms(new_profile, "dietary_restrictions") - _terms(
+            old_profile, "dietary_restrictions"
+        )
+        goals_changed = old_profile.get("target_daily_calories") != new_profile.get(
+            "target_daily_calories"
+        )
+        target_macros = new_profile.get("target_macros_pct") or {}
+        macros_changed = (old_profile.get("target_macros_pct") or {}) != target_macros
+        if not (new_exclusions or new_restrictions or goals_changed or macros_changed):
+            return []
+
+        meal_plans = MealPlanModel.get_by_user(user_id, resolve=False)
+
+        # Remember references before resolving them into full meals
+        recipe_ids = {}
+        for meal_plan in meal_plans:
+            for day_key, meals in meal_plan.get("days", {}).items():
+                for meal_type, meal in meals.items():
+                    recipe_ids[(meal_plan["_id"], day_key, meal_type)] = meal.get("recipe_id")
+        recipe_restrictions = (
+            RecipeModel.get_restrictions(r for r in recipe_ids.values() if r)
+            if new_restrictions
+            else {}
+        )
+        RecipeModel.resolve_plans(meal_plans)
+
+        affected: Dict[tuple, List[str]] = {}
+
+        def flag(date_str, meal_type, reason):
+            reasons = affected.setdefault((date_str, meal_type), [])
+            if reason not in reasons:
+                reasons.append(reason)
+
+        target = new_profile.get("target_daily_calories") or 0
+        for meal_plan in meal_plans:
+            days = meal_plan.get("days", {})
+            for day_key, date_str in meal_plan.get("dates", {}).items():
+                meals = days.get(day_key)
+                if not meals:
+                    continue
+
+                if new_exclusions:
+                    offending = ScreeningService.screen_days(new_profile, {day_key: meals})
+                    for (_, meal_type), violations in offending.items():
+                        for violation in violations:
+                            flag(date_str, meal_type, f"{violation['kind']}: {violation['term']}")
+
+                for restriction in new_restrictions:
+                    for meal_type in meals:
+                        recipe_id = recipe_ids.get((meal_plan["_id"], day_key, meal_type))
+                        if restriction not in recipe_restrictions.get(recipe_id, []):
+                            flag(date_str, meal_type, f"restriction: {restriction}")
+
+                if goals_changed and target:
+                    calories = [
+                        (meal.get("recipe", {}).get("nutrition") or {}).get("calories")
+                        for meal in meals.values()
+                    ]
+                    # Days without nutrition data cannot be judged
+                    if all(isinstance(c, (int, float)) for c in calories):
+                        if abs(sum(calories) - target) / target > PROFILE_SYNC_CALORIE_TOLERANCE:
+                            for meal_type in meals:
+                                flag(date_str, meal_type, "calories")
+
+                if macros_changed and target_macros:
+                    shares = _macro_shares(meals)
+                    if shares and any(
+                        abs(shares[macro] - goal) > PROFILE_SYNC_MACRO_TOLERANCE
+                        for macro, goal in target_macros.items()
+                        if macro in shares
+                    ):
+                        for meal_type in meals:
+                            flag(date_str, meal_type, "macros")
+
+        return [
+            {"date": date_str, "meal_type": meal_type, "reasons": reasons}
+            for (date_str, meal_type), reasons in sorted(affected.items())
+        ]
+
+    @staticmethod
+    def run_job(job_id, user_id: str):
+        """
+        Regenerate the meals recorded in a job, one day at a time, for the
+        user's current profile and tier
+
+        A job superseded before it started is skipped, since a newer job
+        took over its slots.
+        """
+        job = ProfileSyncJobModel.start(job_id)
+        if job is None:
+            return
+
+        user = UserModel.get_by_id(user_id)
+        if user is None:
+            ProfileSyncJobModel.update(job_id, status="failed", errors=[{"error": "User not found"}])
+            return
+        user_profile = user.get("profile") or {}
+        user_tier = user.get("tier", "free")
+
+        meal_types_by_date: Dict[str, List[str]] = {}
+        for slot in job["slots"]:
+            meal_types_by_date.setdefault(slot["date"], []).append(slot["meal_type"])
+
+        regenerated = []
+        errors = []
+        for date_str, meal_types in meal_types_by_date.items():
+            try:
+                day = MealPlanService.regenerate_meals(
+                    user_id, user_profile, date.fromisoformat(date_str), meal_types, user_tier
+                )
+                # None means the day was completed or removed in the meantime
+                if day is not None:
+                    regenerated += [
+                        {"date": date_str, "meal_type": meal_type} for meal_type in meal_types
+                    ]
+            except Exception as e:
+                errors.append({"date": date_str, "error": str(e)})
+
+        ProfileSyncJobModel.update(
+            job_id,
+            status="failed" if errors and not regenerated else "completed",
+            regenerated=regenerated,
+            errors=errors,
+        )
+
+    @staticmethod
+    def get_status(user_id: str, since: datetime = None):
+        """
+        Get the latest sync job for a user, optionally only if it was
+        created at or after a point in time
+        """
+        job = ProfileSyncJobModel.get_latest(user_id)
+        if job is None or (since and job["created_at"] < since):
+            return None
+
+        return {
+            "id": str(job["_id"]),
+            "status": job["status"],
+            "affected_slots": job["slots"],
+            "regenerated": job["regenerated"],
+            "errors": job["errors"],
+            "created_at": job["created_at"].isoformat(),
+        }
+
+
+events.subscribe("profile_updated", ProfileSyncService.on_profile_updated)
@@ -0,0 +1,297 @@
+import heapq
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from app.config import RECIPE_INDEX_REFRESH_SECONDS
+from app.models.recipe import RecipeModel
+from app.services.ingredients import canonical_name
+
+
+# Re-read recipes stored this far before the newest one seen, since inserts
+# from different workers do not commit in created_at order
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+def _minutes(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class RecipeIndex:
+    """
+    In-memory inverted index over stored recipes
+
+    Every recipe gets a dense integer id; ingredient words, cuisines and meal
+    types map to sets of those ids so filters are plain set operations.
+    Multi-word ingredient terms are then checked as a phrase within one of
+    the recipe's ingredients.
+    Recipes created in this process are added as their plans are stored and
+    recipes created by other workers are picked up by a periodic refresh.
+    """
+
+    def __init__(self, refresh_seconds: int = RECIPE_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._doc_ids: Dict[str, int] = {}
+        self._recipes: List[Dict] = []
+        # Canonical ingredient names per doc id, to match multi-word terms
+        self._ingredient_names: List[List[str]] = []
+        self._ingredients: Dict[str, Set[int]] = {}
+        self._cuisines: Dict[str, Set[int]] = {}
+        self._meal_types: Dict[str, Set[int]] = {}
+        # Minutes -> doc ids, so "at most N minutes" is a union of a few sets
+        self._prep_times: Dict[int, Set[int]] = {}
+        self._cook_times: Dict[int, Set[int]] = {}
+        self._total_times: Dict[int, Set[int]] = {}
+        # (total minutes, doc id) kept sorted to page through results in order
+        self._by_total_time: List[tuple] = []
+        self._loaded = False
+        self._last_created: Optional[datetime] = None
+        self._last_refresh = 0.0
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def add(
+        self,
+        recipe_id: str,
+        name: str,
+        recipe: Dict,
+        meal_types: Iterable[str] = (),
+        restrictions: Iterable[str] = (),
+    ):
+        """
+        Add a recipe to the index, or merge new meal types and dietary
+        restrictions into a known one
+        """
+        with self._lock:
+            self._add(recipe_id, name, recipe, meal_types, restrictions)
+
+    def _add(self, recipe_id, name, recipe, meal_types, restrictions, keep_sorted=True):
+        """
+        Add or merge a recipe; the caller holds the lock
+
+        Bulk loads pass keep_sorted=False and sort the time order once at the
+        end instead of inserting each recipe in place.
+        """
+        doc_id = self._doc_ids.get(recipe_id)
+        if doc_id is None:
+            doc_id = len(self._recipes)
+            self._doc_ids[recipe_id] = doc_id
+            prep = _minutes(recipe.get("prepTimeMins"))
+            cook = _minutes(recipe.get("cookTimeMins"))
+            cuisine = (recipe.get("cuisine") or "").strip()
+            self._recipes.append(
+                {
+                    "id": recipe_id,
+                    "name": name,
+                    "cuisine": cuisine or None,
+                    "prepTimeMins": prep,
+                    "cookTimeMins": cook,
+                    "nutrition": recipe.get("nutrition"),
+                    "meal_types": [],
+                    "restrictions": [],
+                }
+            )
+
+            names = [canonical_name(i.get("item")) for i in recipe.get("ingredients", [])]
+            self._ingredient_names.append([name for name in names if name])
+            for name in names:
+                for word in name.split():
+                    self._ingredients.setdefault(word, set()).add(doc_id)
+            if cuisine:
+                self._cuisines.setdefault(cuisine.lower(), set()).add(doc_id)
+
+            self._prep_times.setdefault(prep, set()).add(doc_id)
+            self._cook_times.setdefault(cook, set()).add(doc_id)
+            self._total_times.setdefault(prep + cook, set()).add(doc_id)
+            entry = (prep + cook, doc_id)
+            if keep_sorted:
+                self._by_total_time.insert(bisect_right(self._by_total_time, entry), entry)
+            else:
+                self._by_total_time.append(entry)
+
+        entry = self._recipes[doc_id]
+        for meal_type in meal_types:
+            if meal_type not in entry["meal_types"]:
+                entry["meal_types"].append(meal_type)
+                self._meal_types.setdefault(meal_type.lower(), set()).add(doc_id)
+        for restriction in restrictions:
+            restriction = restriction.strip().lower()
+            if restriction and restriction not in entry["restrictions"]:
+                entry["restrictions"].append(restriction)
+
+    def add_days(self, days: Dict, restrictions: Iterable[str] = ()):
+        """
+        Add every meal of a freshly generated plan
+        """
+        for meals in days.values():
+            for meal_type, meal in meals.items():
+                if "recipe" not in meal:
+                    continue
+                self.add(
+                    RecipeModel.content_hash(meal),
+                    meal.get("name"),
+                    meal["recipe"],
+                    [meal_type],
+                    restrictions,
+                )
+
+    def refresh(self, force: bool = False):
+        """
+        Load recipes stored since the last refresh (everything on first use)
+        """
+        now = time.monotonic()
+        if not force and self._loaded and now - self._last_refresh < self.refresh_seconds:
+            return
+
+        with self._lock:
+            # Recipes read again in the overlap are already indexed by id and
+            # only merge their meal types and restrictions
+            since = self._last_created - REFRESH_OVERLAP if self._last_created else None
+            for document in RecipeModel.get_created_since(since):
+                self._add(
+                    document["_id"],
+                    document.get("name"),
+                    document.get("recipe", {}),
+                    document.get("meal_types", []),
+                    document.get("restrictions", []),
+                    keep_sorted=False,
+                )
+                created_at = document.get("created_at")
+                if created_at and (self._last_created is None or created_at > self._last_created):
+                    self._last_created = created_at
+            self._by_total_time.sort()
+            self._loaded = True
+            self._last_refresh = now
+
+    def _matching(self, term: str) -> Set[int]:
+        """
+        Doc ids of recipes with an ingredient matching a non-empty term; the
+        result may be an index set, which callers must not modify
+        """
+        words = canonical_name(term).split()
+        if len(words) == 1:
+            return self._ingredients.get(words[0], set())
+
+        # Every word somewhere in the recipe, then the phrase in one ingredient
+        postings = sorted((self._ingredients.get(word, set()) for word in words), key=len)
+        phrase = f" {' '.join(words)} "
+        return {
+            doc_id
+            for doc_id in set.intersection(*postings)
+            if any(phrase in f" {name} " for name in self._ingredient_names[doc_id])
+        }
+
+    def candidates(
+        self,
+        meal_type: str,
+        exclude: Iterable[str] = (),
+        restrictions: Iterable[str] = (),
+    ) -> List[Dict]:
+        """
+        Get every recipe with nutrition data for a meal type that contains none
+        of the excluded ingredients and was generated under (at least) the
+        given dietary restrictions, as copies
+        """
+        self.refresh()
+        required = {r.strip().lower() for r in restrictions if r.strip()}
+
+        with self._lock:
+            doc_ids = set(self._meal_types.get(meal_type.lower(), set()))
+            for term in exclude:
+                if canonical_name(term):
+                    doc_ids -= self._matching(term)
+
+            return [
+                dict(self._recipes[doc_id])
+                for doc_id in doc_ids
+                if self._recipes[doc_id]["nutrition"]
+                and required.issubset(self._recipes[doc_id]["restrictions"])
+            ]
+
+    @staticmethod
+    def _at_most(times: Dict[int, Set[int]], limit: int) -> Set[int]:
+        return set().union(*(doc_ids for minutes, doc_ids in times.items() if minutes <= limit))
+
+    def search(
+        self,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        cuisine: Optional[str] = None,
+        meal_type: Optional[str] = None,
+        max_prep_mins: Optional[int] = None,
+        max_cook_mins: Optional[int] = None,
+        max_total_mins: Optional[int] = None,
+        limit: int = 20,
+    ):
+        """
+        Find recipes containing every included ingredient and none of the
+        excluded ones, optionally filtered by cuisine, meal type and time
+
+        Returns (total matches, recipes sorted by total time).
+        """
+        self.refresh()
+
+        with self._lock:
+            candidate_sets = [self._matching(term) for term in include if canonical_name(term)]
+            if cuisine:
+                candidate_sets.append(self._cuisines.get(cuisine.strip().lower(), set()))
+            if meal_type:
+                candidate_sets.append(self._meal_types.get(meal_type.strip().lower(), set()))
+            if max_prep_mins is not None:
+                candidate_sets.append(self._at_most(self._prep_times, max_prep_mins))
+            if max_cook_mins is not None:
+                candidate_sets.append(self._at_most(self._cook_times, max_cook_mins))
+            if max_total_mins is not None:
+                candidate_sets.append(self._at_most(self._total_times, max_total_mins))
+
+            if candidate_sets:
+                # Intersect smallest first so the working set only shrinks
+                candidate_sets.sort(key=len)
+                candidates = set(candidate_sets[0])
+                for postings in candidate_sets[1:]:
+                    candidates &= postings
+            else:
+                candidates = None
+
+            excluded = set()
+            for term in exclude:
+                if canonical_name(term):
+                    excluded |= self._matching(term)
+            if candidates is not None:
+                candidates -= excluded
+
+            if candidates is None:
+                total = len(self._recipes) - len(excluded)
+            else:
+                total = len(candidates)
+            if candidates is not None and len(candidates) <= 4 * limit + 1000:
+                # Few matches: partial sort of the matches only
+                top = heapq.nsmallest(
+                    limit,
+                    (self._recipes[doc_id] for doc_id in candidates),
+                    key=lambda recipe: recipe["prepTimeMins"] + recipe["cookTimeMins"],
+                )
+            else:
+                # Many matches: walk recipes in time order until the page is full
+                top = []
+                for _, doc_id in self._by_total_time:
+                    if len(top) == limit:
+                        break
+                    if candidates is None:
+                        matches = doc_id not in excluded
+                    else:
+                        matches = doc_id in candidates
+                    if matches:
+                        top.append(self._recipes[doc_id])
+
+            return total, [dict(recipe) for recipe in top]
+
+
+# Shared per-process index
+recipe_index = RecipeIndex()
@@ -0,0 +1,399 @@
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Allergens and the ingredient names they hide behind. Keys are matched after
+# lowercasing and stripping a trailing plural "s".
+ALLERGEN_SYNONYMS = {
+    "peanut": ["peanut", "groundnut", "arachis", "monkey nut", "goober"],
+    "tree nut": [
+        "almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut",
+        "macadamia", "brazil nut", "pine nut", "praline", "marzipan", "nutella",
+    ],
+    "nut": [
+        "peanut", "groundnut", "almond", "cashew", "walnut", "pecan",
+        "pistachio", "hazelnut", "macadamia", "brazil nut", "pine nut",
+        "praline", "marzipan",
+    ],
+    "dairy": [
+        "milk", "butter", "buttermilk", "cheese", "cream", "yogurt", "yoghurt",
+        "whey", "casein", "ghee", "kefir", "paneer", "ricotta", "mozzarella",
+        "parmesan", "feta", "cheddar", "custard", "lactose",
+    ],
+    "milk": [
+        "milk", "butter", "buttermilk", "cheese", "cream", "yogurt", "yoghurt",
+        "whey", "casein", "ghee", "kefir", "paneer", "ricotta", "mozzarella",
+        "parmesan", "feta", "cheddar", "custard", "lactose",
+    ],
+    "lactose": ["milk", "cream", "cheese", "yogurt", "yoghurt", "whey", "custard", "lactose"],
+    "egg": ["egg", "eggs", "mayonnaise", "mayo", "meringue", "aioli", "albumin"],
+    "gluten": [
+        "wheat", "flour", "bread", "breadcrumb", "panko", "pasta", "spaghetti",
+        "noodle", "couscous", "bulgur", "barley", "rye", "semolina", "seitan",
+        "farro", "spelt", "tortilla", "pita", "cracker", "soy sauce",
+    ],
+    "wheat": [
+        "wheat", "flour", "bread", "breadcrumb", "panko", "pasta", "spaghetti",
+        "couscous", "bulgur", "semolina", "seitan", "farro", "spelt", "tortilla", "pita",
+    ],
+    "soy": ["soy", "soya", "tofu", "tempeh", "edamame", "miso", "tamari", "soy sauce"],
+    "fish": [
+        "fish", "salmon", "tuna", "cod", "tilapia", "trout", "halibut", "sardine",
+        "anchovy", "anchovies", "mackerel", "haddock", "bass", "fish sauce",
+    ],
+    "shellfish": [
+        "shellfish", "shrimp", "prawn", "crab", "lobster", "crayfish", "scallop",
+        "clam", "mussel", "oyster", "squid", "calamari",
+    ],
+    "sesame": ["sesame", "tahini", "hummus", "halva", "gomasio"],
+    "mustard": ["mustard"],
+    "celery": ["celery", "celeriac"],
+}
+
+# Phrases that contain an allergen pattern but are safe for that allergen,
+# e.g. "almond milk" for a dairy allergy
+_NON_DAIRY = [
+    "almond milk", "oat milk", "soy milk", "soya milk", "rice milk", "coconut milk",
+    "cashew milk", "peanut butter", "almond butter", "cashew butter", "nut butter",
+    "sunflower seed butter", "cocoa butter", "apple butter", "coconut cream",
+    "cream of tartar", "butter bean", "butter lettuce", "vegan butter",
+    "vegan cheese", "vegan yogurt", "coconut yogurt", "butternut", "buttercup",
+    "butterfly", "butterflied",
+]
+SAFE_PHRASES = {
+    "dairy": _NON_DAIRY,
+    "milk": _NON_DAIRY,
+    "lactose": _NON_DAIRY + ["lactose-free milk", "lactose free milk"],
+    "gluten": [
+        "gluten-free pasta", "gluten-free bread", "gluten-free flour",
+        "gluten-free tortilla", "gluten-free soy sauce", "rice noodle",
+        "zucchini noodle", "glass noodle", "shirataki noodle", "rice flour",
+        "almond flour", "coconut flour", "chickpea flour", "corn tortilla",
+        "rice cracker", "buckwheat",
+    ],
+    "wheat": ["rice flour", "almond flour", "coconut flour", "chickpea flour", "corn tortilla", "buckwheat"],
+    "nut": ["butternut", "coconut", "nutmeg", "water chestnut"],
+}
+
+# Kitchen equipment and other non-food words holding a food word; a hit
+# inside one is ignored whatever the allergy or dislike
+NON_FOOD_PHRASES = [
+    "cheesecloth", "cheese cloth", "cheese grater", "cheese knife", "cheese board",
+    "butter knife", "butter dish", "butter paper", "bread knife", "breadboard",
+    "bread board", "bread maker", "bread machine", "bread tin", "egg timer",
+    "egg slicer", "egg cup", "egg poacher", "milk frother", "milk jug",
+    "fish slice", "fish spatula", "nutcracker", "nut cracker",
+]
+
+
+# Dairy words also matched inside compound words such as "cheesecake" or
+# "buttercream", where the rest of the word is at least COMPOUND_MIN_REST
+# letters and not a plain suffix (derived forms such as "creamy" or
+# "buttered" are patterns of their own, see _derived_forms)
+COMPOUND_PATTERNS = {"milk", "butter", "cheese", "cream", "yogurt", "yoghurt", "custard"}
+COMPOUND_MIN_REST = 3
+_SUFFIXES = {"ier", "iest", "ily", "iness", "ing", "ings", "ery", "ers"}
+
+# Endings of words derived from a food word: "cheesy", "breaded",
+# "creamery", "creamier", "breading"
+DERIVED_SUFFIXES = ("y", "ed", "ery", "ier", "ing")
+_VOWELS = "aeiou"
+
+
+def _normalize(term: str) -> str:
+    return " ".join(str(term).lower().split())
+
+
+def _plural_forms(term: str) -> List[str]:
+    forms = [term]
+    if term.endswith("y") and not term.endswith(("ay", "ey", "oy", "uy")):
+        forms.append(term[:-1] + "ies")
+    elif term.endswith(("s", "x", "ch", "sh", "o")):
+        forms.append(term + "es")
+    else:
+        forms.append(term + "s")
+    return forms
+
+
+def _derived_forms(term: str) -> List[str]:
+    """
+    Get the words derived from a single-word term with DERIVED_SUFFIXES,
+    dropping a final "e" ("cheesy") and doubling the final consonant of a
+    one-syllable word ("nutty")
+    """
+    if not term.isalpha() or len(term) < 3 or term[-1] in "aiouy":
+        return []
+    stem = term
+    if term.endswith("e"):
+        stem = term[:-1]
+    else:
+        syllables = sum(
+            1
+            for i, char in enumerate(term)
+            if char in _VOWELS and (i == 0 or term[i - 1] not in _VOWELS)
+        )
+        ends_short = (
+            term[-1] not in _VOWELS + "wx"
+            and term[-2] in _VOWELS
+            and term[-3] not in _VOWELS
+        )
+        if syllables == 1 and ends_short:
+            stem = term + term[-1]
+    return [stem + suffix for suffix in DERIVED_SUFFIXES]
+
+
+def _singular(term: str) -> str:
+    return term[:-1] if term.endswith("s") and not term.endswith("ss") else term
+
+
+def expand_terms(terms: Iterable[str], synonyms: bool = True) -> Dict[str, str]:
+    """
+    Expand profile terms into every pattern that should trigger them
+
+    Returns a mapping of pattern -> the profile term it came from.
+    """
+    patterns = {}
+    for term in terms:
+        base = _normalize(term)
+        if not base:
+            continue
+        singular = _singular(base)
+        expanded = [base, singular]
+        if synonyms:
+            for key in (base, singular):
+                expanded += ALLERGEN_SYNONYMS.get(key, [])
+        for pattern in expanded:
+            for form in _plural_forms(pattern) + _derived_forms(pattern):
+                patterns.setdefault(form, base)
+    return patterns
+
+
+def safe_phrases(terms: Iterable[str]) -> List[str]:
+    """
+    Get the phrases that neutralize a match for any of the given terms
+    """
+    phrases = []
+    for term in terms:
+        base = _normalize(term)
+        for key in (base, _singular(base)):
+            for phrase in SAFE_PHRASES.get(key, []):
+                phrases += _plural_forms(phrase)
+        # "dairy-free cheese", "gluten free pasta"
+        for pattern in expand_terms([base]):
+            phrases += [f"{base}-free {pattern}", f"{base} free {pattern}"]
+    return phrases
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher that finds every occurrence of any pattern in a
+    single left-to-right pass over the text
+    """
+
+    def __init__(self, patterns: Iterable[str], compounds: Iterable[str] = ()):
+        self.compounds = set(compounds)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(pattern)
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._out[child] += self._out[self._fail[child]]
+
+    @staticmethod
+    def _compound_part(rest: str) -> bool:
+        return len(rest) >= COMPOUND_MIN_REST and rest not in _SUFFIXES
+
+    def _in_compound(self, text: str, start: int, end: int) -> bool:
+        """
+        Whether text[start:end] begins or ends a compound word
+        """
+        word_start, word_end = start, end
+        while word_start and text[word_start - 1].isalpha():
+            word_start -= 1
+        while word_end < len(text) and text[word_end].isalpha():
+            word_end += 1
+        if word_start == start:
+            return self._compound_part(text[end:word_end])
+        if word_end == end:
+            return self._compound_part(text[word_start:start])
+        return False
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Get (start offset, pattern) for every whole-word occurrence in text,
+        and every compound-word occurrence of the compound patterns
+        """
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for pattern in self._out[node]:
+                start = index - len(pattern) + 1
+                end = index + 1
+                # Whole words only, so "egg" does not match "eggplant"
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    end == len(text) or not text[end].isalnum()
+                ):
+                    matches.append((start, pattern))
+                elif pattern in self.compounds and self._in_compound(text, start, end):
+                    matches.append((start, pattern))
+        return matches
+
+
+def excluded_phrases(patterns: Iterable[str]) -> List[str]:
+    """
+    Get the phrases in which no pattern counts as a hit: non-food words and
+    "-free" phrases of the patterns ("egg-free", "nut free")
+    """
+    phrases = []
+    for phrase in NON_FOOD_PHRASES:
+        phrases += _plural_forms(phrase)
+    for pattern in patterns:
+        phrases += [f"{pattern}-free", f"{pattern} free"]
+    return phrases
+
+
+class ProfileMatcher:
+    """
+    Compiled allergy and dislike patterns for one profile
+
+    Safe phrases are kept per allergy, so "peanut butter" clears the
+    "butter" of a dairy allergy but not the "peanut" of a peanut allergy.
+    Excluded phrases clear every hit inside them.
+    """
+
+    def __init__(self, allergies: Tuple[str, ...], dislikes: Tuple[str, ...]):
+        # Pattern -> every (kind, profile term) it triggers, allergies first
+        self.sources: Dict[str, List[Tuple[str, str]]] = {}
+        for term in allergies:
+            for pattern, base in expand_terms([term]).items():
+                self.sources.setdefault(pattern, []).append(("allergy", base))
+        for term in dislikes:
+            for pattern, base in expand_terms([term], synonyms=False).items():
+                self.sources.setdefault(pattern, []).append(("dislike", base))
+        # Safe phrase -> the allergies it is safe for
+        self.safe: Dict[str, Set[str]] = {}
+        for term in allergies:
+            for phrase in safe_phrases([term]):
+                self.safe.setdefault(phrase, set()).add(_normalize(term))
+        self.excluded = set(excluded_phrases(self.sources))
+        self.automaton = AhoCorasick(
+            sorted(set(self.sources) | set(self.safe) | self.excluded),
+            compounds=COMPOUND_PATTERNS & set(self.sources),
+        )
+
+    def scan(self, text: str) -> List[Tuple[str, str, str]]:
+        """
+        Get (kind, profile term, matched text) for every hit in text, except
+        hits inside an excluded phrase and allergy hits inside a phrase that
+        is safe for that allergy
+        """
+        hits = []
+        safe_spans = []
+        excluded_spans = []
+        for start, pattern in self.automaton.find(text.lower()):
+            end = start + len(pattern)
+            if pattern in self.sources:
+                hits.append((start, end, pattern))
+            if pattern in self.safe:
+                safe_spans.append((start, end, self.safe[pattern]))
+            if pattern in self.excluded:
+                excluded_spans.append((start, end))
+
+        found = []
+        for start, end, pattern in hits:
+            if any(s <= start and end <= e for s, e in excluded_spans):
+                continue
+            safe_for = set().union(
+                *(terms for s, e, terms in safe_spans if s <= start and end <= e)
+            )
+            for kind, term in self.sources[pattern]:
+                if kind == "dislike" or term not in safe_for:
+                    found.append((kind, term, pattern))
+                    break
+        return found
+
+
+@lru_cache(maxsize=1024)
+def _compiled(allergies: Tuple[str, ...], dislikes: Tuple[str, ...]) -> ProfileMatcher:
+    return ProfileMatcher(allergies, dislikes)
+
+
+class ScreeningService:
+    @staticmethod
+    def matcher_for(user_profile: Dict) -> ProfileMatcher:
+        """
+        Get the compiled matcher for a profile
+
+        Matchers are cached by the normalized allergy and dislike lists, which
+        act as the version of the screened part of the profile: any update to
+        those fields yields a new key, unrelated profile edits reuse the entry.
+        """
+        allergies = tuple(sorted({a.strip().lower() for a in user_profile.get("allergies", []) if a.strip()}))
+        dislikes = tuple(sorted({d.strip().lower() for d in user_profile.get("disliked_ingredients", []) if d.strip()}))
+        return _compiled(allergies, dislikes)
+
+    @staticmethod
+    def screen_meal(matcher: ProfileMatcher, meal: Dict) -> List[Dict]:
+        """
+        Scan a meal's name, ingredients and instructions
+        """
+        recipe = meal.get("recipe", {})
+        texts = [("name", meal.get("name") or "")]
+        for ingredient in recipe.get("ingredients", []):
+            texts.append(("ingredient", f"{ingredient.get('item') or ''} {ingredient.get('notes') or ''}"))
+        for instruction in recipe.get("instructions", []):
+            texts.append(("instruction", instruction or ""))
+
+        violations = []
+        for field, text in texts:
+            for kind, term, matched in matcher.scan(text):
+                violations.append(
+                    {"kind": kind, "term": term, "matched": matched, "field": field}
+                )
+        return violations
+
+    @staticmethod
+    def screen_days(user_profile: Dict, days: Dict) -> Dict[Tuple[str, str], List[Dict]]:
+        """
+        Screen every meal of a plan against the profile's allergies and dislikes
+
+        Returns {(day key, meal type): violations} for offending meals only.
+        """
+        matcher = ScreeningService.matcher_for(user_profile)
+        if not matcher.sources:
+            return {}
+
+        offending = {}
+        for day_key, meals in days.items():
+            for meal_type, meal in meals.items():
+                violations = ScreeningService.screen_meal(matcher, meal)
+                if violations:
+                    offending[(day_key, meal_type)] = violations
+        return offending
@@ -0,0 +1,97 @@
+from datetime import date
+from typing import Dict, Optional
+from cachetools import LRUCache
+from app.models.meal_plan import MealPlanModel
+from app.services.ingredients import (
+    canonical_name,
+    canonical_unit,
+    parse_quantity,
+    unit_dimension,
+)
+
+# Shopping lists keyed by user, date range and the version of every plan they were built from
+shopping_list_cache = LRUCache(maxsize=1024)
+
+
+class ShoppingListService:
+    @staticmethod
+    def get_shopping_list(
+        user_id: str, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ):
+        """
+        Get the aggregated shopping list for a user's planned days
+
+        Results are cached until one of the user's meal plans changes version.
+        """
+        start = start_date.isoformat() if start_date else None
+        end = end_date.isoformat() if end_date else None
+
+        versions = MealPlanModel.get_versions(user_id)
+        cache_key = (user_id, start, end, versions)
+        shopping_list = shopping_list_cache.get(cache_key)
+        if shopping_list is None:
+            items = ShoppingListService.aggregate(
+                MealPlanModel.get_ingredients(user_id, start, end)
+            )
+            shopping_list = {"from": start, "to": end, "items": items}
+            # The versions come from the primary, the ingredients possibly from
+            # a secondary that is at least as recent: cache the list only if no
+            # plan changed meanwhile, so it matches the versions in its key
+            if MealPlanModel.get_versions(user_id, cached=False) == versions:
+                shopping_list_cache[cache_key] = shopping_list
+
+        return shopping_list
+
+    @staticmethod
+    def aggregate(ingredients):
+        """
+        Sum ingredients in a single pass, merging spelling variants and
+        convertible units (e.g. tbsp and cup) of the same item
+        """
+        totals: Dict[str, Dict] = {}
+
+        for ingredient in ingredients:
+            name = canonical_name(ingredient.get("item"))
+            if not name:
+                continue
+
+            entry = totals.setdefault(
+                name, {"item": name, "amounts": {}, "notes": []}
+            )
+            unit = canonical_unit(ingredient.get("unit"))
+            quantity = parse_quantity(ingredient.get("quantity"))
+
+            if quantity is None:
+                # Non-numeric quantities such as "to taste" are kept verbatim
+                note = str(ingredient.get("quantity") or "").strip().lower()
+                if note and note not in entry["notes"]:
+                    entry["notes"].append(note)
+                continue
+
+            dimension, factor = unit_dimension(unit)
+            amount = entry["amounts"].setdefault(
+                dimension, {"base": 0.0, "unit": unit, "factor": factor}
+            )
+            amount["base"] += quantity * factor
+            # Report each dimension in the largest unit seen for it
+            if factor > amount["factor"]:
+                amount["unit"], amount["factor"] = unit, factor
+
+        items = []
+        for name in sorted(totals):
+            entry = totals[name]
+            items.append(
+                {
+                    "item": entry["item"],
+                    "quantities": [
+                        {
+                            "quantity": round(amount["base"] / amount["factor"], 2),
+                            "unit": amount["unit"],
+                        }
+                        for amount in entry["amounts"].values()
+                    ],
+                    "notes": entry["notes"],
+                }
+            )
+
+        return items
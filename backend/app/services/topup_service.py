@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict
+from app import events, logging_config, metrics, singleflight
+from app.config import (
+    MAX_PLANNED_DAYS,
+    SPECULATIVE_TOPUP_ENABLED,
+    TOPUP_ACTIVE_DAYS,
+    TOPUP_MAX_USERS_PER_RUN,
+    TOPUP_OFF_PEAK_END_HOUR,
+    TOPUP_OFF_PEAK_START_HOUR,
+    TOPUP_WORKERS,
+)
+from app.models.meal_plan import MealPlanModel
+from app.models.prebuilt_day import PrebuiltDayModel
+from app.models.scheduled_run import ScheduledRunModel
+from app.models.user import UserModel
+from app.services.meal_plan_service import MealPlanService
+from app.services.recipe_index import recipe_index
+from app.services.usage_service import UsageService
+
+# Background workers that build days ahead; the pool size caps how many
+# users are topped up at once
+executor = ThreadPoolExecutor(max_workers=TOPUP_WORKERS, thread_name_prefix="topup")
+
+# Days generated per model call, as in generate_ahead
+BATCH_DAYS = 2
+
+logger = logging.getLogger(__name__)
+
+
+def is_off_peak(now: datetime = None) -> bool:
+    """
+    Check whether a time falls in the configured off-peak window, which may
+    wrap around midnight
+    """
+    hour = (now or datetime.now()).hour
+    if TOPUP_OFF_PEAK_START_HOUR <= TOPUP_OFF_PEAK_END_HOUR:
+        return TOPUP_OFF_PEAK_START_HOUR <= hour < TOPUP_OFF_PEAK_END_HOUR
+    return hour >= TOPUP_OFF_PEAK_START_HOUR or hour < TOPUP_OFF_PEAK_END_HOUR
+
+
+def off_peak_window_start(now: datetime = None) -> datetime:
+    """
+    Get the start of the off-peak window a time falls in (or the latest one
+    before it); a window wrapping around midnight started the day before
+    during its early hours
+    """
+    now = now or datetime.now()
+    start = now.replace(hour=TOPUP_OFF_PEAK_START_HOUR, minute=0, second=0, microsecond=0)
+    return start if start <= now else start - timedelta(days=1)
+
+
+class TopUpService:
+    @staticmethod
+    def top_up(user_id: str):
+        """
+        Build days ahead until the user's planned and pre-built days reach
+        their horizon
+
+        Days are only built during off-peak hours, for users who have not
+        opted out. Returns the number of days built.
+        """
+        return singleflight.do(("topup", user_id), lambda: TopUpService._top_up(user_id))
+
+    @staticmethod
+    def _top_up(user_id: str):
+        if not is_off_peak():
+            return 0
+
+        user = UserModel.get_by_id(user_id)
+        if user is None:
+            return 0
+        user_profile = user["profile"]
+        if not user_profile.get("speculative_topup", True):
+            return 0
+
+        profile_key = PrebuiltDayModel.profile_key(user_profile)
+        horizon = min(user_profile.get("plan_horizon_days", MAX_PLANNED_DAYS), MAX_PLANNED_DAYS)
+        missing = (
+            horizon
+            - len(MealPlanModel.get_planned_dates(user_id))
+            - PrebuiltDayModel.count(user_id, profile_key)
+        )
+
+        built = 0
+        restrictions = user_profile["dietary_restrictions"]
+        while missing > 0:
+            days = min(BATCH_DAYS, missing)
+            try:
+                # Speculative work: not charged against the user's budget
+                with UsageService.background():
+                    generated = MealPlanService.build_days(
+                        user_profile, days, user.get("tier", "free"), user_id
+                    )
+            except Exception:
+                logger.exception("Error building days ahead", extra={"user_id": user_id})
+                metrics.increment("topup_errors_total")
+                break
+
+            for meals in list(generated.values())[:days]:
+                PrebuiltDayModel.add(user_id, profile_key, meals, restrictions)
+            recipe_index.add_days(generated, restrictions)
+            built += days
+            missing -= days
+
+        metrics.increment("topup_days_built_total", built)
+        if built:
+            logger.info("Built %d days ahead", built, extra={"user_id": user_id})
+        return built
+
+    @staticmethod
+    def on_day_completed(user_id: str, date: str):
+        """
+        Refill the freed slot right away when a day is completed off-peak;
+        otherwise the nightly run picks the user up
+        """
+        if SPECULATIVE_TOPUP_ENABLED and is_off_peak():
+            logging_config.submit(executor, TopUpService.top_up, user_id)
+
+    @staticmethod
+    def on_profile_updated(user_id: str, old_profile: Dict, new_profile: Dict):
+        """
+        Drop days built for the previous profile
+        """
+        PrebuiltDayModel.delete_stale(user_id, PrebuiltDayModel.profile_key(new_profile))
+
+    @staticmethod
+    def run_nightly():
+        """
+        Top up every recently active user, once per off-peak window across
+        all workers
+        """
+        # Keyed by the window, not the date, so a window spanning midnight
+        # runs once rather than once on each side of it
+        if not ScheduledRunModel.claim("topup", off_peak_window_start().isoformat()):
+            return 0
+
+        since = datetime.now() - timedelta(days=TOPUP_ACTIVE_DAYS)
+        user_ids = MealPlanModel.get_active_user_ids(since)[:TOPUP_MAX_USERS_PER_RUN]
+        for user_id in user_ids:
+            logging_config.submit(executor, TopUpService.top_up, user_id)
+        metrics.increment("topup_runs_total")
+        logger.info("Nightly top-up queued %d users", len(user_ids))
+        return len(user_ids)
+
+    @staticmethod
+    def start_scheduler():
+        """
+        Start a daemon thread that runs the nightly top-up whenever the
+        off-peak window is open
+        """
+
+        def loop():
+            while True:
+                if is_off_peak():
+                    logging_config.new_context(job="topup")
+                    try:
+                        TopUpService.run_nightly()
+                    except Exception:
+                        logger.exception("Error running nightly top-up")
+                time.sleep(300)
+
+        if SPECULATIVE_TOPUP_ENABLED:
+            threading.Thread(target=loop, name="topup-scheduler", daemon=True).start()
+
+
+events.subscribe("day_completed", TopUpService.on_day_completed)
+events.subscribe("profile_updated", TopUpService.on_profile_updated)
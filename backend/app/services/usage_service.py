@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from app import metrics
+from app.config import USAGE_BUDGET_ACTION, USAGE_DAILY_BUDGETS_USD
+from app.models.usage import UsageModel
+
+
+# Set while running background work on a user's behalf
+_background: ContextVar[bool] = ContextVar("usage_background", default=False)
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised before calling the model when a user is over their daily budget
+    and the budget action is "reject"
+    """
+
+
+class UsageService:
+    @staticmethod
+    @contextmanager
+    def background():
+        """
+        Charge model calls made inside the block to the user's background
+        usage, which their daily budget neither limits nor counts
+        """
+        token = _background.set(True)
+        try:
+            yield
+        finally:
+            _background.reset(token)
+
+    @staticmethod
+    def is_background() -> bool:
+        return _background.get()
+
+    @staticmethod
+    def daily_budget(user_tier: str) -> Optional[float]:
+        return USAGE_DAILY_BUDGETS_USD.get(user_tier)
+
+    @staticmethod
+    def check_budget(user_id: str, user_tier: str) -> bool:
+        """
+        Check a user's spend today against their tier's budget
+
+        Returns True if the request should be downgraded to the cheapest
+        model, raises BudgetExceededError if it should be rejected.
+        """
+        budget = UsageService.daily_budget(user_tier)
+        if budget is None or UsageModel.get_daily_cost(user_id) < budget:
+            return False
+
+        metrics.increment("usage_budget_exceeded_total", action=USAGE_BUDGET_ACTION)
+        if USAGE_BUDGET_ACTION == "reject":
+            raise BudgetExceededError(
+                "Daily generation budget reached, please try again tomorrow"
+            )
+        return True
+
+    @staticmethod
+    def get_usage(user_id: str, user_tier: str, days: int = 30):
+        """
+        Report a user's token usage and cost per day, with today's budget
+        """
+        daily = UsageModel.get_daily(user_id, days)
+        budget = UsageService.daily_budget(user_tier)
+        spent_today = UsageModel.get_daily_cost(user_id)
+
+        return {
+            "budget": {
+                "daily_usd": budget,
+                "spent_today_usd": spent_today,
+                "remaining_today_usd": None if budget is None else max(budget - spent_today, 0),
+                "action": USAGE_BUDGET_ACTION,
+            },
+            "totals": {
+                field: sum(day.get(field, 0) for day in daily)
+                for field in ("requests", "prompt_tokens", "output_tokens", "cost_usd")
+            },
+            "daily": daily,
+        }
@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+
+# Key -> future of the call currently in flight for it
+_lock = threading.Lock()
+_in_flight: Dict[Hashable, Future] = {}
+
+
+def do(key: Hashable, fn: Callable):
+    """
+    Run fn once for concurrent callers sharing a key
+
+    The first caller runs fn; callers arriving while it is in flight wait
+    and receive the same result (or exception). Once it finishes, the next
+    call with the key runs fn again.
+    """
+    with _lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        future.set_result(fn())
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _lock:
+            del _in_flight[key]
+
+    return future.result()
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from app import metrics
+from app.config import STARTUP_WARMUP_ENABLED
+from app.database import client, ensure_indexes
+from app.services.auth_service import pwd_context
+from app.services.llm_providers import get_provider
+from app.services.recipe_index import recipe_index
+
+logger = logging.getLogger(__name__)
+
+# Index creation is retried, backing off up to this long between attempts,
+# until it succeeds; the app reports ready only then
+INDEX_RETRY_MAX_SECONDS = 60
+
+_ready = threading.Event()
+
+
+def _import_auth():
+    from jose import jwt  # noqa: F401
+
+    pwd_context()
+
+
+def _step(name: str, fn) -> bool:
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception:
+        logger.exception("Startup step %s failed", name)
+        return False
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    metrics.set_gauge("startup_step_ms", duration_ms, step=name)
+    logger.info("Startup step %s took %.0f ms", name, duration_ms, extra={"step": name})
+    return True
+
+
+def is_ready() -> bool:
+    """
+    Whether the indexes exist, so queries and unique constraints can be
+    relied on
+    """
+    return _ready.is_set()
+
+
+def warm_up(connections: bool = STARTUP_WARMUP_ENABLED):
+    """
+    Create indexes and, unless disabled, open MongoDB and LLM connections,
+    load the recipe search index and lazily imported libraries, so the
+    first requests do not pay for them
+
+    If creating the indexes fails (e.g. MongoDB is not up yet), the other
+    steps run first and index creation is then retried until it succeeds.
+    """
+    if connections:
+        _step("mongo", lambda: client.admin.command("ping"))
+    indexed = _step("indexes", ensure_indexes)
+    if connections:
+        _step("llm", lambda: get_provider().warm_up())
+        _step("recipe_index", lambda: recipe_index.refresh(force=True))
+        _step("auth", _import_auth)
+
+    delay = 1
+    while not indexed:
+        time.sleep(delay)
+        delay = min(delay * 2, INDEX_RETRY_MAX_SECONDS)
+        indexed = _step("indexes", ensure_indexes)
+    _ready.set()
+
+
+def start():
+    """
+    Warm up in a daemon thread; the app serves requests meanwhile
+    """
+    threading.Thread(target=warm_up, name="warmup", daemon=True).start()
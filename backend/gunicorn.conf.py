@@ -0,0 +1,54 @@
+"""
+Production server settings, read by gunicorn from the working directory:
+
+    cd backend && gunicorn
+
+Every setting can be overridden with an environment variable (below) or on
+the command line.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "app.main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+# Generation runs in each worker's threadpool while its event loop serves
+# other requests, so one worker per core keeps every core busy
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+# Import the app once in the master and fork workers from it: faster
+# restarts and shared memory for the code. Clients holding sockets or
+# threads are reset after the fork (see post_fork).
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Recycle a worker after this many requests (plus jitter, so workers do not
+# restart together) to cap memory growth from caches and fragmentation
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# On shutdown or recycling, a worker stops accepting connections and gets
+# this long to finish in-flight generations before it is killed
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "120"))
+# A worker whose event loop does not check in for this long is restarted
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = None  # requests are logged by the app, see app/logging_config.py
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """
+    Give each worker its own clients when the app was preloaded
+
+    The MongoDB client is created unopened (connect=False in
+    app/database.py) and the master runs no query, so every worker opens
+    its own connections and monitor threads on first use, at the startup
+    warmup. The LLM client holds an HTTP connection pool and is recreated
+    on first use instead.
+    """
+    if preload_app:
+        from app.services.llm_providers import reset_provider
+
+        reset_provider()
@@ -0,0 +1,48 @@
+import sys
+import threading
+import mongomock
+import pytest
+from pymongo.collection import Collection
+
+
+class AtomicCollection:
+    """
+    mongomock collection whose calls run one at a time, like single
+    document operations on a server; mongomock itself may interleave the
+    match and the write of concurrent updates
+    """
+
+    def __init__(self, collection, lock):
+        self._collection = collection
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+
+        return locked
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """
+    Point every collection the app modules imported at an empty in-memory
+    database, with every read on the primary and no transactions since
+    mongomock has no sessions
+    """
+    monkeypatch.setattr("app.database.MONGO_READ_PREFERENCES", {})
+    monkeypatch.setattr("app.database._transactions_supported", False)
+    db = mongomock.MongoClient().db
+    lock = threading.RLock()
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app.") or module is None:
+            continue
+        for attribute, value in list(vars(module).items()):
+            if isinstance(value, Collection):
+                monkeypatch.setattr(module, attribute, AtomicCollection(db[value.name], lock))
+    return db
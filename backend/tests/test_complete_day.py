@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+import pytest
+from bson import ObjectId
+from app.models import meal_plan as meal_plan_module
+from app.models.dashboard_summary import DashboardSummaryModel
+from app.models.meal_history import MealHistoryModel
+from app.models.meal_plan import MealPlanModel
+from app.models.meal_plan_changes import REMOVED
+
+DINNER = {"name": "Dinner", "recipe": {"ingredients": [], "nutrition": {"calories": 500}}}
+DAYS = {"Day1": {"dinner": DINNER}, "Day2": {"dinner": DINNER}}
+
+
+def test_completion_retried_after_a_failure_is_recorded_once(mongo, monkeypatch):
+    user_id = str(ObjectId())
+    today = date.today()
+    first, second = today.isoformat(), (today + timedelta(days=1)).isoformat()
+    week = (today - timedelta(days=today.weekday())).isoformat()
+    MealPlanModel.create(user_id, DAYS, 2, start_date=today)
+    DashboardSummaryModel.rebuild(user_id, today)
+
+    # Fail taking the day out of its plan, after everything else is written
+    plans = meal_plan_module.meal_plans_collection
+
+    class FailingPlans:
+        def __getattr__(self, name):
+            return getattr(plans, name)
+
+        def find_one_and_update(self, *args, **kwargs):
+            raise ConnectionError("primary stepped down")
+
+    monkeypatch.setattr(meal_plan_module, "meal_plans_collection", FailingPlans())
+    with pytest.raises(ConnectionError):
+        MealPlanModel.mark_day_complete(user_id, first)
+    monkeypatch.setattr(meal_plan_module, "meal_plans_collection", plans)
+
+    def removals():
+        log = mongo.meal_plan_changes.find_one({"_id": ObjectId(user_id)})
+        return [entry["d"] for entry in log["changes"] if entry["op"] == REMOVED]
+
+    # The day is still planned, so the log must not say it was removed
+    assert removals() == []
+
+    assert MealPlanModel.mark_day_complete(user_id, first)
+    assert not MealPlanModel.mark_day_complete(user_id, first)
+    assert removals() == [first]
+
+    assert MealPlanModel.get_planned_dates(user_id) == [second]
+    assert [day["date"] for day in MealHistoryModel.get_range(user_id)] == [first]
+    summary = mongo.dashboard_summaries.find_one({"_id": ObjectId(user_id)})
+    assert summary["remaining"] == 1
+    assert summary["weeks"][first]["completed"] == 1
+    assert summary["weeks"][first]["calories"] == 500
+    assert summary["streak"]["last"] == first
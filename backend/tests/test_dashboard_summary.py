@@ -0,0 +1,28 @@
+from datetime import date
+from bson import ObjectId
+from app.models.dashboard_summary import DashboardSummaryModel
+from app.models.meal_history import MealHistoryModel
+
+DINNER = {"dinner": {"name": "Dinner", "recipe": {"nutrition": {"calories": 600}}}}
+
+
+def test_rebuild_keeps_updates_made_while_it_ran(mongo, monkeypatch):
+    user_id = str(ObjectId())
+    today = date.today().isoformat()
+    get_dates = MealHistoryModel.get_dates
+
+    def planned_meanwhile(user_id):
+        DashboardSummaryModel.add_days(user_id, {today: DINNER})
+        return get_dates(user_id)
+
+    monkeypatch.setattr(MealHistoryModel, "get_dates", staticmethod(planned_meanwhile))
+    DashboardSummaryModel.rebuild(user_id)
+
+    stored = mongo.dashboard_summaries.find_one({"_id": ObjectId(user_id)})
+    assert stored["rebuild"] is True
+    assert stored["remaining"] == 1
+
+    monkeypatch.setattr(MealHistoryModel, "get_dates", staticmethod(get_dates))
+    DashboardSummaryModel.rebuild(user_id)
+    stored = mongo.dashboard_summaries.find_one({"_id": ObjectId(user_id)})
+    assert "rebuild" not in stored
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+from contextlib import contextmanager
+from bson import ObjectId
+from app import database
+
+
+class StubSession:
+    def __init__(self, calls):
+        self.calls = calls
+
+
+class StubClient:
+    def __init__(self, calls):
+        self.calls = calls
+
+    @contextmanager
+    def start_session(self, causal_consistency):
+        self.calls.append(("start_session", causal_consistency))
+        yield StubSession(self.calls)
+
+
+class StubUsers:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def find_one(self, query, projection, session):
+        self.calls.append(("primary_read", query["_id"], session))
+
+
+def test_secondary_read_session_is_fenced_by_a_primary_read(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "MONGO_READ_PREFERENCES", {"plans": "secondaryPreferred"})
+    monkeypatch.setattr(database, "client", StubClient(calls))
+    monkeypatch.setattr(database, "users_collection", StubUsers(calls))
+    user_id = str(ObjectId())
+
+    with database.read_session(user_id, "plans") as session:
+        calls.append(("secondary_read", session))
+
+    assert calls == [
+        ("start_session", True),
+        ("primary_read", ObjectId(user_id), session),
+        ("secondary_read", session),
+    ]
+
+
+def test_primary_reads_need_no_session(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "MONGO_READ_PREFERENCES", {"plans": "primary"})
+    monkeypatch.setattr(database, "client", StubClient(calls))
+
+    with database.read_session(str(ObjectId()), "plans") as session:
+        assert session is None
+    assert calls == []
+    assert database.reader(database.meal_plans_collection, "plans") is database.meal_plans_collection
+
+
+class StubTransactionClient:
+    def __init__(self, calls):
+        self.calls = calls
+
+    @contextmanager
+    def start_session(self):
+        yield self
+
+    def with_transaction(self, callback):
+        self.calls.append("transaction")
+        return callback(self)
+
+
+def test_run_in_transaction_uses_a_transaction_where_supported(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "client", StubTransactionClient(calls))
+
+    monkeypatch.setattr(database, "_transactions_supported", True)
+    assert database.run_in_transaction(lambda session: session) is database.client
+    assert calls == ["transaction"]
+
+    monkeypatch.setattr(database, "_transactions_supported", False)
+    assert database.run_in_transaction(lambda session: session) is None
+    assert calls == ["transaction"]
+
+
+def test_importing_the_app_opens_no_mongodb_connection():
+    # What a gunicorn master preloading the app does before forking workers
+    script = (
+        "import threading, time\n"
+        "import app.main\n"
+        "time.sleep(0.2)\n"
+        "print(sorted(t.name for t in threading.enumerate()))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    assert "pymongo" not in result.stdout
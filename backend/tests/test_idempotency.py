@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.models.idempotency_key import IdempotencyKeyModel
+
+USER_ID = str(ObjectId())
+
+
+def test_claim_waits_for_live_lease_and_takes_over_lapsed_one(mongo):
+    assert IdempotencyKeyModel.claim(USER_ID, "key", "generate", "hash") is None
+
+    existing = IdempotencyKeyModel.claim(USER_ID, "key", "generate", "hash")
+    assert existing["status"] == "in_progress"
+
+    mongo.idempotency_keys.update_one(
+        {}, {"$set": {"locked_until": datetime.now() - timedelta(seconds=1)}}
+    )
+    assert IdempotencyKeyModel.claim(USER_ID, "key", "generate", "hash") is None
+    assert mongo.idempotency_keys.find_one()["locked_until"] > datetime.now()
+
+
+def test_claim_retries_when_key_is_released_in_between(mongo, monkeypatch):
+    IdempotencyKeyModel.claim(USER_ID, "key", "generate", "hash")
+    get = IdempotencyKeyModel.get
+
+    def released_first(user_id, key):
+        monkeypatch.setattr(IdempotencyKeyModel, "get", staticmethod(get))
+        IdempotencyKeyModel.release(user_id, key)
+        return None
+
+    monkeypatch.setattr(IdempotencyKeyModel, "get", staticmethod(released_first))
+
+    assert IdempotencyKeyModel.claim(USER_ID, "key", "generate", "hash") is None
+    assert mongo.idempotency_keys.count_documents({}) == 1
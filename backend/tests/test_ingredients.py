@@ -0,0 +1,17 @@
+from app.services.ingredients import parse_quantity
+from app.services.shopping_list_service import ShoppingListService
+
+
+def test_parse_quantity():
+    assert parse_quantity("1 1/2") == 1.5
+    assert parse_quantity("½") == 0.5
+    assert parse_quantity("2-3") == 3.0
+    assert parse_quantity("to taste") is None
+
+
+def test_zero_quantity_is_numeric():
+    assert parse_quantity("0") == 0.0
+    assert parse_quantity(0) == 0.0
+
+    items = ShoppingListService.aggregate([{"item": "salt", "quantity": "0", "unit": "g"}])
+    assert items == [{"item": "salt", "quantities": [{"quantity": 0.0, "unit": "g"}], "notes": []}]
@@ -0,0 +1,66 @@
+from bson import ObjectId
+from app.invalidation import InvalidationBus
+
+
+def _bus():
+    bus = InvalidationBus(mode="stream")
+    evicted = []
+    bus.subscribe("users", lambda user_id: evicted.append(("users", user_id)))
+    bus.subscribe("meal_plans", lambda user_id: evicted.append(("meal_plans", user_id)))
+    return bus, evicted
+
+
+def test_changes_evict_their_user():
+    bus, evicted = _bus()
+    user_id = ObjectId()
+
+    bus._handle(
+        {
+            "ns": {"coll": "meal_plans"},
+            "operationType": "update",
+            "documentKey": {"_id": ObjectId()},
+            "fullDocument": {"user_id": user_id},
+        }
+    )
+    bus._handle(
+        {"ns": {"coll": "users"}, "operationType": "delete", "documentKey": {"_id": user_id}}
+    )
+
+    assert evicted == [("meal_plans", str(user_id)), ("users", str(user_id))]
+
+
+def test_deleted_plans_evict_their_user_not_every_cache():
+    bus, evicted = _bus()
+    user_id = str(ObjectId())
+
+    # The delete itself, and an update whose lookup ran after it
+    for operation in ("update", "delete"):
+        bus._handle(
+            {
+                "ns": {"coll": "meal_plans"},
+                "operationType": operation,
+                "documentKey": {"_id": ObjectId()},
+            }
+        )
+    # The writer's record of the delete
+    bus._handle(
+        {
+            "ns": {"coll": "cache_invalidations"},
+            "operationType": "insert",
+            "fullDocument": {"c": "meal_plans", "u": user_id},
+        }
+    )
+
+    assert evicted == [("meal_plans", user_id)]
+
+
+def test_deletes_are_recorded_for_streams(mongo):
+    bus, evicted = _bus()
+    bus.polling = False
+    user_id = str(ObjectId())
+
+    bus.publish("meal_plans", user_id)
+    bus.publish("meal_plans", user_id, deleted=True)
+
+    assert evicted == [("meal_plans", user_id)] * 2
+    assert [(r["c"], r["u"]) for r in mongo.cache_invalidations.find()] == [("meal_plans", user_id)]
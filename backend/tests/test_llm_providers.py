@@ -0,0 +1,34 @@
+import json
+import pytest
+from app.services import gemini_service
+from app.services.gemini_service import GeminiService
+from app.services.llm_providers import LLMProvider
+from app.services.model_router import model_router
+
+
+class BrokenProvider(LLMProvider):
+    name = "broken"
+
+    def models(self, slots, user_tier="free", downgrade=False):
+        return ["first", "second"]
+
+    def generate(self, messages, model, slots):
+        if model == "first":
+            return "not json", {"prompt_tokens": 0, "output_tokens": 0}
+        return json.dumps({"ok": True}), {"prompt_tokens": 0, "output_tokens": 0}
+
+
+def test_provider_must_implement_generate():
+    class Incomplete(LLMProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_other_providers_leave_the_model_router_alone(monkeypatch):
+    monkeypatch.setattr(gemini_service, "get_provider", lambda: BrokenProvider())
+
+    assert GeminiService._generate_json([("user", "hi")], 1) == {"ok": True}
+    assert "first" not in model_router._failures
+    assert "second" not in model_router._latency_ms
@@ -0,0 +1,52 @@
+from datetime import date
+from bson import ObjectId
+from app.models import meal_plan, meal_plan_changes
+from app.models.meal_plan import MealPlanModel
+from app.services.meal_plan_service import MealPlanService
+
+DINNER = {"name": "Dinner", "recipe": {"ingredients": []}}
+DAYS = {"Day1": {"dinner": DINNER}, "Day2": {"dinner": DINNER}}
+
+
+class SessionRecorder:
+    """
+    Collection wrapper noting the session of every write
+    """
+
+    def __init__(self, collection, writes):
+        self._collection = collection
+        self._writes = writes
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+        if name not in ("insert_one", "find_one_and_update"):
+            return method
+
+        def write(*args, session=None, **kwargs):
+            self._writes.append((self._collection.name, session))
+            return method(*args, **kwargs)
+
+        return write
+
+
+def test_plan_and_its_changes_are_written_in_one_transaction(mongo, monkeypatch):
+    sessions, writes = [], []
+
+    def run_in_transaction(callback):
+        sessions.append(object())
+        return callback(sessions[-1])
+
+    monkeypatch.setattr(meal_plan, "run_in_transaction", run_in_transaction)
+    for module, attribute in (
+        (meal_plan, "meal_plans_collection"),
+        (meal_plan_changes, "meal_plan_changes_collection"),
+    ):
+        monkeypatch.setattr(module, attribute, SessionRecorder(getattr(module, attribute), writes))
+    user_id = str(ObjectId())
+
+    MealPlanModel.create(user_id, DAYS, 2, start_date=date(2026, 3, 2))
+
+    assert writes == [("meal_plans", sessions[0]), ("meal_plan_changes", sessions[0])]
+    result = MealPlanService.get_changes(user_id)
+    assert result["version"] == 2
+    assert [day["date"] for day in result["created"]] == ["2026-03-02", "2026-03-03"]
@@ -0,0 +1,14 @@
+import json
+from app.services.gemini_service import MEAL_PLAN_EXAMPLE, compact_decode, compact_example
+
+
+def _recipes(meal_plan):
+    return [meal["recipe"] for meals in meal_plan.values() for meal in meals.values()]
+
+
+def test_example_meals_have_cuisine_and_nutrition():
+    examples = [json.loads(MEAL_PLAN_EXAMPLE), compact_decode(json.loads(compact_example()))]
+    for example in examples:
+        for recipe in _recipes(example):
+            assert recipe["cuisine"]
+            assert set(recipe["nutrition"]) == {"calories", "protein_g", "carbs_g", "fat_g"}
@@ -0,0 +1,20 @@
+from app.config import GEMINI_LATENCY_BUDGET_MS
+from app.services import model_router as router_module
+from app.services.model_router import LATENCY_SAMPLE_TTL_SECONDS, ModelRouter
+
+
+def test_slow_model_recovers_once_its_sample_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: clock[0])
+    router = ModelRouter(["slow", "fast"])
+    router.record_success("slow", GEMINI_LATENCY_BUDGET_MS * 10)
+
+    assert router.route(1, "free") == ["fast", "slow"]
+
+    clock[0] += LATENCY_SAMPLE_TTL_SECONDS
+    assert router.route(1, "free") == ["slow", "fast"]
+
+    # A fast probe replaces the expired average instead of blending with it
+    router.record_success("slow", 100)
+    assert router.route(1, "free") == ["slow", "fast"]
+    assert router._latency_ms["slow"] == 100
@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from app.config import MAX_PLANNED_DAYS
+from app.models.meal_plan import MealPlanModel
+from app.models.planning import PlanningModel
+from app.models.prebuilt_day import PrebuiltDayModel
+from app.services.meal_plan_service import MealPlanService
+
+THREADS = 8
+PROFILE = {
+    "dietary_restrictions": [],
+    "allergies": [],
+    "disliked_ingredients": [],
+    "preferred_cuisines": [],
+    "target_daily_calories": 2000,
+    "target_macros_pct": {"protein": 30, "carbs": 40, "fat": 30},
+}
+
+
+def _run_all(fn, count):
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(fn, i) for i in range(count)]
+    results, errors = [], []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    return results, errors
+
+
+def _read_together(monkeypatch, count):
+    """
+    Make the first reservation of each worker thread wait for the others
+    after reading the planned dates, so every request decides from the
+    same state
+    """
+    barrier = threading.Barrier(count, timeout=5)
+    local = threading.local()
+    get_planned_dates = MealPlanModel.get_planned_dates
+
+    def synchronized(user_id):
+        dates = get_planned_dates(user_id)
+        if threading.current_thread() is not threading.main_thread() and not getattr(
+            local, "waited", False
+        ):
+            local.waited = True
+            barrier.wait()
+        return dates
+
+    monkeypatch.setattr(MealPlanModel, "get_planned_dates", staticmethod(synchronized))
+
+
+def test_concurrent_reservations_never_share_dates(mongo, monkeypatch):
+    user_id = str(ObjectId())
+    _read_together(monkeypatch, THREADS)
+
+    reservations, errors = _run_all(lambda i: PlanningModel.reserve(user_id, 3), THREADS)
+
+    dates = [d for reservation in reservations for d in reservation["dates"]]
+    assert len(dates) == len(set(dates))
+    assert len(dates) <= MAX_PLANNED_DAYS
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_concurrent_generations_never_overlap_or_exceed_capacity(mongo, monkeypatch):
+    user_id = str(ObjectId())
+
+    def generate_days(user_profile, gemini_profile, days, user_tier, user_id):
+        meal = {"name": "Porridge", "recipe": {"ingredients": [], "instructions": []}}
+        return {f"Day{i + 1}": {"Breakfast": dict(meal)} for i in range(days)}
+
+    monkeypatch.setattr(MealPlanService, "_generate_days", staticmethod(generate_days))
+    monkeypatch.setattr(PrebuiltDayModel, "take", staticmethod(lambda *args: (None, [])))
+    _read_together(monkeypatch, THREADS)
+
+    # Different day counts, so the requests are not collapsed into one
+    _, errors = _run_all(
+        lambda i: MealPlanService.generate_meal_plan(user_id, PROFILE, i + 1), THREADS
+    )
+
+    dates = MealPlanModel.get_planned_dates(user_id)
+    assert len(dates) == len(set(dates))
+    assert len(dates) == MAX_PLANNED_DAYS
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_identical_requests_in_two_workers_share_one_generation(mongo, monkeypatch):
+    user_id = str(ObjectId())
+    joined = threading.Event()
+    calls = []
+
+    def generate_days(user_profile, gemini_profile, days, user_tier, user_id):
+        calls.append(days)
+        # Hold the generation until the other request waits for it
+        assert joined.wait(timeout=5)
+        meal = {"name": "Porridge", "recipe": {"ingredients": [], "instructions": []}}
+        return {f"Day{i + 1}": {"Breakfast": dict(meal)} for i in range(days)}
+
+    wait = PlanningModel.wait
+
+    def joining(user_id, reservation):
+        joined.set()
+        return wait(user_id, reservation)
+
+    monkeypatch.setattr(MealPlanService, "_generate_days", staticmethod(generate_days))
+    monkeypatch.setattr(PrebuiltDayModel, "take", staticmethod(lambda *args: (None, [])))
+    monkeypatch.setattr(PlanningModel, "wait", staticmethod(joining))
+    monkeypatch.setattr("app.models.planning.PLANNING_WAIT_POLL_SECONDS", 0.01)
+
+    # Each worker has its own in-process singleflight, so call past it
+    results, errors = _run_all(
+        lambda i: MealPlanService._generate_and_store(user_id, PROFILE, 3, "free"), 2
+    )
+
+    assert errors == []
+    assert calls == [3]
+    assert results[0]["_id"] == results[1]["_id"]
+    assert len(MealPlanModel.get_planned_dates(user_id)) == 3
@@ -0,0 +1,39 @@
+from datetime import datetime
+from bson import ObjectId
+from app.models.prebuilt_day import PrebuiltDayModel
+from app.services import topup_service
+from app.services.topup_service import off_peak_window_start
+
+USER_ID = str(ObjectId())
+
+
+def _add_days(count):
+    for i in range(count):
+        meal = {"name": f"Meal {i}", "recipe": {"ingredients": [], "instructions": []}}
+        PrebuiltDayModel.add(USER_ID, "profile", {"Breakfast": meal})
+
+
+def test_taken_days_are_kept_until_finished_or_put_back(mongo):
+    _add_days(3)
+
+    claim_id, days = PrebuiltDayModel.take(USER_ID, "profile", 2)
+    assert [day["Breakfast"]["name"] for day in days] == ["Meal 0", "Meal 1"]
+    assert PrebuiltDayModel.take(USER_ID, "profile", 3)[1][0]["Breakfast"]["name"] == "Meal 2"
+    assert PrebuiltDayModel.take(USER_ID, "profile", 3) == (None, [])
+
+    # Storing the plan failed: the days can be served again
+    PrebuiltDayModel.put_back(claim_id)
+    claim_id, days = PrebuiltDayModel.take(USER_ID, "profile", 3)
+    assert len(days) == 2
+
+    PrebuiltDayModel.finish(claim_id)
+    assert PrebuiltDayModel.count(USER_ID, "profile") == 1
+
+
+def test_nightly_window_spanning_midnight_has_one_start(monkeypatch):
+    monkeypatch.setattr(topup_service, "TOPUP_OFF_PEAK_START_HOUR", 22)
+
+    before_midnight = off_peak_window_start(datetime(2026, 3, 1, 23, 30))
+    after_midnight = off_peak_window_start(datetime(2026, 3, 2, 4, 0))
+
+    assert before_midnight == after_midnight == datetime(2026, 3, 1, 22, 0)
@@ -0,0 +1,92 @@
+from app.models.meal_plan import MealPlanModel
+from app.models.recipe import RecipeModel
+from app.services.profile_sync_service import ProfileSyncService
+
+PROFILE = {
+    "allergies": [],
+    "disliked_ingredients": [],
+    "dietary_restrictions": [],
+    "target_daily_calories": 2000,
+    "target_macros_pct": {"protein": 30, "carbs": 40, "fat": 30},
+}
+
+
+def _meal(protein_g, carbs_g, fat_g):
+    calories = protein_g * 4 + carbs_g * 4 + fat_g * 9
+    nutrition = {"calories": calories, "protein_g": protein_g, "carbs_g": carbs_g, "fat_g": fat_g}
+    return {"name": "Meal", "recipe": {"nutrition": nutrition}}
+
+
+def test_macro_goal_change_flags_days_off_target(monkeypatch):
+    # The day is about 30/40/30 of energy from protein/carbs/fat
+    meal_plan = {
+        "_id": 1,
+        "dates": {"Day1": "2026-01-01"},
+        "days": {"Day1": {"Breakfast": _meal(50, 67, 22), "Dinner": _meal(100, 133, 44)}},
+    }
+    monkeypatch.setattr(MealPlanModel, "get_by_user", staticmethod(lambda *args, **kwargs: [meal_plan]))
+    monkeypatch.setattr(RecipeModel, "resolve_plans", staticmethod(lambda plans: plans))
+
+    assert ProfileSyncService.find_affected_slots("user", PROFILE, dict(PROFILE)) == []
+
+    high_protein = dict(PROFILE, target_macros_pct={"protein": 45, "carbs": 30, "fat": 25})
+    slots = ProfileSyncService.find_affected_slots("user", PROFILE, high_protein)
+
+    assert [(slot["meal_type"], slot["reasons"]) for slot in slots] == [
+        ("Breakfast", ["macros"]),
+        ("Dinner", ["macros"]),
+    ]
+
+    nudged = dict(PROFILE, target_macros_pct={"protein": 32, "carbs": 38, "fat": 30})
+    assert ProfileSyncService.find_affected_slots("user", PROFILE, nudged) == []
+
+
+def test_newer_job_takes_over_slots_of_a_pending_one(mongo, monkeypatch):
+    from bson import ObjectId
+    from app.models.profile_sync_job import ProfileSyncJobModel
+    from app.models.user import UserModel
+    from app.services import profile_sync_service
+    from app.services.meal_plan_service import MealPlanService
+
+    user_id = str(ObjectId())
+    affected = [
+        [{"date": "2026-01-01", "meal_type": "Dinner", "reasons": ["allergy: peanut"]}],
+        [
+            {"date": "2026-01-01", "meal_type": "Dinner", "reasons": ["allergy: sesame"]},
+            {"date": "2026-01-02", "meal_type": "Lunch", "reasons": ["allergy: sesame"]},
+        ],
+    ]
+    queued, regenerated = [], []
+    monkeypatch.setattr(
+        ProfileSyncService, "find_affected_slots", staticmethod(lambda *args: affected.pop(0))
+    )
+    monkeypatch.setattr(
+        profile_sync_service.logging_config, "submit", lambda executor, fn, *args: queued.append(args)
+    )
+    monkeypatch.setattr(
+        UserModel,
+        "get_by_id",
+        staticmethod(lambda user_id: {"profile": PROFILE, "tier": "premium"}),
+    )
+    monkeypatch.setattr(
+        MealPlanService,
+        "regenerate_meals",
+        staticmethod(lambda *args: regenerated.append(args) or {}),
+    )
+
+    first = ProfileSyncService.on_profile_updated(user_id, PROFILE, PROFILE)
+    second = ProfileSyncService.on_profile_updated(user_id, PROFILE, PROFILE)
+    assert second["slots"] == [
+        {"date": "2026-01-01", "meal_type": "Dinner", "reasons": ["allergy: peanut", "allergy: sesame"]},
+        {"date": "2026-01-02", "meal_type": "Lunch", "reasons": ["allergy: sesame"]},
+    ]
+
+    for args in queued:
+        ProfileSyncService.run_job(*args)
+
+    assert mongo.profile_sync_jobs.find_one({"_id": first["_id"]})["status"] == "superseded"
+    assert ProfileSyncService.get_status(user_id)["status"] == "completed"
+    assert [(args[2].isoformat(), args[3], args[4]) for args in regenerated] == [
+        ("2026-01-01", ["Dinner"], "premium"),
+        ("2026-01-02", ["Lunch"], "premium"),
+    ]
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from app.profiling import RequestProfiler, run_in_threadpool
+
+
+def blocking_work():
+    # Long enough to rank above the threadpool's start-up in the report
+    time.sleep(0.2)
+
+
+def test_threadpool_work_is_in_the_profile(monkeypatch):
+    monkeypatch.setattr("app.profiling.Profiler", None)
+
+    async def request():
+        profiler = RequestProfiler()
+        assert profiler.start()
+        await run_in_threadpool(blocking_work)
+        return profiler.stop()
+
+    capture = asyncio.run(request())
+
+    assert capture["format"] == "text"
+    assert "blocking_work" in capture["report"]
+
+
+def other_blocking_work():
+    time.sleep(0.2)
+
+
+def test_concurrent_threadpool_work_is_in_the_cprofile_report(monkeypatch):
+    monkeypatch.setattr("app.profiling.Profiler", None)
+
+    async def request():
+        profiler = RequestProfiler()
+        assert profiler.start()
+        await asyncio.gather(
+            run_in_threadpool(blocking_work), run_in_threadpool(other_blocking_work)
+        )
+        return profiler.stop()
+
+    capture = asyncio.run(request())
+
+    assert capture["format"] == "text"
+    assert "other_blocking_work" in capture["report"]
+    assert "blocking_work" in capture["report"].replace("other_blocking_work", "")
+
+
+def test_cprofile_seeing_all_threads_starts_no_thread_profilers(monkeypatch):
+    monkeypatch.setattr("app.profiling.Profiler", None)
+    monkeypatch.setattr("app.profiling._CPROFILE_SEES_ALL_THREADS", True)
+
+    async def request():
+        profiler = RequestProfiler()
+        assert profiler.start()
+        await run_in_threadpool(blocking_work)
+        return profiler, profiler.stop()
+
+    profiler, capture = asyncio.run(request())
+
+    assert capture["format"] == "text"
+    assert profiler.trace["thread_profiles"] == []
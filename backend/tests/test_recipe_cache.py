@@ -0,0 +1,20 @@
+from app.models.recipe import RecipeModel, recipe_cache
+
+
+def test_resolved_recipes_do_not_share_cached_values():
+    recipe_id = "porridge"
+    recipe_cache[recipe_id] = {"name": "Porridge", "recipe": {"ingredients": [{"item": "oats"}]}}
+    plans = [
+        {
+            "days": {
+                "Day1": {"Breakfast": {"recipe_id": recipe_id}},
+                "Day2": {"Breakfast": {"recipe_id": recipe_id}},
+            }
+        }
+    ]
+
+    RecipeModel.resolve_plans(plans)
+    plans[0]["days"]["Day1"]["Breakfast"]["recipe"]["ingredients"].append({"item": "sugar"})
+
+    assert plans[0]["days"]["Day2"]["Breakfast"]["recipe"]["ingredients"] == [{"item": "oats"}]
+    assert recipe_cache[recipe_id]["recipe"]["ingredients"] == [{"item": "oats"}]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from app.models.recipe import RecipeModel
+from app.services.recipe_index import RecipeIndex
+
+
+def _document(recipe_id, minutes, created_at, meal_type="Dinner"):
+    return {
+        "_id": recipe_id,
+        "name": recipe_id,
+        "created_at": created_at,
+        "meal_types": [meal_type],
+        "restrictions": [],
+        "recipe": {"prepTimeMins": minutes, "cookTimeMins": 0, "ingredients": []},
+    }
+
+
+def test_refresh_sorts_bulk_load_and_rereads_overlap(monkeypatch):
+    start = datetime(2026, 1, 1)
+    stored = [
+        _document("stew", 60, start),
+        _document("salad", 10, start + timedelta(seconds=1)),
+        _document("soup", 30, start + timedelta(seconds=2)),
+    ]
+    queries = []
+
+    def get_created_since(since=None):
+        queries.append(since)
+        return [document for document in stored if since is None or document["created_at"] >= since]
+
+    monkeypatch.setattr(RecipeModel, "get_created_since", staticmethod(get_created_since))
+    index = RecipeIndex(refresh_seconds=0)
+
+    index.refresh(force=True)
+    assert [recipe["id"] for recipe in index.search()[1]] == ["salad", "soup", "stew"]
+
+    # Committed late by another worker, with an older created_at than "soup"
+    stored.append(_document("toast", 5, start + timedelta(seconds=1), "Breakfast"))
+    index.refresh(force=True)
+
+    assert queries[1] < start + timedelta(seconds=1)
+    total, recipes = index.search()
+    assert total == 4
+    assert [recipe["id"] for recipe in recipes] == ["toast", "salad", "soup", "stew"]
+
+
+def _indexed(monkeypatch, *recipes):
+    monkeypatch.setattr(RecipeModel, "get_created_since", staticmethod(lambda since=None: []))
+    index = RecipeIndex()
+    for recipe_id, minutes, items in recipes:
+        index.add(
+            recipe_id,
+            recipe_id,
+            {
+                "prepTimeMins": minutes,
+                "cookTimeMins": 0,
+                "nutrition": {"calories": 500},
+                "ingredients": [{"item": item} for item in items],
+            },
+            ["Dinner"],
+        )
+    return index
+
+
+def test_multi_word_terms_match_within_one_ingredient(monkeypatch):
+    index = _indexed(
+        monkeypatch,
+        ("tapenade", 10, ["Kalamata olives", "sesame oil"]),
+        ("salad", 20, ["Extra virgin olive oil", "lettuce"]),
+    )
+
+    assert [recipe["id"] for recipe in index.search(include=["olive oil"])[1]] == ["salad"]
+    assert [recipe["id"] for recipe in index.search(exclude=["olive oil"])[1]] == ["tapenade"]
+    assert index.search(exclude=["olive oil"])[0] == 1
+    assert index.search(exclude=["oil"])[0] == 0
+
+
+def test_candidates_are_copies(monkeypatch):
+    index = _indexed(monkeypatch, ("salad", 20, ["lettuce"]))
+
+    index.candidates("Dinner")[0]["name"] = "changed"
+
+    assert index.candidates("Dinner")[0]["name"] == "salad"
+    assert index.search()[1][0]["name"] == "salad"
@@ -0,0 +1,56 @@
+from datetime import date
+from app.models.meal_plan import MealPlanModel
+from app.services.gemini_service import GeminiService
+from app.services.meal_plan_service import MealPlanService
+from app.services.recipe_index import recipe_index
+
+PROFILE = {
+    "dietary_restrictions": [],
+    "allergies": [],
+    "disliked_ingredients": [],
+    "preferred_cuisines": [],
+    "target_daily_calories": 2000,
+    "target_macros_pct": {},
+}
+
+
+def _meal(name):
+    return {"name": name, "recipe": {"ingredients": [], "instructions": []}}
+
+
+def test_generate_meals_asks_not_to_repeat_replaced_meals(monkeypatch):
+    prompts = []
+    monkeypatch.setattr(
+        GeminiService,
+        "_generate_json",
+        staticmethod(lambda messages, *args: prompts.append(messages[0][1]) or {}),
+    )
+    day = {"Breakfast": _meal("Porridge"), "Lunch": _meal("Lentil Soup")}
+
+    GeminiService.generate_meals({}, [("Day1", "Lunch")], {"Day1": day})
+
+    assert 'do not generate them again): ["Lentil Soup"]' in prompts[0]
+
+
+def test_regenerate_rejects_repeated_meal(monkeypatch):
+    day = {"Breakfast": _meal("Porridge"), "Lunch": _meal("Lentil Soup")}
+    answers = iter([_meal("lentil  soup"), _meal("Falafel Wrap")])
+    meal_plan = {"_id": 1, "days": {"Day1": day}}
+    monkeypatch.setattr(
+        MealPlanModel, "find_day", staticmethod(lambda user_id, date_str: (meal_plan, "Day1"))
+    )
+    monkeypatch.setattr(
+        GeminiService,
+        "generate_meals",
+        staticmethod(lambda profile, slots, *args, **kwargs: {"Day1": {"Lunch": next(answers)}}),
+    )
+    stored = {}
+    monkeypatch.setattr(
+        MealPlanModel, "replace_meals", staticmethod(lambda *args: stored.update(args[4]) or True)
+    )
+    monkeypatch.setattr(recipe_index, "add_days", lambda *args: None)
+
+    result = MealPlanService.regenerate_meals("user", PROFILE, date(2026, 1, 1), ["Lunch"])
+
+    assert stored["Lunch"]["name"] == "Falafel Wrap"
+    assert result["meals"]["Lunch"]["name"] == "Falafel Wrap"
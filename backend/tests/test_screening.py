@@ -0,0 +1,34 @@
+from app.services.screening_service import ScreeningService
+
+
+def _violations(allergies, item):
+    profile = {"allergies": allergies, "disliked_ingredients": []}
+    meal = {"name": "Snack", "recipe": {"ingredients": [{"item": item}]}}
+    matcher = ScreeningService.matcher_for(profile)
+    return {(v["term"], v["matched"]) for v in ScreeningService.screen_meal(matcher, meal)}
+
+
+def test_safe_phrases_only_clear_their_own_allergy():
+    assert _violations(["peanut", "dairy"], "peanut butter") == {("peanut", "peanut")}
+    assert _violations(["peanut", "dairy"], "almond milk") == set()
+    assert _violations(["tree nut", "dairy"], "almond milk") == {("tree nut", "almond")}
+
+
+def test_dairy_matches_inside_compound_words():
+    assert _violations(["dairy"], "cheesecake") == {("dairy", "cheese")}
+    assert _violations(["dairy"], "buttercream") == {("dairy", "butter"), ("dairy", "cream")}
+    assert _violations(["dairy"], "butternut squash") == set()
+
+
+def test_derived_forms_of_allergens_are_hits():
+    assert _violations(["dairy"], "cheesy grits") == {("dairy", "cheesy")}
+    assert _violations(["dairy"], "creamed spinach") == {("dairy", "creamed")}
+    assert _violations(["dairy"], "buttery crust") == {("dairy", "buttery")}
+    assert _violations(["wheat"], "Breaded chicken") == {("wheat", "breaded")}
+
+
+def test_non_food_words_and_free_phrases_are_not_hits():
+    assert _violations(["dairy"], "Strain through cheesecloth") == set()
+    assert _violations(["egg"], "egg-free pancakes") == set()
+    assert _violations(["egg"], "egg-free mayo") == set()
+    assert _violations(["egg"], "egg and cress") == {("egg", "egg")}
@@ -0,0 +1,25 @@
+from app.models.meal_plan import MealPlanModel
+from app.services.shopping_list_service import ShoppingListService, shopping_list_cache
+
+
+def test_list_is_not_cached_when_plans_change_while_reading(monkeypatch):
+    versions = [(("plan", 1),), (("plan", 2),)]
+
+    def get_versions(user_id, cached=True):
+        return versions[0] if cached else versions[-1]
+
+    monkeypatch.setattr(MealPlanModel, "get_versions", staticmethod(get_versions))
+    monkeypatch.setattr(
+        MealPlanModel,
+        "get_ingredients",
+        staticmethod(lambda user_id, start, end: iter([{"item": "rice", "quantity": "1", "unit": "cup"}])),
+    )
+    shopping_list_cache.clear()
+
+    shopping_list = ShoppingListService.get_shopping_list("user")
+    assert [item["item"] for item in shopping_list["items"]] == ["rice"]
+    assert not shopping_list_cache
+
+    versions.pop()
+    ShoppingListService.get_shopping_list("user")
+    assert list(shopping_list_cache) == [("user", None, None, (("plan", 1),))]
@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from app.services import auth_service
+
+
+@pytest.fixture
+def user(mongo, monkeypatch):
+    monkeypatch.setattr(auth_service, "SECRET_KEY", "test-secret")
+    document = {"_id": ObjectId(), "email": "cook@example.com"}
+    mongo.users.insert_one(document)
+    return document
+
+
+def _stream_user(header_token=None, token=None):
+    return asyncio.run(auth_service.get_stream_user(header_token, token))
+
+
+def test_stream_token_only_opens_streams(user):
+    stream_token = auth_service.create_stream_token(user["email"])
+
+    assert _stream_user(token=stream_token)["_id"] == user["_id"]
+    with pytest.raises(HTTPException):
+        asyncio.run(auth_service.get_current_user(stream_token))
+
+
+def test_access_token_is_not_accepted_in_the_url(user):
+    access_token = auth_service.create_access_token({"sub": user["email"]})
+
+    with pytest.raises(HTTPException):
+        _stream_user(token=access_token)
+    assert _stream_user(header_token=access_token)["_id"] == user["_id"]
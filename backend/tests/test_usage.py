@@ -0,0 +1,49 @@
+import json
+import pytest
+from bson import ObjectId
+from app.models.usage import UsageModel
+from app.services import gemini_service
+from app.services.gemini_service import GeminiService
+from app.services.llm_providers import LLMProvider
+from app.services.usage_service import UsageService
+
+USER_ID = str(ObjectId())
+USAGE = {"prompt_tokens": 100, "output_tokens": 50}
+
+
+class FlakyProvider(LLMProvider):
+    name = "flaky"
+
+    def models(self, slots, user_tier="free", downgrade=False):
+        return ["broken", "working"]
+
+    def generate(self, messages, model, slots):
+        return ("not json" if model == "broken" else json.dumps({"ok": True})), USAGE
+
+
+def test_invalid_json_calls_are_recorded_as_failed(mongo, monkeypatch):
+    monkeypatch.setattr(gemini_service, "get_provider", lambda: FlakyProvider())
+
+    GeminiService._generate_json([("user", "hi")], 1, user_id=USER_ID, kind="meals")
+
+    [rollup] = UsageModel.get_daily(USER_ID, 1)
+    assert rollup["requests"] == 2
+    assert rollup["failed_requests"] == 1
+    assert mongo.usage_ledger.count_documents({"f": True}) == 1
+
+
+def test_background_calls_skip_the_budget(mongo, monkeypatch):
+    monkeypatch.setattr(gemini_service, "get_provider", lambda: FlakyProvider())
+    monkeypatch.setattr(
+        UsageService, "check_budget", staticmethod(lambda *args: pytest.fail("budget checked"))
+    )
+
+    with UsageService.background():
+        GeminiService._generate_json([("user", "hi")], 1, user_id=USER_ID, kind="meals")
+
+    [rollup] = UsageModel.get_daily(USER_ID, 1)
+    assert "cost_usd" not in rollup
+    assert rollup["background"]["requests"] == 2
+    assert set(rollup["background"]["models"]) == {"broken", "working"}
+    assert not UsageService.is_background()
+
@@ -0,0 +1,22 @@
+from app import warmup
+
+
+def test_warm_up_retries_indexes_until_ready(monkeypatch):
+    attempts = []
+    sleeps = []
+
+    def ensure_indexes():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("MongoDB is not up yet")
+
+    monkeypatch.setattr(warmup, "ensure_indexes", ensure_indexes)
+    monkeypatch.setattr(warmup.time, "sleep", sleeps.append)
+    monkeypatch.setattr(warmup, "_ready", warmup.threading.Event())
+
+    assert not warmup.is_ready()
+    warmup.warm_up(connections=False)
+
+    assert len(attempts) == 3
+    assert sleeps == [1, 2]
+    assert warmup.is_ready()
@@ -25,12 +25,23 @@ import {
   MoreHoriz,
   Add,
   KeyboardArrowRight,
+  LocalFireDepartment,
 } from "@mui/icons-material";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../contexts/AuthContext";
 import { mealPlanApi } from "../services/api";
 import { motion, AnimatePresence } from "framer-motion";
-import { PieChart, Pie, Cell, ResponsiveContainer, Tooltip } from "recharts";
+import {
+  PieChart,
+  Pie,
+  Cell,
+  ResponsiveContainer,
+  Tooltip,
+  BarChart,
+  Bar,
+  XAxis,
+  ReferenceLine,
+} from "recharts";
 
 const Dashboard = () => {
   const theme = useTheme();
@@ -40,6 +51,7 @@ const Dashboard = () => {
 
   const [loading, setLoading] = useState(true);
   const [mealPlans, setMealPlans] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [error, setError] = useState(null);
   const [generatingPlan, setGeneratingPlan] = useState(false);
 
@@ -48,14 +60,39 @@ const Dashboard = () => {
     today.getMonth() + 1
   ).padStart(2, "0")}-${String(today.getDate()).padStart(2, "0")}`;
 
-  // Load meal plans on component mount
+  // Load the summary and meal plans on component mount, and refresh them
+  // whenever the server reports a change (or the stream reconnects)
   useEffect(() => {
+    fetchSummary();
     fetchMealPlans();
+
+    const refresh = () => {
+      fetchSummary();
+      fetchMealPlans(true);
+    };
+    return mealPlanApi.subscribeEvents({
+      ready: refresh,
+      resync: refresh,
+      meal_plan_changed: refresh,
+    });
   }, []);
 
-  const fetchMealPlans = async () => {
+  // Rollups for the summary cards, a single small document kept up to date
+  // by the server
+  const fetchSummary = async () => {
     try {
-      setLoading(true);
+      const response = await mealPlanApi.getSummary();
+      setSummary(response.data);
+    } catch (error) {
+      console.error("Error fetching dashboard summary:", error);
+    }
+  };
+
+  const fetchMealPlans = async (quiet = false) => {
+    try {
+      if (!quiet) {
+        setLoading(true);
+      }
       const response = await mealPlanApi.getUserMealPlans();
       setMealPlans(response.data);
     } catch (error) {
@@ -78,7 +115,7 @@ const Dashboard = () => {
       const response = await mealPlanApi.generateMealPlan(days);
 
       // Refresh meal plans
-      await fetchMealPlans();
+      await Promise.all([fetchSummary(), fetchMealPlans()]);
     } catch (error) {
       console.error("Error generating meal plan:", error);
       setError(
@@ -106,7 +143,7 @@ const Dashboard = () => {
       await mealPlanApi.markDayComplete(dateParam);
 
       // Refresh meal plans
-      await fetchMealPlans();
+      await Promise.all([fetchSummary(), fetchMealPlans()]);
     } catch (error) {
       console.error("Error marking meal plan as complete:", error);
       setError("Failed to update meal plan status. Please try again.");
@@ -115,12 +152,39 @@ const Dashboard = () => {
     }
   };
 
-  // Calculate the number of planned days
-  const plannedDays = mealPlans.reduce((total, plan) => {
-    // Count the number of dates in each meal plan
-    const datesCount = Object.keys(plan.dates).length;
-    return total + datesCount;
-  }, 0);
+  // Days left in meal plans and the most that can be planned
+  const plannedDays = summary
+    ? summary.remaining_days
+    : mealPlans.reduce(
+        (total, plan) => total + Object.keys(plan.dates).length,
+        0
+      );
+  const maxPlannedDays = summary?.max_planned_days || 7;
+
+  const targetCalories = currentUser?.profile?.target_daily_calories || 2000;
+
+  // Planned calories of the last and next few days
+  const todaySummary = summary?.days.find((day) => day.date === todayISO);
+  const calorieDays = (summary?.days || [])
+    .filter((day) => {
+      const offset =
+        (new Date(`${day.date}T00:00:00`) - new Date(`${todayISO}T00:00:00`)) /
+        86400000;
+      return offset >= -6 && offset <= 6;
+    })
+    .map((day) => ({
+      ...day,
+      label: new Date(`${day.date}T00:00:00`).toLocaleDateString("en-US", {
+        weekday: "narrow",
+      }),
+    }));
+  // Weeks are keyed by their Monday; later weeks may already hold planned days
+  const monday = new Date(today);
+  monday.setDate(today.getDate() - ((today.getDay() + 6) % 7));
+  const mondayISO = `${monday.getFullYear()}-${String(
+    monday.getMonth() + 1
+  ).padStart(2, "0")}-${String(monday.getDate()).padStart(2, "0")}`;
+  const thisWeek = summary?.weeks.find((week) => week.week === mondayISO);
 
   // Prepare macronutrient data for the pie chart
   const macroData = [
@@ -218,9 +282,17 @@ const Dashboard = () => {
                   <Typography variant="h6">Daily Target</Typography>
                 </Box>
                 <Typography variant="h3" sx={{ fontWeight: 700, mb: 1 }}>
-                  {currentUser?.profile?.target_daily_calories || 2000}
+                  {targetCalories}
                 </Typography>
                 <Typography variant="subtitle1">calories per day</Typography>
+                {todaySummary && todaySummary.calories > 0 && (
+                  <Typography variant="body2" sx={{ mt: 1, opacity: 0.85 }}>
+                    {Math.round(todaySummary.calories)} planned today ·{" "}
+                    {Math.round(todaySummary.protein_g)}g protein ·{" "}
+                    {Math.round(todaySummary.carbs_g)}g carbs ·{" "}
+                    {Math.round(todaySummary.fat_g)}g fat
+                  </Typography>
+                )}
               </Paper>
             </Grid>
 
@@ -247,12 +319,12 @@ const Dashboard = () => {
                     {plannedDays}
                   </Typography>
                   <Typography variant="subtitle1" color="text.secondary">
-                    / 7 days planned
+                    / {maxPlannedDays} days planned
                   </Typography>
                 </Box>
                 <LinearProgress
                   variant="determinate"
-                  value={(plannedDays / 7) * 100}
+                  value={Math.min((plannedDays / maxPlannedDays) * 100, 100)}
                   sx={{
                     mb: 2,
                     height: 8,
@@ -271,7 +343,7 @@ const Dashboard = () => {
                     fullWidth
                     startIcon={<Add />}
                     onClick={handleGenerateMealPlan}
-                    disabled={plannedDays >= 7 || generatingPlan}
+                    disabled={plannedDays >= maxPlannedDays || generatingPlan}
                     sx={{
                       mt: 1,
                       position: "relative",
@@ -379,6 +451,118 @@ const Dashboard = () => {
           </Grid>
         </Box>
 
+        {/* Progress Row */}
+        {summary && (
+          <Box sx={{ mb: 3, width: "100%" }}>
+            <Grid container spacing={2} sx={{ width: "100%" }}>
+              {/* Streak and Adherence Card */}
+              <Grid item xs={12} md={4}>
+                <Paper
+                  elevation={3}
+                  sx={{ p: 3, borderRadius: 4, height: "100%" }}
+                >
+                  <Box sx={{ display: "flex", alignItems: "center", mb: 2 }}>
+                    <LocalFireDepartment
+                      sx={{ mr: 1, color: theme.palette.warning.main }}
+                    />
+                    <Typography variant="h6">Streak</Typography>
+                  </Box>
+                  <Box sx={{ display: "flex", alignItems: "baseline", mb: 1 }}>
+                    <Typography variant="h3" sx={{ fontWeight: 700, mr: 1 }}>
+                      {summary.streak.current}
+                    </Typography>
+                    <Typography variant="subtitle1" color="text.secondary">
+                      {summary.streak.current === 1 ? "day" : "days"} in a row
+                    </Typography>
+                  </Box>
+                  <Typography variant="body2" color="text.secondary">
+                    Longest: {summary.streak.longest} days
+                  </Typography>
+                  <Divider sx={{ my: 2 }} />
+                  <Typography variant="body2" color="text.secondary">
+                    This week
+                  </Typography>
+                  <Typography variant="h6" fontWeight={700}>
+                    {thisWeek
+                      ? `${thisWeek.completed} of ${thisWeek.planned} days completed`
+                      : "No days planned"}
+                  </Typography>
+                  {summary.adherence !== null && (
+                    <Chip
+                      size="small"
+                      color="success"
+                      variant="outlined"
+                      label={`${Math.round(
+                        summary.adherence * 100
+                      )}% of past planned days completed`}
+                      sx={{ mt: 1 }}
+                    />
+                  )}
+                </Paper>
+              </Grid>
+
+              {/* Daily Calories Card */}
+              <Grid item xs={12} md={8}>
+                <Paper
+                  elevation={3}
+                  sx={{ p: 3, borderRadius: 4, height: "100%" }}
+                >
+                  <Typography variant="h6" sx={{ mb: 2 }}>
+                    Daily Calories
+                  </Typography>
+                  {calorieDays.length > 0 ? (
+                    <Box sx={{ height: 180, width: "100%" }}>
+                      <ResponsiveContainer width="100%" height="100%">
+                        <BarChart data={calorieDays}>
+                          <XAxis dataKey="label" tickLine={false} />
+                          <Tooltip
+                            formatter={(value) => [
+                              `${Math.round(value)} kcal`,
+                              "Planned",
+                            ]}
+                            labelFormatter={(_, payload) =>
+                              payload?.[0]
+                                ? formatDate(payload[0].payload.date)
+                                : ""
+                            }
+                            contentStyle={{
+                              backgroundColor: theme.palette.background.paper,
+                              borderRadius: 8,
+                              border: "none",
+                              boxShadow: theme.shadows[3],
+                            }}
+                          />
+                          <ReferenceLine
+                            y={targetCalories}
+                            stroke={theme.palette.text.secondary}
+                            strokeDasharray="4 4"
+                          />
+                          <Bar dataKey="calories" radius={[4, 4, 0, 0]}>
+                            {calorieDays.map((day) => (
+                              <Cell
+                                key={day.date}
+                                fill={
+                                  day.completed
+                                    ? theme.palette.success.main
+                                    : theme.palette.primary.light
+                                }
+                              />
+                            ))}
+                          </Bar>
+                        </BarChart>
+                      </ResponsiveContainer>
+                    </Box>
+                  ) : (
+                    <Typography variant="body2" color="text.secondary">
+                      Planned days will show up here.
+                    </Typography>
+                  )}
+                </Paper>
+              </Grid>
+            </Grid>
+          </Box>
+        )}
+
         {/* Today's Meals Section */}
         <Box sx={{ mb: 4, width: "100%" }}>
           <Typography variant="h5" sx={{ mb: 2, fontWeight: 600 }}>
@@ -652,7 +836,7 @@ const Dashboard = () => {
                 variant="contained"
                 color="primary"
                 onClick={handleGenerateMealPlan}
-                disabled={plannedDays >= 7 || generatingPlan}
+                disabled={plannedDays >= maxPlannedDays || generatingPlan}
                 startIcon={
                   generatingPlan ? <CircularProgress size={20} /> : <Add />
                 }
@@ -6,6 +6,7 @@ import {
   Grid,
   Button,
   CircularProgress,
+  LinearProgress,
   Accordion,
   AccordionSummary,
   AccordionDetails,
@@ -53,15 +54,30 @@ const MealPlans = () => {
   const [confirmDialogOpen, setConfirmDialogOpen] = useState(false);
   const [dateToComplete, setDateToComplete] = useState(null);
   const [success, setSuccess] = useState(null);
+  const [generationProgress, setGenerationProgress] = useState(null);
 
-  // Load meal plans on component mount
+  // Load meal plans on component mount, and sync them whenever the server
+  // reports a change (or the stream reconnects)
   useEffect(() => {
     fetchMealPlans();
+    return mealPlanApi.subscribeEvents({
+      ready: () => fetchMealPlans(true),
+      resync: () => fetchMealPlans(true),
+      meal_plan_changed: () => fetchMealPlans(true),
+      generation_progress: (progress) =>
+        setGenerationProgress(
+          progress.stage === "completed" || progress.stage === "failed"
+            ? null
+            : progress
+        ),
+    });
   }, []);
 
-  const fetchMealPlans = async () => {
+  const fetchMealPlans = async (quiet = false) => {
     try {
-      setLoading(true);
+      if (!quiet) {
+        setLoading(true);
+      }
       const response = await mealPlanApi.getUserMealPlans();
       setMealPlans(response.data);
     } catch (error) {
@@ -311,6 +327,24 @@ const MealPlans = () => {
         </Box>
       </Box>
 
+      {generationProgress && (
+        <Box sx={{ mb: 3 }}>
+          <Typography variant="body2" color="text.secondary" sx={{ mb: 1 }}>
+            Generating meals: {generationProgress.days_ready} of{" "}
+            {generationProgress.days} days ready
+          </Typography>
+          <LinearProgress
+            variant={
+              generationProgress.days_ready ? "determinate" : "indeterminate"
+            }
+            value={
+              (generationProgress.days_ready / generationProgress.days) * 100
+            }
+            sx={{ height: 6, borderRadius: 3 }}
+          />
+        </Box>
+      )}
+
       {/* Success or error alerts */}
       <AnimatePresence>
         {error && (
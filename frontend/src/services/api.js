@@ -70,10 +70,106 @@ export const userApi = {
     }),
 };
 
+// Local copy of the user's planned days by date, kept up to date through
+// /meal-plans/changes so refetches only transfer what changed
+let planCopy = { token: null, version: 0, days: {} };
+
+const syncMealPlans = async () => {
+  const token = localStorage.getItem("token");
+  if (planCopy.token !== token) {
+    // Another user logged in: start over
+    planCopy = { token, version: 0, days: {} };
+  }
+
+  const response = await api.get("/meal-plans/changes", {
+    params: planCopy.version ? { since: planCopy.version } : {},
+  });
+  const { version, reset, created, modified, removed } = response.data;
+
+  const days = reset ? {} : { ...planCopy.days };
+  removed.forEach((date) => delete days[date]);
+  [...created, ...modified].forEach((day) => {
+    days[day.date] = day;
+  });
+  planCopy = { token, version, days };
+
+  // Regroup the days into plans shaped like GET /meal-plans/ results
+  const plans = {};
+  Object.values(days).forEach((day) => {
+    if (!plans[day.plan_id]) {
+      plans[day.plan_id] = { id: day.plan_id, dates: {}, days: {} };
+    }
+    plans[day.plan_id].dates[day.day_key] = day.date;
+    plans[day.plan_id].days[day.day_key] = day.meals;
+  });
+  return { ...response, data: Object.values(plans) };
+};
+
+// Server-sent events of the current user: generation progress and plan
+// changes, including those made on other devices or by background jobs.
+// EventSource cannot send headers, so each stream is opened with a
+// short-lived stream token in its URL. EventSource reconnects by itself
+// while that token is valid; once it is rejected, a new stream is opened
+// with a fresh one. Returns a function closing the stream.
+const subscribeMealPlanEvents = (handlers) => {
+  if (!localStorage.getItem("token")) {
+    return () => {};
+  }
+
+  let source = null;
+  let retry = null;
+  let closed = false;
+
+  const reopen = () => {
+    if (!closed) {
+      retry = setTimeout(open, 3000);
+    }
+  };
+
+  const open = async () => {
+    let token;
+    try {
+      token = (await api.post("/meal-plans/events/token")).data.token;
+    } catch (error) {
+      reopen();
+      return;
+    }
+    if (closed) {
+      return;
+    }
+
+    const stream = new EventSource(
+      `${BASE_URL}/meal-plans/events?token=${encodeURIComponent(token)}`
+    );
+    Object.entries(handlers).forEach(([event, handler]) => {
+      stream.addEventListener(event, (message) =>
+        handler(JSON.parse(message.data))
+      );
+    });
+    stream.onerror = () => {
+      if (stream.readyState === EventSource.CLOSED) {
+        reopen();
+      }
+    };
+    source = stream;
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    if (source) {
+      source.close();
+    }
+  };
+};
+
 // Meal plan endpoints
 export const mealPlanApi = {
   generateMealPlan: (days) => api.post("/meal-plans/generate", { days }),
-  getUserMealPlans: () => api.get("/meal-plans/"),
+  getUserMealPlans: syncMealPlans,
+  getSummary: () => api.get("/meal-plans/summary"),
+  subscribeEvents: (handlers) => subscribeMealPlanEvents(handlers),
   markDayComplete: (date) => api.post("/meal-plans/complete", { date }),
   generateAhead: () => api.post("/meal-plans/generate-ahead"),
 };